@@ -2,6 +2,7 @@
 #include <Servo.h>
 #include <OneWire.h>
 #include <iarduino_HC_SR04_int.h>
+#include <util/crc16.h>
 
 // Конфигурация пинов (можно менять через команды)
 int lightPin = 4;
@@ -25,6 +26,58 @@ int alarmTriggered = 0;
 float targetTemperature = 22.0; // Целевая температура по умолчанию
 int windowAngle = 70; // Текущий угол окна
 
+// Телеметрия: 0 — текстовые строки, 1 — двоичные кадры (формат см. src/utils/telemetry.py)
+int telemetryMode = 0;
+uint16_t telemetrySeq = 0;
+const unsigned long TELEMETRY_HEARTBEAT_MS = 1000; // Неизменившийся кадр повторяется не чаще
+
+// Скорость Serial: после включения всегда BASE_BAUD, хост согласует более высокую
+// командами BAUD? и BAUD:<скорость> (см. src/utils/serial_link.py)
+const long BASE_BAUD = 9600;
+const long SUPPORTED_BAUDS[] = {9600, 19200, 38400, 57600, 115200, 230400, 250000, 500000, 1000000};
+const int SUPPORTED_BAUDS_COUNT = sizeof(SUPPORTED_BAUDS) / sizeof(SUPPORTED_BAUDS[0]);
+// Если на новой скорости нет ни одной команды (или BAUD:OK) за это время — возврат на прежнюю
+const unsigned long BAUD_CONFIRM_MS = 2000;
+long currentBaud = BASE_BAUD;
+long fallbackBaud = BASE_BAUD;
+bool baudPending = false;
+unsigned long baudSwitchedAt = 0;
+
+// Планировщик loop(): задачи не ждут через delay(), а запускаются по millis(),
+// и пришедшие команды разбираются на каждом проходе. Самые долгие шаги прохода —
+// обмен с DS18B20 по OneWire (около 3 мс) и печать текстовой телеметрии при полном
+// буфере передачи Serial (на 9600 бод до 50 мс). Поэтому команда, целиком дошедшая
+// до прошивки, начинает обрабатываться не позже чем через COMMAND_LATENCY_MS
+// (плюс время передачи ответов на команды, пришедшие раньше неё). Хост рассчитывает
+// на это значение (FIRMWARE_COMMAND_LATENCY в src/utils/serial_link.py), а
+// фактический самый долгий проход возвращает команда LOOP?.
+const unsigned long COMMAND_LATENCY_MS = 100;
+const unsigned long TEMPERATURE_PERIOD_MS = 1000;     // Опрос DS18B20 и автоуправление климатом
+const unsigned long DS18B20_CONVERSION_MS = 750;      // Преобразование при 12-битном разрешении
+const unsigned long DISTANCE_PERIOD_MS = 100;         // Опрос HC-SR04 и автосвет
+const unsigned long ALARM_PERIOD_MS = 100;            // Проверка датчиков сигнализации
+const unsigned long BUTTON_DEBOUNCE_MS = 50;          // Дребезг кнопки сигнализации
+const unsigned long ALARM_LIGHT_ON_MS = 1000;         // При тревоге свет горит 1 с
+const unsigned long ALARM_LIGHT_OFF_MS = 500;         // и не горит 0,5 с
+const unsigned int SIREN_LOW_HZ = 333;                // Сирена плавно меняет тон
+const unsigned int SIREN_HIGH_HZ = 714;               // между этими частотами
+const unsigned long SIREN_SWEEP_MS = 1760;            // за это время в одну сторону
+const unsigned long TEXT_TELEMETRY_PERIOD_MS = 1000;  // Строка "Temperature: ..."
+const unsigned long BINARY_TELEMETRY_PERIOD_MS = 100; // Проверка изменений для двоичного кадра
+const unsigned long STATUS_PERIOD_MS = 5000;          // Строка "STATUS: ..."
+
+// Последние показания датчиков: их обновляют задачи опроса, остальные только читают
+float lastTemperature = 0;
+bool temperatureValid = false;
+int lastDistance = 0;
+unsigned long maxLoopMicros = 0; // Самый долгий проход loop() с прошлого LOOP?
+
+// Приём команды: символы копятся до '\n', остаток строки не ждём
+const int COMMAND_MAX_LENGTH = 64; // Как приёмный буфер Serial (FIRMWARE_RX_BUFFER на хосте)
+char commandBuffer[COMMAND_MAX_LENGTH + 1];
+int commandLength = 0;
+bool commandOverflow = false;
+
 void setup() {
     // Инициализация сервопривода
     windowServo.attach(windowServoPin);
@@ -43,7 +96,7 @@ void setup() {
     digitalWrite(9, LOW);
     
     // Инициализация Serial
-    Serial.begin(9600);
+    Serial.begin(BASE_BAUD);
     
     // Установка начальных состояний
     digitalWrite(lightPin, LOW);
@@ -51,31 +104,80 @@ void setup() {
     digitalWrite(fanPin, LOW);
     digitalWrite(buzzerPin, LOW);
     
+    lastDistance = sensor.distance();
+    
     delay(1000);
     Serial.println("READY");
 }
 
 void loop() {
-    // Обработка Serial команд
-    if (Serial.available() > 0) {
-        String command = Serial.readStringUntil('\n');
-        command.trim();
-        processCommand(command);
-    }
+    static unsigned long lastDistanceRead = 0;
+    static unsigned long lastTelemetry = 0;
+    unsigned long started = micros();
+    unsigned long now = millis();
     
-    // Автоматическое управление температурой
-    autoTemperatureControl();
+    // Возврат на прежнюю скорость, если хост не подтвердил новую
+    checkBaudWatchdog();
     
-    // Управление сигнализацией
-    alarmSystemControl();
+    // Обработка Serial команд
+    readSerialCommands();
+    
+    // Опрос температуры и автоматическое управление климатом
+    updateTemperature(now);
     
     // Управление светом по датчику расстояния
-    autoLightControl();
+    if (due(lastDistanceRead, DISTANCE_PERIOD_MS, now)) {
+        lastDistance = sensor.distance();
+        autoLightControl();
+    }
+    
+    // Управление сигнализацией
+    alarmSystemControl(now);
     
     // Отправка данных с датчиков
-    sendSensorData();
+    if (due(lastTelemetry, telemetryMode == 1 ? BINARY_TELEMETRY_PERIOD_MS : TEXT_TELEMETRY_PERIOD_MS, now)) {
+        sendSensorData();
+    }
     
-    delay(100);
+    unsigned long elapsed = micros() - started;
+    if (elapsed > maxLoopMicros) {
+        maxLoopMicros = elapsed;
+    }
+}
+
+bool due(unsigned long &lastRun, unsigned long period, unsigned long now) {
+    // Задача планировщика запускается, если с прошлого запуска прошло period мс
+    if (now - lastRun < period) {
+        return false;
+    }
+    lastRun = now;
+    return true;
+}
+
+void readSerialCommands() {
+    // Разбираем все пришедшие символы; команда выполняется, как только пришёл '\n'
+    while (Serial.available() > 0) {
+        char c = Serial.read();
+        if (c != '\n') {
+            if (commandLength < COMMAND_MAX_LENGTH) {
+                commandBuffer[commandLength++] = c;
+            } else {
+                commandOverflow = true;
+            }
+            continue;
+        }
+        
+        commandBuffer[commandLength] = '\0';
+        if (commandOverflow) {
+            Serial.println("ERROR: Command too long");
+        } else {
+            String command(commandBuffer);
+            command.trim();
+            processCommand(command);
+        }
+        commandLength = 0;
+        commandOverflow = false;
+    }
 }
 
 void processCommand(String command) {
@@ -83,10 +185,63 @@ void processCommand(String command) {
     Serial.println(command);
     
     if (command == "PING") {
+        baudSwitchedAt = millis(); // Команда дошла на новой скорости — продлеваем ожидание BAUD:OK
         Serial.println("PONG");
         return;
     }
     
+    // Самый долгий проход loop() с прошлого запроса, мкс
+    if (command == "LOOP?") {
+        Serial.print("OK: Loop max_us=");
+        Serial.println(maxLoopMicros);
+        maxLoopMicros = 0;
+        return;
+    }
+    
+    // Согласование скорости и проверка линии
+    if (command == "BAUD?") {
+        Serial.print("BAUDS: ");
+        for (int i = 0; i < SUPPORTED_BAUDS_COUNT; i++) {
+            if (i > 0) Serial.print(",");
+            Serial.print(SUPPORTED_BAUDS[i]);
+        }
+        Serial.println();
+        return;
+    }
+    if (command == "BAUD:OK") {
+        baudPending = false;
+        Serial.println("OK: Baud confirmed");
+        return;
+    }
+    if (command.startsWith("BAUD:")) {
+        long rate = command.substring(5).toInt();
+        if (!isSupportedBaud(rate)) {
+            Serial.println("ERROR: Unsupported baud");
+            return;
+        }
+        Serial.print("OK: Baud ");
+        Serial.println(rate);
+        switchBaud(rate);
+        return;
+    }
+    if (command.startsWith("ECHO:")) {
+        baudSwitchedAt = millis();
+        Serial.println(command);
+        return;
+    }
+    
+    // Переключение формата телеметрии
+    if (command == "TELEMETRY:BIN") {
+        telemetryMode = 1;
+        Serial.println("OK: Telemetry BINARY");
+        return;
+    }
+    if (command == "TELEMETRY:TEXT") {
+        telemetryMode = 0;
+        Serial.println("OK: Telemetry TEXT");
+        return;
+    }
+    
     // Разбор команд SET:type:pin:value
     if (command.startsWith("SET:")) {
         int colon1 = command.indexOf(':');
@@ -115,8 +270,8 @@ void processCommand(String command) {
                 Serial.println("ERROR: Unknown device type");
             }
         } else if (command.startsWith("SET:target_temp:")) {
-            // Установка целевой температуры
-            int colon = command.indexOf(':');
+            // Установка целевой температуры: значение стоит после последнего двоеточия
+            int colon = command.lastIndexOf(':');
             String tempStr = command.substring(colon + 1);
             targetTemperature = tempStr.toFloat();
             Serial.println("OK: Target temperature set");
@@ -128,6 +283,35 @@ void processCommand(String command) {
     }
 }
 
+bool isSupportedBaud(long rate) {
+    for (int i = 0; i < SUPPORTED_BAUDS_COUNT; i++) {
+        if (SUPPORTED_BAUDS[i] == rate) return true;
+    }
+    return false;
+}
+
+void switchBaud(long rate) {
+    Serial.flush(); // Ответ "OK: Baud" уходит ещё на прежней скорости
+    Serial.end();
+    Serial.begin(rate);
+    if (!baudPending) {
+        fallbackBaud = currentBaud;
+    }
+    currentBaud = rate;
+    baudPending = true;
+    baudSwitchedAt = millis();
+}
+
+void checkBaudWatchdog() {
+    if (baudPending && millis() - baudSwitchedAt > BAUD_CONFIRM_MS) {
+        Serial.end();
+        Serial.begin(fallbackBaud);
+        currentBaud = fallbackBaud;
+        baudPending = false;
+        Serial.println("INFO: Baud reverted");
+    }
+}
+
 void controlLight(int pin, int value) {
     digitalWrite(pin, value == 1 ? HIGH : LOW);
     Serial.print("OK: Light ");
@@ -168,7 +352,7 @@ void controlAlarm(int pin, int value) {
 }
 
 void autoTemperatureControl() {
-    float temperature = readTemperature();
+    float temperature = lastTemperature;
     
     if (temperature > targetTemperature + 2) {
         // Температура выше целевой - открываем окно, выключаем отопление, включаем вентилятор
@@ -192,14 +376,36 @@ void autoTemperatureControl() {
     }
 }
 
-float readTemperature() {
-    byte data[2];
+void updateTemperature(unsigned long now) {
+    // DS18B20 опрашивается без ожидания: запускаем преобразование,
+    // а результат читаем на проходе loop() через DS18B20_CONVERSION_MS
+    static bool converting = false;
+    static unsigned long conversionStarted = 0;
     
-    ds.reset();
-    ds.write(0xCC);
-    ds.write(0x44);
+    if (!converting) {
+        if (temperatureValid && now - conversionStarted < TEMPERATURE_PERIOD_MS) {
+            return;
+        }
+        ds.reset();
+        ds.write(0xCC);
+        ds.write(0x44);
+        converting = true;
+        conversionStarted = now;
+        return;
+    }
     
-    delay(100);
+    if (now - conversionStarted < DS18B20_CONVERSION_MS) {
+        return;
+    }
+    converting = false;
+    lastTemperature = readTemperature();
+    temperatureValid = true;
+    autoTemperatureControl();
+}
+
+float readTemperature() {
+    // Результат преобразования, запущенного в updateTemperature()
+    byte data[2];
     
     ds.reset();
     ds.write(0xCC);
@@ -211,79 +417,93 @@ float readTemperature() {
     return ((data[1] << 8) | data[0]) * 0.0625;
 }
 
-void alarmSystemControl() {
+void pollAlarmButton(unsigned long now) {
+    // Нажатие кнопки (переход в LOW после дребезга) включает или выключает сигнализацию
+    static int lastReading = HIGH;
+    static int buttonState = HIGH;
+    static unsigned long lastChange = 0;
+    
+    int reading = digitalRead(alarmActivatePin);
+    if (reading != lastReading) {
+        lastReading = reading;
+        lastChange = now;
+    }
+    if (reading == buttonState || now - lastChange < BUTTON_DEBOUNCE_MS) {
+        return;
+    }
+    buttonState = reading;
+    if (buttonState == LOW) {
+        alarmActive = !alarmActive;
+        Serial.println(alarmActive ? "INFO: Alarm activated manually" : "INFO: Alarm deactivated manually");
+    }
+}
+
+void alarmSystemControl(unsigned long now) {
+    static unsigned long lastCheck = 0;
+    static unsigned long triggeredAt = 0;
+    
     // Включение/выключение сигнализации
-    if (digitalRead(alarmActivatePin) == LOW && alarmActive == 0) {
-        alarmActive = 1;
-        Serial.println("INFO: Alarm activated manually");
+    pollAlarmButton(now);
+    
+    if (alarmActive == 0) {
+        if (alarmTriggered == 1) {
+            alarmTriggered = 0;
+            digitalWrite(lightPin, LOW);
+        }
+        beepAlarm(0, 0);
+        return;
     }
     
-    if (alarmActive == 1) {
+    if (alarmTriggered == 0) {
         digitalWrite(buzzerPin, HIGH);
-        
-        // Проверка датчика движения
-        if (digitalRead(alarmSensorPin) == HIGH) {
-            alarmTriggered = 1;
+        if (!due(lastCheck, ALARM_PERIOD_MS, now)) {
+            return;
         }
-        
-        // Проверка датчика расстояния
-        if (sensor.distance() <= 60) {
+        // Проверка датчика движения и датчика расстояния
+        if (digitalRead(alarmSensorPin) == HIGH || lastDistance <= 60) {
             alarmTriggered = 1;
+            triggeredAt = now;
         }
-        
-        delay(1000);
-        
-        // Если сработала тревога
-        if (alarmTriggered == 1) {
-            triggerAlarm();
-        }
-    } else {
-        alarmTriggered = 0;
-        digitalWrite(buzzerPin, LOW);
-        beepAlarm(0);
-    }
-    
-    if (digitalRead(alarmActivatePin) == LOW && alarmActive == 1) {
-        alarmActive = 0;
-        Serial.println("INFO: Alarm deactivated manually");
+        return;
     }
     
-    delay(1000);
+    // Тревога длится, пока сигнализацию не выключат кнопкой или командой
+    triggerAlarm(now - triggeredAt);
 }
 
-void triggerAlarm() {
+void triggerAlarm(unsigned long elapsed) {
     // Мигание светом и звуковая сигнализация
-    while (alarmTriggered == 1 && digitalRead(alarmActivatePin) == HIGH) {
-        beepAlarm(1);
-        digitalWrite(lightPin, HIGH);
-        delay(1000);
-        digitalWrite(lightPin, LOW);
-        delay(500);
-    }
+    bool lightOn = elapsed % (ALARM_LIGHT_ON_MS + ALARM_LIGHT_OFF_MS) < ALARM_LIGHT_ON_MS;
+    digitalWrite(lightPin, lightOn ? HIGH : LOW);
+    beepAlarm(1, elapsed);
 }
 
-void beepAlarm(int d) {
+void beepAlarm(int d, unsigned long elapsed) {
+    static unsigned int sirenHz = 0;
+    
     if (d == 1) {
-        for (int f = 1500; f >= 700; f--) {
-            digitalWrite(buzzerPin, HIGH);
-            delayMicroseconds(f);
-            digitalWrite(buzzerPin, LOW);
-            delayMicroseconds(f);
+        // Тон растёт от SIREN_LOW_HZ до SIREN_HIGH_HZ и обратно; звук генерирует таймер (tone())
+        unsigned long phase = elapsed % (2 * SIREN_SWEEP_MS);
+        if (phase >= SIREN_SWEEP_MS) {
+            phase = 2 * SIREN_SWEEP_MS - phase;
         }
-        
-        for (int f = 700; f <= 1500; f++) {
-            digitalWrite(buzzerPin, HIGH);
-            delayMicroseconds(f);
-            digitalWrite(buzzerPin, LOW);
-            delayMicroseconds(f);
+        unsigned int hz = SIREN_LOW_HZ + (SIREN_HIGH_HZ - SIREN_LOW_HZ) * phase / SIREN_SWEEP_MS;
+        if (hz != sirenHz) {
+            tone(buzzerPin, hz);
+            sirenHz = hz;
         }
     } else {
+        if (sirenHz != 0) {
+            noTone(buzzerPin);
+            sirenHz = 0;
+        }
         digitalWrite(buzzerPin, LOW);
     }
 }
 
 void autoLightControl() {
-    if (sensor.distance() <= 60) {
+    // При тревоге светом управляет triggerAlarm()
+    if (alarmTriggered == 0 && lastDistance <= 60) {
         digitalWrite(lightPin, HIGH);
     } else {
         // Не выключаем свет, если он был включен вручную
@@ -292,17 +512,22 @@ void autoLightControl() {
 }
 
 void sendSensorData() {
-    float temperature = readTemperature();
-    int distance = sensor.distance();
+    float temperature = lastTemperature;
+    int distance = lastDistance;
+    
+    if (telemetryMode == 1) {
+        sendBinaryTelemetry(temperature, distance);
+        return;
+    }
     
     Serial.print("Temperature: ");
     Serial.print(temperature);
     Serial.print(", Distance: ");
     Serial.println(distance);
     
-    // Отправляем дополнительные данные каждые 5 секунд
+    // Отправляем дополнительные данные каждые STATUS_PERIOD_MS
     static unsigned long lastSend = 0;
-    if (millis() - lastSend > 5000) {
+    if (millis() - lastSend > STATUS_PERIOD_MS) {
         Serial.print("STATUS: Light=");
         Serial.print(digitalRead(lightPin) ? "ON" : "OFF");
         Serial.print(", Heating=");
@@ -317,3 +542,51 @@ void sendSensorData() {
         lastSend = millis();
     }
 }
+
+void sendBinaryTelemetry(float temperature, int distance) {
+    // Кадр 14 байт: AA 55, длина, тип, номер, температура (сотые °C), расстояние,
+    // флаги, угол окна, CRC-16/CCITT-FALSE байтов 2..11. Многобайтовые поля — little-endian.
+    static uint8_t lastState[6];
+    static unsigned long lastFrame = 0;
+    
+    int16_t centi = (int16_t)(temperature * 100 + (temperature < 0 ? -0.5 : 0.5));
+    uint16_t dist = distance < 0 ? 0 : distance;
+    uint8_t flags = 0;
+    if (digitalRead(lightPin)) flags |= 0x01;
+    if (digitalRead(heatingPin)) flags |= 0x02;
+    if (digitalRead(fanPin)) flags |= 0x04;
+    if (alarmActive) flags |= 0x08;
+    if (alarmTriggered) flags |= 0x10;
+    
+    uint8_t state[6] = {
+        (uint8_t)(centi & 0xFF), (uint8_t)(centi >> 8),
+        (uint8_t)(dist & 0xFF), (uint8_t)(dist >> 8),
+        flags, (uint8_t)windowAngle
+    };
+    
+    // Отправляем только изменения, но не реже раза в TELEMETRY_HEARTBEAT_MS
+    if (memcmp(state, lastState, sizeof(state)) == 0 && millis() - lastFrame < TELEMETRY_HEARTBEAT_MS) {
+        return;
+    }
+    memcpy(lastState, state, sizeof(state));
+    lastFrame = millis();
+    
+    uint8_t frame[14];
+    frame[0] = 0xAA;
+    frame[1] = 0x55;
+    frame[2] = 9;    // длина полезной нагрузки
+    frame[3] = 0x01; // тип: телеметрия
+    frame[4] = telemetrySeq & 0xFF;
+    frame[5] = telemetrySeq >> 8;
+    memcpy(frame + 6, state, sizeof(state));
+    
+    uint16_t crc = 0xFFFF;
+    for (int i = 2; i < 12; i++) {
+        crc = _crc_xmodem_update(crc, frame[i]);
+    }
+    frame[12] = crc & 0xFF;
+    frame[13] = crc >> 8;
+    
+    Serial.write(frame, sizeof(frame));
+    telemetrySeq++;
+}
@@ -0,0 +1,268 @@
+"""
+Бенчмарк NLU на синтетическом корпусе команд.
+Корпус порождается из словарей ассистента: действия × объекты × комнаты × значения,
+соединённые связками ("и", "затем", "потом", ",") и отсылками ("там же").
+Для каждого этапа (segment_command, resolve_location_reference, extract_task,
+их последовательность и CommandParser с кэшем и без) измеряются фраз/с,
+задержка p50/p99 и пиковая память (tracemalloc, отдельным прогоном, чтобы
+трассировка не искажала время). Результаты сохраняются в JSON вместе с хэшем
+коммита, чтобы сравнивать прогоны между коммитами.
+Этапы *_repeats прогоняют CommandParser на корпусе с повторами: фразы берутся
+из небольшого набора (--distinct) с разным регистром, пунктуацией и пробелами,
+как повторяющиеся голосовые команды.
+
+Запуск из корня проекта:
+    python scripts/benchmark_nlu.py
+    python scripts/benchmark_nlu.py --size 50000 --output nlu_benchmark.json
+    python scripts/benchmark_nlu.py --compare nlu_benchmark_old.json
+    python scripts/benchmark_nlu.py --size 1000 --save-corpus corpus.csv
+    python scripts/benchmark_nlu.py --stages parser_repeats parser_cached_repeats --distinct 20
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.utils.command_parser import CommandParser
+from src.utils.location_extractor import resolve_location_reference
+from src.utils.task_extractor import extract_task
+from src.utils.text_segments import segment_command
+from src.utils.vocabulary import Vocabulary, get_vocabulary
+
+CONNECTORS = [" и ", ", затем ", " потом ", ", ", " и там же "]
+VALUE_ACTIONS = ["поставь", "измени", "увеличь", "уменьши"]
+UNITS = ["", " градусов", " градуса", " процентов"]
+
+STAGES = ("segment", "location", "task", "legacy_pipeline",
+          "parser", "parser_cached", "parser_repeats", "parser_cached_repeats")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+
+
+def number_to_words(value: int, number_words: Dict[str, int]) -> str:
+    """Записывает число 0-999 словами из NUMBER_WORDS: 235 → "двести тридцать пять"."""
+    by_value = {v: w for w, v in number_words.items()}
+    if value in by_value:
+        return by_value[value]
+    words = []
+    for order in (100, 10):
+        head = value // order * order
+        if head and (order == 100 or value % 100 >= 20):
+            words.append(by_value[head])
+            value -= head
+    if value:
+        words.append(by_value[value])
+    return " ".join(words)
+
+
+def make_command(rng: random.Random, vocabulary: Vocabulary) -> str:
+    """Одна команда: действие, объект и, возможно, комната и значение."""
+    action = rng.choice(list(vocabulary.actions))
+    verb = rng.choice([action, *vocabulary.actions[action]])
+    obj = rng.choice(list(vocabulary.objects))
+    parts = [verb, rng.choice([obj, *vocabulary.objects[obj]])]
+    if rng.random() < 0.5:
+        room = rng.choice(vocabulary.known_rooms)
+        forms = vocabulary.case_endings.get(room) or [room]
+        parts.append(rng.choice(["в ", "на "]) + forms[-1])
+    if action in VALUE_ACTIONS or rng.random() < 0.2:
+        value = rng.randint(0, 99)
+        number = str(value) if rng.random() < 0.5 else number_to_words(value, vocabulary.number_words)
+        parts.append(rng.choice(["на ", "до ", ""]) + number + rng.choice(UNITS))
+    return " ".join(parts)
+
+
+def generate_corpus(size: int, max_commands: int = 3, seed: int = 0,
+                    vocabulary: Optional[Vocabulary] = None) -> List[str]:
+    """
+    Порождает корпус фраз из 1..max_commands команд.
+    :param size: число фраз
+    :param max_commands: максимальное число команд в одной фразе
+    :param seed: зерно генератора (один и тот же корпус для сравнения коммитов)
+    """
+    vocabulary = vocabulary or get_vocabulary()
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        text = make_command(rng, vocabulary)
+        for _ in range(rng.randint(1, max_commands) - 1):
+            text += rng.choice(CONNECTORS) + make_command(rng, vocabulary)
+        corpus.append(text[0].upper() + text[1:])
+    return corpus
+
+
+def repeat_corpus(corpus: List[str], distinct: int, seed: int = 0) -> List[str]:
+    """
+    Корпус того же размера из первых distinct фраз, выбранных с повторами.
+    Повторы отличаются регистром, пунктуацией и пробелами, как разные распознавания одной команды.
+    """
+    rng = random.Random(seed)
+    pool = corpus[:max(distinct, 1)]
+    repeated = []
+    for _ in range(len(corpus)):
+        text = rng.choice(pool)
+        if rng.random() < 0.5:
+            text = text.lower()
+        if rng.random() < 0.3:
+            text = text.replace(" ", "  ", 1)
+        repeated.append(text + rng.choice(["", "", ".", "!"]))
+    return repeated
+
+
+def _legacy_pipeline(text: str):
+    return [extract_task(item['command']) for item in resolve_location_reference(segment_command(text))]
+
+
+def build_stages(corpus: List[str], distinct: int = 50, seed: int = 0) -> Dict[str, tuple]:
+    """Этапы бенчмарка: имя из STAGES → (функция, входные данные)."""
+    segments = [segment_command(text) for text in corpus]
+    flat_segments = [segment for items in segments for segment in items]
+    repeated = repeat_corpus(corpus, distinct, seed)
+    uncached = CommandParser(cache_size=0)
+    cached = CommandParser()
+    cached_repeats = CommandParser()
+    return {
+        "segment": (segment_command, corpus),
+        "location": (resolve_location_reference, segments),
+        "task": (extract_task, flat_segments),
+        "legacy_pipeline": (_legacy_pipeline, corpus),
+        "parser": (uncached.parse, corpus),
+        "parser_cached": (cached.parse, corpus),
+        "parser_repeats": (uncached.parse, repeated),
+        "parser_cached_repeats": (cached_repeats.parse, repeated),
+    }
+
+
+def measure(func: Callable, inputs: list, repeats: int = 1) -> Dict:
+    """Время каждого вызова и пропускная способность."""
+    for item in inputs[:min(100, len(inputs))]:
+        func(item)  # прогрев: словарь, кэши, сегментатор
+    latencies = np.empty(len(inputs) * repeats, dtype=np.int64)
+    k = 0
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for item in inputs:
+            t0 = time.perf_counter_ns()
+            func(item)
+            latencies[k] = time.perf_counter_ns() - t0
+            k += 1
+    wall = time.perf_counter() - started
+    return {
+        "items": len(latencies),
+        "per_sec": round(len(latencies) / wall, 1),
+        "p50_us": round(float(np.percentile(latencies, 50)) / 1000, 2),
+        "p99_us": round(float(np.percentile(latencies, 99)) / 1000, 2),
+        "mean_us": round(float(latencies.mean()) / 1000, 2),
+    }
+
+
+def measure_memory(func: Callable, inputs: list) -> Dict:
+    """Пиковое выделение памяти на этапе (отдельный прогон под tracemalloc)."""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        results = [func(item) for item in inputs]
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del results
+    return {
+        "peak_kb": round((peak - baseline) / 1024, 1),
+        "retained_kb": round((current - baseline) / 1024, 1),
+        "bytes_per_item": round((peak - baseline) / max(len(inputs), 1), 1),
+    }
+
+
+def git_commit() -> Dict:
+    """Хэш текущего коммита и признак незакоммиченных изменений."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def compare(results: Dict, baseline: Dict):
+    """Печатает изменение пропускной способности и задержек относительно прошлого прогона."""
+    print(f"\nСравнение с {str(baseline.get('commit'))[:10]}:")
+    for name, stage in results["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            continue
+        speedup = stage["per_sec"] / old["per_sec"] if old["per_sec"] else float("nan")
+        print(f"  {name:<22} {speedup:>6.2f}x фраз/с, p99 {old['p99_us']:.1f} → {stage['p99_us']:.1f} мкс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк NLU на синтетическом корпусе")
+    parser.add_argument("--size", type=int, default=10000, help="число фраз в корпусе")
+    parser.add_argument("--max-commands", type=int, default=3, help="максимум команд в одной фразе")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=1, help="сколько раз прогонять корпус")
+    parser.add_argument("--distinct", type=int, default=50,
+                        help="число разных фраз в корпусе с повторами (этапы *_repeats)")
+    parser.add_argument("--stages", nargs="+", default=None, choices=STAGES, metavar="STAGE",
+                        help=f"этапы (по умолчанию все): {', '.join(STAGES)}")
+    parser.add_argument("--no-memory", action="store_true", help="не измерять память")
+    parser.add_argument("--output", default="nlu_benchmark.json", help="файл результатов JSON")
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--save-corpus", default=None, help="сохранить корпус в CSV (формат text_commands.csv)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    corpus = generate_corpus(args.size, args.max_commands, args.seed)
+    print(f"Корпус: {len(corpus)} фраз за {time.perf_counter() - started:.2f} с, например: {corpus[0]!r}")
+    if args.save_corpus:
+        with open(args.save_corpus, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["command_text"])
+            writer.writerows([text] for text in corpus)
+
+    stages = build_stages(corpus, args.distinct, args.seed)
+    selected = args.stages or list(STAGES)
+    results = {
+        **git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {"size": len(corpus), "max_commands": args.max_commands, "seed": args.seed,
+                   "distinct": args.distinct,
+                   "vocabulary": get_vocabulary().source_hash[:16]},
+        "stages": {},
+    }
+    print(f"\n{'Этап':<22} {'фраз/с':>10} {'p50, мкс':>10} {'p99, мкс':>10} {'пик, КБ':>10}")
+    for name in selected:
+        func, inputs = stages[name]
+        stage = measure(func, inputs, args.repeats)
+        if not args.no_memory:
+            stage.update(measure_memory(func, inputs))
+        results["stages"][name] = stage
+        print(f"{name:<22} {stage['per_sec']:>10.0f} {stage['p50_us']:>10.1f} {stage['p99_us']:>10.1f} "
+              f"{stage.get('peak_kb', float('nan')):>10.1f}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
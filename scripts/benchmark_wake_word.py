@@ -0,0 +1,138 @@
+"""
+Бенчмарк детекции wake word на записях из data/custom_dataset/voice_commands/.
+Сравнивает режимы WakeWordDetector: "window" (временные WAV-файлы), "streaming"
+(открытый словарь) и "kws" (ограниченная грамматика) по времени декодирования,
+real-time factor и числу срабатываний. С --compare-vad потоковые режимы дополнительно
+прогоняются без VAD-гейта, чтобы проверить, что гейт не теряет срабатывания.
+
+Запуск из корня проекта:
+    python scripts/benchmark_wake_word.py
+    python scripts/benchmark_wake_word.py --modes streaming kws --limit 10
+    python scripts/benchmark_wake_word.py --modes streaming --compare-vad
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.utils.wake_word_detector import WakeWordDetector, MODES, MODE_WINDOW
+
+DEFAULT_DATA_DIR = "data/custom_dataset/voice_commands/"
+DEFAULT_MODEL_PATH = "models/asr/vosk/vosk-model-small-ru-0.22"
+
+
+def read_wav_int16(path: str) -> tuple:
+    """Читает WAV-файл (int16 mono) и возвращает (сэмплы, частота дискретизации)."""
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+            raise ValueError(f"Ожидается 16-bit mono WAV: {path}")
+        frames = wf.readframes(wf.getnframes())
+        return np.frombuffer(frames, dtype=np.int16), wf.getframerate()
+
+
+def run_streaming(detector: WakeWordDetector, samples: np.ndarray) -> tuple:
+    """Подаёт запись блоками chunk_size в потоковый recognizer, как это делает микрофонный цикл."""
+    detector.reset_stream()
+    wake = stop = False
+    for start in range(0, len(samples), detector.chunk_size):
+        block = samples[start:start + detector.chunk_size]
+        wake_detected, stop_detected = detector.process_stream_block(block)
+        wake, stop = wake or wake_detected, stop or stop_detected
+        if wake or stop:
+            break
+    return wake, stop
+
+
+def run_window(detector: WakeWordDetector, samples: np.ndarray) -> tuple:
+    """Повторяет логику оконного режима: каждые 0.8 с последние 2.4 с и весь 4-секундный буфер."""
+    audio = samples.astype(np.float32) / 32767
+    hop = int(detector.sample_rate * 0.8)
+    buffer_size = int(detector.sample_rate * 4.0)
+    wake = stop = False
+    for end in range(hop, len(audio) + 1, hop):
+        buffer = audio[max(0, end - buffer_size):end]
+        wake, stop = detector._process_audio_chunk(buffer[-hop * 3:])
+        if not (wake or stop) and len(buffer) >= hop * 2:
+            wake, stop = detector._process_audio_chunk(buffer)
+        if wake or stop:
+            break
+    return wake, stop
+
+
+def benchmark_mode(mode: str, files: list, model_path: str, use_vad: bool = True) -> dict:
+    detector = WakeWordDetector(stt_model_path=model_path, mode=mode, use_vad=use_vad)
+    total_audio = 0.0
+    total_decode = 0.0
+    wake_files = []
+    stop_files = []
+    for path in files:
+        samples, sample_rate = read_wav_int16(path)
+        if sample_rate != detector.sample_rate:
+            print(f"Пропускаю {path}: частота {sample_rate} Гц")
+            continue
+        started = time.perf_counter()
+        if mode == MODE_WINDOW:
+            wake, stop = run_window(detector, samples)
+        else:
+            wake, stop = run_streaming(detector, samples)
+        total_decode += time.perf_counter() - started
+        total_audio += len(samples) / sample_rate
+        if wake:
+            wake_files.append(os.path.basename(path))
+        elif stop:
+            stop_files.append(os.path.basename(path))
+    vad_stats = detector.vad.stats() if detector.vad is not None and mode != MODE_WINDOW else {}
+    return {
+        "mode": mode + ("+vad" if vad_stats else ""),
+        "files": len(files),
+        "audio_sec": total_audio,
+        "decode_sec": total_decode,
+        "rtf": total_decode / total_audio if total_audio else 0.0,
+        "wake": wake_files,
+        "stop": stop_files,
+        "vad": vad_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк режимов детекции wake word")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--limit", type=int, default=None, help="ограничить число файлов")
+    parser.add_argument("--compare-vad", action="store_true",
+                        help="дополнительно прогнать потоковые режимы без VAD-гейта")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.data_dir, "*.wav")))[:args.limit]
+    if not files:
+        print(f"Нет WAV-файлов в {args.data_dir}")
+        return
+
+    results = [benchmark_mode(mode, files, args.model_path) for mode in args.modes]
+    if args.compare_vad:
+        results += [benchmark_mode(mode, files, args.model_path, use_vad=False)
+                    for mode in args.modes if mode != MODE_WINDOW]
+
+    print(f"\n{'режим':<15} {'аудио, с':>9} {'декод, с':>9} {'RTF':>7} {'wake':>5} {'stop':>5} {'VAD skip':>9}")
+    for r in results:
+        skip = f"{r['vad']['skip_ratio']:.0%}" if r['vad'] else "-"
+        print(f"{r['mode']:<15} {r['audio_sec']:>9.1f} {r['decode_sec']:>9.2f} {r['rtf']:>7.3f} "
+              f"{len(r['wake']):>5} {len(r['stop']):>5} {skip:>9}")
+
+    # Расхождения между режимами по файлам с wake word
+    reference = set(results[0]["wake"])
+    for r in results[1:]:
+        missed = sorted(reference - set(r["wake"]))
+        extra = sorted(set(r["wake"]) - reference)
+        if missed or extra:
+            print(f"\n{r['mode']} vs {results[0]['mode']}: пропущено {missed}, лишние {extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Сборка индекса лемм для src/utils/morphology.py.
+
+На вход — список словоформ в TSV: "словоформа<TAB>лемма" в каждой строке
+(например, выгрузка словаря OpenCorpora); строки с "#" в начале пропускаются.
+Дополнительно в индекс добавляются формы, порождённые для слов словаря
+ассистента (synonyms.json), чтобы индекс покрывал все устройства и комнаты.
+
+Запуск из корня проекта:
+    python scripts/build_lemma_index.py forms.tsv
+    python scripts/build_lemma_index.py forms.tsv.gz -o data/custom_dataset/lemma_index
+    python scripts/build_lemma_index.py --vocabulary-only
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+from typing import Iterator, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from src.utils.morphology import DEFAULT_LEMMA_INDEX_PATH, LemmaIndex, paradigm_pairs
+from src.utils.vocabulary import DEFAULT_VOCABULARY_PATH, load_vocabulary
+
+
+def read_forms(path: str) -> Iterator[Tuple[str, str]]:
+    """Читает пары (словоформа, лемма) из TSV (можно сжатый .gz)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            parts = line.rstrip("\r\n").split("\t")
+            if len(parts) >= 2 and parts[0] and parts[1]:
+                yield parts[0], parts[1]
+
+
+def vocabulary_pairs(path: str):
+    """Пары (словоформа, лемма) для объектов и комнат словаря ассистента."""
+    return paradigm_pairs(load_vocabulary(path).noun_words())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка индекса лемм (словоформа → лемма)")
+    parser.add_argument("inputs", nargs="*", help="TSV-файлы со строками 'словоформа<TAB>лемма'")
+    parser.add_argument("-o", "--output", default=DEFAULT_LEMMA_INDEX_PATH, help="каталог индекса")
+    parser.add_argument("--vocabulary", default=DEFAULT_VOCABULARY_PATH, help="словарь ассистента (JSON)")
+    parser.add_argument("--vocabulary-only", action="store_true", help="только формы слов словаря")
+    args = parser.parse_args()
+    if not args.inputs and not args.vocabulary_only:
+        parser.error("укажите TSV-файлы или --vocabulary-only")
+
+    started = time.perf_counter()
+
+    def pairs():
+        # Формы словаря идут первыми: при омонимии приоритет у устройств и комнат
+        yield from vocabulary_pairs(args.vocabulary)
+        for path in args.inputs:
+            yield from read_forms(path)
+
+    index = LemmaIndex.build(pairs())
+    index.save(args.output)
+    size = sum(os.path.getsize(os.path.join(args.output, name)) for name in os.listdir(args.output))
+    print(f"Словоформ: {len(index)}, лемм: {len(index.lemma_offsets) - 1}")
+    print(f"Индекс сохранён в {args.output} ({size / 1024:.1f} КБ) за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Сквозной бенчмарк задержки "wake word → срабатывание устройства" на записях
+из data/custom_dataset/voice_commands/ без микрофона и Arduino.
+
+Каждая запись проигрывается через FakeSoundDevice в StreamingCommandCapture
+(потоковое STT с ранним завершением), затем текст разбирается CommandParser,
+задачи переводятся CommandCompiler в кадры SET: и отправляются в LoopbackSerial,
+где на них отвечает эмулятор прошивки.
+Записи содержат команду, сказанную после wake word, поэтому отсчёт ведётся
+от начала проигрывания (момента срабатывания wake word).
+
+Для каждого файла измеряются:
+    capture_ms      — от начала записи до окончания захвата команды (включая FinalResult)
+    endpoint_ms     — от конца речи в записи до окончания захвата
+    nlu_ms          — разбор текста в задачи
+    serial_ms       — от отправки кадров до ответа OK/ERROR на последний из них
+    total_ms        — от wake word до ответа устройства
+    post_speech_ms  — от конца речи до ответа устройства (то, что ощущает пользователь)
+    rtf             — время захвата / длительность поданного аудио
+
+Запуск из корня проекта:
+    python scripts/replay_pipeline.py
+    python scripts/replay_pipeline.py --speed 0 --limit 10
+    python scripts/replay_pipeline.py --firmware-delay 1.3 --output replay.json
+    python scripts/replay_pipeline.py --metrics metrics.jsonl
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.models.model_registry import warm_up
+from src.models.speech_to_text import SpeechToText
+from src.utils.command_capture import StreamingCommandCapture
+from src.utils.command_compiler import CommandCompiler
+from src.utils.command_parser import CommandParser
+from src.utils.metrics import metrics
+from src.utils.replay import FakeSoundDevice, FirmwareEmulator, LoopbackSerial
+from src.utils.voice_activity import EnergyVadGate
+
+DEFAULT_DATA_DIR = "data/custom_dataset/voice_commands/"
+DEFAULT_MODEL_PATH = "models/asr/vosk/vosk-model-small-ru-0.22"
+
+STAGES = ["capture_ms", "endpoint_ms", "nlu_ms", "serial_ms", "total_ms", "post_speech_ms", "rtf"]
+
+
+def speech_end_sec(samples: np.ndarray, sample_rate: int, chunk_size: int) -> Optional[float]:
+    """Конец последнего блока с речью в записи (по тому же VAD, что и при захвате)."""
+    vad = EnergyVadGate(sample_rate=sample_rate, hangover_ms=0)
+    end = None
+    for start in range(0, len(samples), chunk_size):
+        block = samples[start:start + chunk_size]
+        if vad.process(block):
+            end = (start + len(block)) / sample_rate
+    return end
+
+
+def wait_reply(port: LoopbackSerial, timeout: float = 5.0) -> Optional[str]:
+    """Ждёт строку OK/ERROR/PONG, пропуская эхо "Received: ..." и телеметрию."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        line = port.readline().decode("utf-8", errors="ignore").strip()
+        if line.startswith(("OK", "ERROR", "PONG")):
+            return line
+    return None
+
+
+def replay_file(path: str, capture: StreamingCommandCapture, parser: CommandParser,
+                compiler: CommandCompiler, port: LoopbackSerial, speed: float) -> Dict:
+    """Прогоняет одну запись через захват → STT → NLU → serial и возвращает замеры."""
+    device = FakeSoundDevice.from_wav(path, speed=speed)
+    capture.audio = device
+    speech_end = speech_end_sec(device.samples, device.sample_rate, capture.chunk_size)
+
+    result = capture.capture()
+    captured = time.perf_counter()
+    record = {"path": path, "audio_sec": round(len(device.samples) / device.sample_rate, 3)}
+    if result is None:
+        record["end_reason"] = "cancel"
+        return record
+
+    started = time.perf_counter()
+    tasks = parser.parse(result["text"])
+    batch = compiler.compile(tasks)
+    nlu_done = time.perf_counter()
+
+    # Как ArduinoVoiceController.send_voice_command: до прошивки доходят только кадры SET:
+    replies = []
+    for payload in batch.payloads():
+        port.write(payload)
+    for _ in batch.frames:
+        replies.append(wait_reply(port))
+    replied = time.perf_counter()
+
+    # Момент конца речи на шкале проигрывания
+    speech_end_at = device.started + speech_end / speed if speech_end is not None and speed > 0 else None
+    record.update({
+        "text": result["text"],
+        "end_reason": result.get("end_reason"),
+        "tasks": [task.to_dict() for task in tasks],
+        "frames": batch.frames,
+        "rejected": [reason for _, reason in batch.rejected],
+        "replies": replies,
+        "capture_ms": (captured - device.started) * 1000,
+        "endpoint_ms": (captured - speech_end_at) * 1000 if speech_end_at is not None else None,
+        "nlu_ms": (nlu_done - started) * 1000,
+        "serial_ms": (replied - nlu_done) * 1000 if batch else None,
+        "total_ms": (replied - device.started) * 1000,
+        "post_speech_ms": (replied - speech_end_at) * 1000 if speech_end_at is not None else None,
+        "rtf": result["capture_sec"] / result["duration"] if result.get("duration") else None,
+    })
+    return record
+
+
+def summarize(records: List[Dict]) -> Dict:
+    """p50/p95/max по каждому этапу."""
+    summary = {}
+    for stage in STAGES:
+        values = np.array([r[stage] for r in records if r.get(stage) is not None], dtype=np.float64)
+        if len(values):
+            summary[stage] = {"p50": round(float(np.percentile(values, 50)), 3),
+                              "p95": round(float(np.percentile(values, 95)), 3),
+                              "max": round(float(values.max()), 3)}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк задержки на записанных командах")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--limit", type=int, default=None, help="ограничить число файлов")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="скорость проигрывания: 1 — реальное время, 0 — без ограничения")
+    parser.add_argument("--firmware-delay", type=float, default=0.0,
+                        help="задержка ответа эмулятора прошивки, с (не больше FIRMWARE_COMMAND_LATENCY)")
+    parser.add_argument("--baudrate", type=int, default=9600, help="скорость эмулируемой линии UART")
+    parser.add_argument("--output", default=None, help="сохранить замеры в JSON")
+    parser.add_argument("--metrics", default=None, help="включить метрики этапов и дописать снимок в JSONL")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+
+    files = sorted(glob.glob(os.path.join(args.data_dir, "*.wav")))[:args.limit]
+    if not files:
+        print(f"Нет WAV-файлов в {args.data_dir}")
+        return
+
+    warm_up("vosk", args.model_path)
+    stt = SpeechToText(backend="vosk", model_path=args.model_path)
+    capture = StreamingCommandCapture(stt)
+    nlu = CommandParser(cache_size=0)
+    compiler = CommandCompiler()
+    port = LoopbackSerial(FirmwareEmulator(reply_delay=args.firmware_delay, baudrate=args.baudrate),
+                          baudrate=args.baudrate)
+
+    records = []
+    for path in files:
+        record = replay_file(path, capture, nlu, compiler, port, args.speed)
+        records.append(record)
+        if "text" in record:
+            print(f"{os.path.basename(path)}: {record['text']!r} [{record['end_reason']}] "
+                  f"→ {record['replies'] or record['rejected']} за {record['total_ms']:.0f} мс")
+        else:
+            print(f"{os.path.basename(path)}: отменено")
+
+    summary = summarize(records)
+    print(f"\n{'этап':<16} {'p50':>10} {'p95':>10} {'max':>10}")
+    for stage, values in summary.items():
+        print(f"{stage:<16} {values['p50']:>10.2f} {values['p95']:>10.2f} {values['max']:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"files": len(files), "speed": args.speed, "firmware_delay": args.firmware_delay,
+                       "baudrate": args.baudrate, "summary": summary, "records": records},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\nЗамеры сохранены в {args.output}")
+    if args.metrics:
+        metrics.write_jsonl(args.metrics)
+        print(f"Метрики этапов дописаны в {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
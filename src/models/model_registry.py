@@ -0,0 +1,126 @@
+"""
+Реестр моделей распознавания речи: каждая модель загружается с диска один раз
+на процесс и переиспользуется всеми экземплярами SpeechToText.
+При нескольких моделях (языки, размеры) лишние вытесняются по принципу LRU.
+Модель читается с диска вне общей блокировки: пока грузится одна модель,
+другие отдаются из кэша, а второй запрос той же модели ждёт первую загрузку.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+def _load_vosk(model_path: str) -> Any:
+    try:
+        from vosk import Model
+    except ImportError:
+        raise ImportError("Требуется установка vosk: pip install vosk")
+    return Model(model_path)
+
+
+# Загрузчики моделей по имени backend'а
+LOADERS: Dict[str, Callable[[str], Any]] = {
+    "vosk": _load_vosk,
+}
+
+
+class ModelRegistry:
+    def __init__(self, max_models: int = 2):
+        """
+        :param max_models: сколько моделей держать в памяти одновременно
+        """
+        if max_models < 1:
+            raise ValueError("max_models должен быть не меньше 1")
+        self.max_models = max_models
+        self._models: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self._loading: Dict[Tuple[str, str], Future] = {}  # модели, которые сейчас читаются с диска
+        self._lock = threading.Lock()
+        self.loads = 0      # Сколько раз модель реально читалась с диска
+        self.hits = 0       # Сколько раз модель отдана из кэша
+        self.evictions = 0  # Сколько моделей вытеснено по LRU
+
+    def get(self, backend: str, model_path: Optional[str]) -> Any:
+        """
+        Возвращает модель, загружая её при первом обращении.
+        :param backend: имя backend'а (например, "vosk")
+        :param model_path: путь к модели
+        """
+        if backend not in LOADERS:
+            raise NotImplementedError(f"Неизвестный backend: {backend}")
+        key = _key(backend, model_path)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key]
+            loading = self._loading.get(key)
+            if loading is None:
+                self._loading[key] = loading = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            # Модель уже читает другой поток: ждём его, а не читаем второй раз
+            return loading.result()
+
+        try:
+            model = LOADERS[backend](model_path)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[key]
+            self.loads += 1
+            self._models[key] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+                self.evictions += 1
+        loading.set_result(model)
+        return model
+
+    def warm_up(self, specs: Iterable[Tuple[str, str]]):
+        """
+        Заранее загружает модели, чтобы первая команда не ждала чтения с диска.
+        :param specs: пары (backend, model_path)
+        """
+        for backend, model_path in specs:
+            self.get(backend, model_path)
+
+    def evict(self, backend: str, model_path: str) -> bool:
+        """Выгружает модель из реестра. Возвращает True, если она была загружена."""
+        with self._lock:
+            return self._models.pop(_key(backend, model_path), None) is not None
+
+    def clear(self):
+        """Выгружает все модели."""
+        with self._lock:
+            self._models.clear()
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return _key(*key) in self._models
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+
+def _key(backend: str, model_path: Optional[str]) -> Tuple[str, str]:
+    """Ключ модели: "models/x" и "./models/x/" — одна и та же модель."""
+    if model_path is None:
+        return backend, ""
+    return backend, os.path.abspath(os.path.normpath(str(model_path)))
+
+
+# Общий реестр процесса
+default_registry = ModelRegistry()
+
+
+def warm_up(backend: str, *model_paths: str):
+    """
+    Загружает модели в общий реестр при старте приложения.
+    Пример: warm_up("vosk", "models/asr/vosk/vosk-model-small-ru-0.22")
+    """
+    default_registry.warm_up((backend, path) for path in model_paths)
@@ -2,17 +2,67 @@
 Модуль-обёртка для абстрактной модели Speech-to-Text.
 Позволяет подменять backend (например, Whisper, Vosk, сторонние сервисы).
 """
-from typing import Any, Dict, Optional
+import json
+import wave
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from src.models.model_registry import ModelRegistry, default_registry
+from src.utils.metrics import metrics
+
+STREAM_CHUNK_FRAMES = 4000  # Размер порции, которой аудио подаётся в recognizer
+
+
+def to_pcm16(audio: Union[bytes, bytearray, memoryview, np.ndarray],
+             sample_width: int = 2, channels: int = 1) -> np.ndarray:
+    """
+    Приводит аудио к int16 mono — формату, который принимает Vosk.
+    :param audio: сырые PCM-байты или массив NumPy (float в [-1, 1], int16, int32, uint8);
+                  массив формы (frames, channels) сводится в моно
+    :param sample_width: ширина сэмпла в байтах для сырых байтов (1, 2 или 4)
+    :param channels: число каналов для сырых байтов
+    :return: одномерный массив int16
+    """
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        dtypes = {1: np.uint8, 2: np.int16, 4: np.int32}
+        if sample_width not in dtypes:
+            raise ValueError(f"Неподдерживаемая ширина сэмпла: {sample_width}")
+        audio = np.frombuffer(audio, dtype=dtypes[sample_width])
+        if channels > 1:
+            audio = audio.reshape(-1, channels)
+    audio = np.asarray(audio)
+
+    if audio.ndim == 2:
+        # Сведение в моно с сохранением исходного типа сэмплов
+        audio = audio[:, 0] if audio.shape[1] == 1 else audio.mean(axis=1).astype(audio.dtype)
+    elif audio.ndim != 1:
+        raise ValueError(f"Ожидается массив формы (frames,) или (frames, channels), получено {audio.shape}")
+
+    if audio.dtype == np.int16:
+        return audio
+    if audio.dtype.kind == 'f':
+        return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    if audio.dtype == np.int32:
+        return (audio >> 16).astype(np.int16)
+    if audio.dtype == np.uint8:
+        return ((audio.astype(np.int16) - 128) << 8).astype(np.int16)
+    raise ValueError(f"Неподдерживаемый тип сэмплов: {audio.dtype}")
+
 
 class SpeechToText:
-    def __init__(self, backend: str = "stub", model_path: Optional[str] = None, **kwargs):
+    def __init__(self, backend: str = "stub", model_path: Optional[str] = None,
+                 registry: Optional[ModelRegistry] = None, **kwargs):
         """
         backend: имя бэкенда (например, "vosk", "external_api")
         model_path: путь к модели (если применимо)
+        registry: реестр моделей; по умолчанию общий на процесс, так что повторное
+                  создание SpeechToText с тем же путём не перечитывает модель с диска
         kwargs: дополнительные параметры для инициализации модели
         """
         self.backend = backend
         self.model_path = model_path
+        self.registry = registry if registry is not None else default_registry
         self.model = self._load_model(**kwargs)
 
     def _load_model(self, **kwargs) -> Any:
@@ -20,46 +70,120 @@ class SpeechToText:
         if self.backend == "stub":
             return None
         elif self.backend == "vosk":
-            try:
-                from vosk import Model
-                return Model(self.model_path)
-            except ImportError:
-                raise ImportError("Требуется установка vosk: pip install vosk")
+            return self.registry.get(self.backend, self.model_path)
         # Добавить другие backend'ы при необходимости
         else:
             raise NotImplementedError(f"Неизвестный backend: {self.backend}")
 
+    def create_recognizer(self, sample_rate: int, grammar: Optional[List[str]] = None,
+                          words: bool = False) -> Any:
+        """
+        Создаёт потоковый распознаватель для подачи аудио по частям.
+        Распознаватель можно держать открытым долго и переиспользовать через Reset().
+        :param sample_rate: частота дискретизации подаваемого аудио (int16 mono)
+        :param grammar: список допустимых слов/фраз (ограниченная грамматика Vosk);
+                        "[unk]" обозначает любое слово вне списка
+        :param words: включить в результаты тайминги и уверенность по словам
+        :return: объект распознавателя бэкенда
+        """
+        if self.backend == "vosk":
+            from vosk import KaldiRecognizer
+            if grammar is not None:
+                rec = KaldiRecognizer(self.model, sample_rate, json.dumps(grammar, ensure_ascii=False))
+            else:
+                rec = KaldiRecognizer(self.model, sample_rate)
+            if words:
+                rec.SetWords(True)
+            return rec
+        else:
+            raise NotImplementedError(f"Потоковое распознавание не реализовано для backend: {self.backend}")
+
     def transcribe(self, audio_path: str, **kwargs) -> Dict:
         """
         Выполняет преобразование аудио в текст. 
         :param audio_path: путь к аудиофайлу
-        :return: {'text': текст, ...}
+        :return: {'text': текст, 'words': [...], 'confidence': ...}
+        """
+        if self.backend == "stub":
+            return {"text": "(demo stub: transcription not implemented)"}
+        with wave.open(audio_path, "rb") as wf:
+            def read_chunks():
+                while True:
+                    data = wf.readframes(STREAM_CHUNK_FRAMES)
+                    if len(data) == 0:
+                        break
+                    yield data
+            return self.transcribe_stream(read_chunks(), wf.getframerate(),
+                                          sample_width=wf.getsampwidth(), channels=wf.getnchannels())
+
+    def transcribe_array(self, audio: np.ndarray, sample_rate: int) -> Dict:
+        """
+        Распознаёт аудио из массива NumPy без записи на диск.
+        :param audio: массив (frames,) или (frames, channels): float в [-1, 1], int16, int32 или uint8
+        :param sample_rate: частота дискретизации
+        :return: {'text': текст, 'words': [...], 'confidence': ...}
+        """
+        pcm = to_pcm16(audio)
+        step = STREAM_CHUNK_FRAMES
+        return self.transcribe_stream((pcm[i:i + step] for i in range(0, len(pcm), step)), sample_rate)
+
+    def transcribe_bytes(self, data: bytes, sample_rate: int, sample_width: int = 2, channels: int = 1) -> Dict:
+        """
+        Распознаёт сырые PCM-байты (без WAV-заголовка).
+        :param data: PCM-данные
+        :param sample_rate: частота дискретизации
+        :param sample_width: ширина сэмпла в байтах (1, 2 или 4)
+        :param channels: число каналов
+        :return: {'text': текст, 'words': [...], 'confidence': ...}
+        """
+        return self.transcribe_array(to_pcm16(data, sample_width, channels), sample_rate)
+
+    def transcribe_stream(self, chunks: Iterable[Union[bytes, np.ndarray]], sample_rate: int,
+                          sample_width: int = 2, channels: int = 1) -> Dict:
+        """
+        Распознаёт аудио, поступающее порциями (например, из микрофона или сети).
+        Каждая порция приводится к int16 mono и сразу подаётся в recognizer.
+        :param chunks: итератор порций PCM-байтов или массивов NumPy
+        :param sample_rate: частота дискретизации
+        :param sample_width: ширина сэмпла для порций-байтов
+        :param channels: число каналов для порций-байтов
+        :return: {'text': текст, 'words': [{'word', 'start', 'end', 'conf'}, ...],
+                  'confidence': средняя уверенность по словам или None}
         """
         if self.backend == "stub":
             return {"text": "(demo stub: transcription not implemented)"}
         elif self.backend == "vosk":
-            import wave
-            import json
-            from vosk import KaldiRecognizer
-            wf = wave.open(audio_path, "rb")
-            rec = KaldiRecognizer(self.model, wf.getframerate())
-            result = ''
-            while True:
-                data = wf.readframes(4000)
-                if len(data) == 0:
-                    break
-                if rec.AcceptWaveform(data):
-                    result_json = rec.Result()
-                    result = json.loads(result_json)["text"]
-            final_json = rec.FinalResult()
-            result += ' ' + json.loads(final_json)["text"]
-            return {"text": result.strip()}
+            with metrics.span("stt_transcribe_seconds"):
+                rec = self.create_recognizer(sample_rate, words=True)
+                results = []
+                samples = 0
+                for chunk in chunks:
+                    pcm = to_pcm16(chunk, sample_width, channels)
+                    samples += len(pcm)
+                    if len(pcm) and rec.AcceptWaveform(pcm.tobytes()):
+                        results.append(json.loads(rec.Result()))
+                results.append(json.loads(rec.FinalResult()))
+            metrics.inc("stt_audio_seconds_total", samples / sample_rate)
+            return self.merge_results(results)
         # ... реализовать другие backend'ы ...
         else:
             raise NotImplementedError(f"Не реализовано для backend: {self.backend}")
 
+    @staticmethod
+    def merge_results(results: List[Dict]) -> Dict:
+        """Склеивает результаты Vosk по фразам в один ответ с таймингами слов."""
+        texts = [r.get("text", "") for r in results if r.get("text")]
+        words = [
+            {"word": w["word"], "start": w["start"], "end": w["end"], "conf": w.get("conf", 1.0)}
+            for r in results for w in r.get("result", [])
+        ]
+        confidence = sum(w["conf"] for w in words) / len(words) if words else None
+        return {"text": " ".join(texts).strip(), "words": words, "confidence": confidence}
+
 # Пример использования:
 # stt = SpeechToText(backend="vosk", model_path="models/asr/vosk/")
 # result = stt.transcribe("data/open_stt/audio/001.wav")
 # print(result['text'])
+# result = stt.transcribe_array(audio, sample_rate=16000)  # без записи на диск
+# print(result['words'])  # [{'word': ..., 'start': ..., 'end': ..., 'conf': ...}, ...]
 
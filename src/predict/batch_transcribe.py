@@ -0,0 +1,191 @@
+"""
+Пакетное офлайн-распознавание архива записанных команд.
+Файлы раздаются пулу процессов; каждый процесс загружает модель один раз.
+Результаты пишутся построчно в JSONL по мере готовности, поэтому прерванный
+(в том числе по Ctrl+C) прогон можно продолжить: уже распознанные файлы
+пропускаются, а файлы с ошибкой распознаются заново. Пути в результатах абсолютные.
+
+Запуск из корня проекта:
+    python -m src.predict.batch_transcribe data/custom_dataset/voice_commands/ -o transcripts.jsonl
+    python -m src.predict.batch_transcribe "archive/**/*.wav" -o transcripts.jsonl --workers 8
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Set
+
+from src.models.speech_to_text import SpeechToText
+
+DEFAULT_MODEL_PATH = "models/asr/vosk/vosk-model-small-ru-0.22"
+
+# Экземпляр распознавателя в процессе-воркере (создаётся один раз в _init_worker)
+_worker_stt: Optional[SpeechToText] = None
+
+
+def collect_files(inputs: Iterable[str], pattern: str = "*.wav") -> List[str]:
+    """
+    Собирает список аудиофайлов.
+    :param inputs: каталоги, glob-шаблоны или пути к файлам
+    :param pattern: шаблон файлов внутри каталогов (поиск рекурсивный)
+    :return: отсортированный список абсолютных путей без повторов
+    """
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(glob.glob(os.path.join(item, "**", pattern), recursive=True))
+        elif os.path.isfile(item):
+            files.add(item)
+        else:
+            files.update(glob.glob(item, recursive=True))
+    return sorted(set(os.path.abspath(f) for f in files))
+
+
+def load_records(output_path: str) -> Dict[str, Dict]:
+    """
+    Читает результаты из JSONL: последняя запись для каждого файла (путь приводится к абсолютному).
+    Оборванная последняя строка пропускается.
+    """
+    records = {}
+    if not os.path.exists(output_path):
+        return records
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            record["path"] = os.path.abspath(record["path"])
+            records[record["path"]] = record
+    return records
+
+
+def load_done(output_path: str) -> Set[str]:
+    """Файлы, уже распознанные без ошибки."""
+    return {path for path, record in load_records(output_path).items() if "error" not in record}
+
+
+def _drop_failed(output_path: str, records: Dict[str, Dict]):
+    """
+    Переписывает JSONL без записей с ошибкой и повторов: эти файлы распознаются заново
+    и получат одну новую запись. Замена атомарная, чтобы прерывание не испортило результаты.
+    """
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records.values():
+            if "error" not in record:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, output_path)
+
+
+def _init_worker(backend: str, model_path: str):
+    global _worker_stt
+    _worker_stt = SpeechToText(backend=backend, model_path=model_path)
+
+
+def _transcribe_file(path: str) -> Dict:
+    """Распознаёт один файл в процессе-воркере и считает real-time factor."""
+    try:
+        with wave.open(path, "rb") as wf:
+            duration = wf.getnframes() / wf.getframerate()
+        started = time.perf_counter()
+        result = _worker_stt.transcribe(path)
+        elapsed = time.perf_counter() - started
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+    return {
+        "path": path,
+        "text": result.get("text", ""),
+        "words": result.get("words", []),
+        "confidence": result.get("confidence"),
+        "duration": round(duration, 3),
+        "elapsed": round(elapsed, 3),
+        "rtf": round(elapsed / duration, 4) if duration else None,
+    }
+
+
+def batch_transcribe(inputs: Iterable[str], output_path: str, model_path: str = DEFAULT_MODEL_PATH,
+                     backend: str = "vosk", workers: Optional[int] = None, resume: bool = True) -> Dict:
+    """
+    Распознаёт набор файлов пулом процессов и дописывает результаты в JSONL.
+    :param inputs: каталоги, glob-шаблоны или пути к файлам
+    :param output_path: путь к JSONL с результатами
+    :param model_path: путь к модели
+    :param backend: backend SpeechToText
+    :param workers: число процессов (по умолчанию — число ядер)
+    :param resume: пропускать файлы, уже распознанные в output_path
+    :return: сводка прогона
+    """
+    files = collect_files(inputs)
+    records = load_records(output_path) if resume else {}
+    done = {path for path, record in records.items() if "error" not in record}
+    pending = [f for f in files if f not in done]
+    summary = {"total": len(files), "skipped": len(files) - len(pending), "ok": 0, "errors": 0,
+               "audio_sec": 0.0, "wall_sec": 0.0}
+    if not pending:
+        return summary
+
+    if len(done) < len(records):
+        _drop_failed(output_path, records)
+
+    mode = "a" if resume else "w"
+    started = time.perf_counter()
+    with open(output_path, mode, encoding="utf-8") as out:
+        # Прерванный прогон мог оставить недописанную строку — начинаем с новой
+        if mode == "a" and out.tell() > 0:
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write("\n")
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(backend, model_path))
+        try:
+            futures = [pool.submit(_transcribe_file, path) for path in pending]
+            # Пишем в порядке готовности, чтобы медленный файл не задерживал остальные результаты
+            for future in as_completed(futures):
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if "error" in record:
+                    summary["errors"] += 1
+                    print(f"Ошибка: {record['path']}: {record['error']}")
+                else:
+                    summary["ok"] += 1
+                    summary["audio_sec"] += record["duration"]
+        except KeyboardInterrupt:
+            # Выход из with ждал бы все отправленные файлы: отменяем ещё не начатые
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+    summary["wall_sec"] = time.perf_counter() - started
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетное распознавание аудиофайлов в JSONL")
+    parser.add_argument("inputs", nargs="+", help="каталоги, glob-шаблоны или файлы")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl", help="файл результатов JSONL")
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--backend", default="vosk")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument("--no-resume", action="store_true", help="перезаписать результаты с нуля")
+    args = parser.parse_args()
+
+    try:
+        summary = batch_transcribe(args.inputs, args.output, model_path=args.model_path, backend=args.backend,
+                                   workers=args.workers, resume=not args.no_resume)
+    except KeyboardInterrupt:
+        print(f"\nПрервано. Готовые результаты сохранены в {args.output}, повторный запуск продолжит прогон")
+        sys.exit(130)
+    print(f"Файлов: {summary['total']}, пропущено: {summary['skipped']}, "
+          f"распознано: {summary['ok']}, ошибок: {summary['errors']}")
+    if summary["wall_sec"]:
+        print(f"Аудио: {summary['audio_sec']:.1f} с за {summary['wall_sec']:.1f} с "
+              f"(общий RTF {summary['wall_sec'] / max(summary['audio_sec'], 1e-9):.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""
+Асинхронный контроллер ассистента на asyncio: микрофон, Serial и NLU в одном цикле событий.
+Serial — потоки StreamReader/StreamWriter (pyserial-asyncio), блоки аудио передаются
+из callback'а PortAudio в цикл через call_soon_threadsafe, а блокирующее декодирование
+Vosk (wake word и команда) выполняется в отдельном однопоточном executor'е.
+Остановка детерминирована: задачи отменяются и дожидаются, порт и поток аудио закрываются,
+executor завершается — без флагов и sleep. Один процесс может вести несколько устройств:
+каждая задача уходит первому устройству, в таблице которого есть её объект и комната,
+задачи без устройства не отправляются; обрыв связи с одним устройством не останавливает
+остальные, устройство переподключается.
+
+Порт и скорость по умолчанию подбираются автоматически (см. src/utils/serial_link.py).
+
+Запуск из корня проекта:
+    python -m src.utils.async_controller
+    python -m src.utils.async_controller --port COM3
+    python -m src.utils.async_controller --port /dev/ttyUSB0 --port /dev/ttyUSB1 --baudrate 9600
+    python -m src.utils.async_controller --devices devices.json
+
+Таблица устройств (--devices) — JSON "порт → объект словаря → поля Device":
+    {"/dev/ttyUSB0": {"свет": {"type": "light", "pin": 4, "rooms": ["кухня"]}},
+     "/dev/ttyUSB1": {"свет": {"type": "light", "pin": 4, "rooms": ["спальня"]},
+                      "окно": {"type": "servo", "pin": 12, "max_value": 180}}}
+"""
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.models.speech_to_text import SpeechToText
+from src.utils.command_capture import END_CANCEL, StreamingCommandCapture
+from src.utils.command_channel import CommandChannel, ECHO_PREFIX, is_reply
+from src.utils.command_compiler import CommandCompiler, CompiledBatch, Device, default_compiler
+from src.utils.command_parser import CommandParser, Task
+from src.utils.metrics import metrics
+from src.utils.serial_link import BASE_BAUDRATE, LinkInfo, open_link
+from src.utils.telemetry import CMD_BINARY, TelemetryDemux, TelemetryLog
+from src.utils.wake_word_detector import MODE_STREAMING, WakeWordDetector, load_sounddevice
+
+DEFAULT_MODEL_PATH = "models/asr/vosk/vosk-model-small-ru-0.22"
+
+# Сколько блоков аудио может ждать декодирования; при переполнении новые блоки отбрасываются
+AUDIO_QUEUE_BLOCKS = 50
+# Пауза перед повторным подключением устройства после обрыва связи, с
+RECONNECT_DELAY = 2.0
+
+# События декодирования, передаваемые из executor'а в цикл событий
+EVENT_WAKE = "wake"
+EVENT_STOP = "stop"
+EVENT_COMMAND = "command"
+EVENT_CANCEL = "cancel"
+
+Connector = Callable[[str, int], Awaitable[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]]
+
+
+def load_device_tables(path: str) -> Dict[str, Dict[str, Device]]:
+    """
+    Читает таблицы устройств плат из JSON (формат см. в описании модуля).
+    :return: порт → (объект словаря → Device)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    tables = {}
+    for port, objects in data.items():
+        table = {}
+        for obj, spec in objects.items():
+            rooms = spec.get("rooms")
+            table[obj] = Device(**{**spec, "rooms": frozenset(rooms) if rooms is not None else None})
+        tables[port] = table
+    return tables
+
+
+async def open_serial_connection(ser) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    Оборачивает уже открытый serial.Serial в пару потоков asyncio.
+    Порт не переоткрывается: это перезагрузило бы Arduino и сбросило согласованную скорость.
+    """
+    try:
+        import serial_asyncio
+    except ImportError:
+        raise ImportError("Требуется установка pyserial-asyncio: pip install pyserial-asyncio")
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    protocol = asyncio.StreamReaderProtocol(reader)
+    transport = serial_asyncio.SerialTransport(loop, protocol, ser)
+    return reader, asyncio.StreamWriter(transport, protocol, reader, loop)
+
+
+class AsyncSerialDevice:
+    def __init__(self, port: Optional[str] = None, baudrate: Optional[int] = None, name: Optional[str] = None,
+                 connect: Optional[Connector] = None, binary_telemetry: bool = False,
+                 devices: Optional[Dict[str, Device]] = None):
+        """
+        Одно устройство Arduino на Serial-порту.
+        :param port: имя порта (COM3, /dev/ttyUSB0); None — найти автоматически
+        :param baudrate: скорость порта; None — согласовать с прошивкой самую высокую
+                         (заново при каждом подключении: после сброса Arduino снова на BASE_BAUDRATE)
+        :param name: имя устройства в логах (по умолчанию имя порта)
+        :param connect: корутина (port, baudrate) → (reader, writer) вместо настоящего порта
+                        (например, replay.open_loopback_connection)
+        :param binary_telemetry: переключить прошивку на двоичные кадры телеметрии
+        :param devices: что подключено к этой плате: "объект словаря → устройство" с пинами
+                        и комнатами (по умолчанию таблица компилятора контроллера)
+        """
+        self.port = port
+        self.requested_baudrate = baudrate
+        self.baudrate = baudrate  # скорость текущего подключения
+        self.name = name or port or "arduino"
+        self._auto_name = name is None and port is None
+        self.connect = connect
+        self.link: Optional[LinkInfo] = None
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.last_line: Optional[str] = None
+        self.channel: Optional[CommandChannel] = None
+        self.binary_telemetry = binary_telemetry
+        self.telemetry = TelemetryLog()
+        self.compiler: Optional[CommandCompiler] = CommandCompiler(devices) if devices is not None else None
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        if self.connect is not None:
+            self.reader, self.writer = await self.connect(self.port, self.requested_baudrate or BASE_BAUDRATE)
+        else:
+            # Поиск порта и согласование скорости блокируют, поэтому идут в пуле потоков
+            ser, self.link = await loop.run_in_executor(None, open_link, self.port, self.requested_baudrate)
+            self.port, self.baudrate = self.link.port, self.link.baudrate
+            if self._auto_name:
+                self.name = self.port
+            print(f"[{self.name}] Связь установлена: {self.baudrate} бод")
+            self.reader, self.writer = await open_serial_connection(ser)
+        # Повторы отправляет сторожевой поток канала, поэтому запись всегда передаётся в цикл событий
+        self.channel = CommandChannel(lambda payload: loop.call_soon_threadsafe(self.writer.write, payload))
+
+    @property
+    def connected(self) -> bool:
+        return self.channel is not None and self.writer is not None and not self.writer.is_closing()
+
+    def send(self, command: str) -> asyncio.Future:
+        """Отправляет один кадр; Future завершится CommandResult или TimeoutError."""
+        return self.send_frames([command])[0]
+
+    def send_batch(self, batch: CompiledBatch) -> List[asyncio.Future]:
+        """Отправляет кадры одной фразы (одной записью, если позволяет окно канала)."""
+        return self.send_frames(batch.frames)
+
+    def send_frames(self, frames: List[str]) -> List[asyncio.Future]:
+        """
+        Ставит кадры в канал команд.
+        Без связи с устройством Future сразу завершаются ConnectionError, остальные устройства не затрагиваются.
+        """
+        if not self.connected:
+            loop = asyncio.get_running_loop()
+            futures = [loop.create_future() for _ in frames]
+            for future in futures:
+                future.set_exception(ConnectionError(f"нет связи с {self.name}"))
+            return futures
+        print(f"[{self.name}] Отправлено: {'; '.join(frames)}")
+        return [asyncio.wrap_future(future) for future in self.channel.submit_many(frames)]
+
+    async def read_loop(self):
+        """Читает данные от устройства, пока порт не закроется: строки и кадры телеметрии."""
+        demux = TelemetryDemux(self.telemetry)
+        if self.binary_telemetry:
+            self.send(CMD_BINARY).add_done_callback(self._report_telemetry_mode)
+        while True:
+            data = await self.reader.read(4096)
+            if not data:
+                break
+            for message in demux.feed(data):
+                self.handle_message(message)
+
+    def _report_telemetry_mode(self, future: asyncio.Future):
+        if future.cancelled():
+            return
+        if future.exception() is not None or not future.result().ok:
+            print(f"[{self.name}] Двоичная телеметрия не включена, остаётся текстовый режим")
+
+    def handle_message(self, message: str):
+        """Обработка строк прошивки: подтверждения команд, эхо и телеметрия."""
+        self.last_line = message
+        if message.startswith(ECHO_PREFIX):
+            self.channel.feed_line(message)  # Эхо команды, ответ придёт следующей строкой
+            return
+        if is_reply(message):
+            self.channel.feed_line(message)
+        print(f"[{self.name}] Ардуино: {message}")
+
+    async def close(self):
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+
+    async def serve(self, reconnect_delay: Optional[float] = RECONNECT_DELAY):
+        """
+        Читает устройство; при обрыве связи закрывает порт и переподключается.
+        :param reconnect_delay: пауза перед переподключением, с; None — не переподключаться
+        """
+        while True:
+            try:
+                await self.read_loop()
+                print(f"[{self.name}] Связь потеряна")
+            except (OSError, ConnectionError) as e:
+                print(f"[{self.name}] Ошибка чтения: {e}")
+            await self.close()
+            metrics.inc("serial_disconnects_total")
+            if reconnect_delay is None:
+                return
+            while True:
+                await asyncio.sleep(reconnect_delay)
+                try:
+                    await self.open()
+                    break
+                except (OSError, ConnectionError) as e:
+                    print(f"[{self.name}] Не удалось переподключиться: {e}")
+
+
+class AsyncVoiceController:
+    def __init__(self, devices: List[AsyncSerialDevice], stt: SpeechToText,
+                 sample_rate: int = 16000, chunk_size: int = 1600, mode: str = MODE_STREAMING,
+                 use_vad: bool = True, parser: Optional[CommandParser] = None,
+                 compiler: Optional[CommandCompiler] = None, audio=None,
+                 reconnect_delay: Optional[float] = RECONNECT_DELAY):
+        """
+        Голосовое управление устройствами в одном цикле asyncio.
+        :param devices: устройства, которым отправляются команды
+        :param stt: экземпляр SpeechToText (общий для wake word и команд)
+        :param sample_rate: частота дискретизации микрофона
+        :param chunk_size: размер блока аудио
+        :param mode: режим детекции wake word (см. WakeWordDetector)
+        :param use_vad: VAD-гейт перед декодером wake word
+        :param parser: конвейер NLU (по умолчанию новый CommandParser)
+        :param compiler: перевод задач в кадры для устройств без своей таблицы (по умолчанию общий компилятор)
+        :param audio: источник звука с InputStream в стиле sounddevice (по умолчанию sounddevice)
+        :param reconnect_delay: пауза перед переподключением устройства после обрыва, с;
+                                None — отключившееся устройство больше не используется
+        """
+        self.devices = devices
+        self.reconnect_delay = reconnect_delay
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.detector = WakeWordDetector(sample_rate=sample_rate, chunk_size=chunk_size, mode=mode,
+                                         use_vad=use_vad, stt=stt, audio=audio)
+        self.capture = StreamingCommandCapture(stt, sample_rate=sample_rate, chunk_size=chunk_size)
+        self.parser = parser if parser is not None else CommandParser()
+        self.compiler = compiler if compiler is not None else default_compiler
+        self.audio = audio
+        # Все объекты Vosk живут в одном потоке: recognizer'ы не потокобезопасны
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._audio_queue: Optional[asyncio.Queue] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._capturing = False  # Состояние меняется только в потоке executor'а
+        self.audio_dropped = 0
+        self.commands: List[str] = []  # Распознанные команды (для отладки и бенчмарков)
+        self._reports: Set[asyncio.Task] = set()
+
+    # --- поток PortAudio ---
+
+    def _audio_callback(self, indata, frames, time_info, status):
+        """Callback PortAudio: копирует блок и передаёт его в цикл событий."""
+        if status:
+            print(f"Audio status: {status}")
+        self._loop.call_soon_threadsafe(self._enqueue_audio, indata[:, 0].copy())
+
+    def _enqueue_audio(self, block: np.ndarray):
+        try:
+            self._audio_queue.put_nowait(block)
+        except asyncio.QueueFull:
+            self.audio_dropped += 1
+            metrics.inc("audio_dropped_blocks_total")
+
+    # --- поток executor'а (Vosk) ---
+
+    def _decode(self, blocks: List[np.ndarray]) -> List[tuple]:
+        """
+        Декодирует пачку блоков: сначала поиск wake word, после него — запись команды.
+        :return: список событий (EVENT_*, данные)
+        """
+        events = []
+        for block in blocks:
+            if self._capturing:
+                with metrics.span("capture_decode_seconds"):
+                    reason = self.capture.feed(block)
+                if reason is None:
+                    continue
+                self._capturing = False
+                self.capture.end_reason = reason
+                metrics.inc(f"capture_end_{reason}_total")
+                if reason == END_CANCEL:
+                    events.append((EVENT_CANCEL, None))
+                else:
+                    with metrics.span("capture_finalize_seconds"):
+                        events.append((EVENT_COMMAND, self.capture.finish()))
+                self.detector.reset_stream()
+            else:
+                with metrics.span("wake_decode_seconds"):
+                    wake, stop = self.detector.process_stream_block(block)
+                if stop:
+                    metrics.inc("stop_detections_total")
+                    events.append((EVENT_STOP, None))
+                    break
+                if wake:
+                    metrics.inc("wake_detections_total")
+                    self.capture.start()
+                    self._capturing = True
+                    events.append((EVENT_WAKE, None))
+        return events
+
+    # --- цикл событий ---
+
+    async def _audio_loop(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.detector.reset_stream)
+        while True:
+            blocks = [await self._audio_queue.get()]
+            # Всё, что накопилось, пока шло предыдущее декодирование, отдаём одной пачкой
+            while not self._audio_queue.empty():
+                blocks.append(self._audio_queue.get_nowait())
+            metrics.set_gauge("async_audio_queue_blocks", len(blocks))
+            for event, data in await loop.run_in_executor(self._executor, self._decode, blocks):
+                if event == EVENT_WAKE:
+                    print("✓ Wake word обнаружен! Слушаю команду...")
+                elif event == EVENT_CANCEL:
+                    print("Стоп-слово: запись команды отменена")
+                elif event == EVENT_COMMAND:
+                    await self.handle_text(data.get("text", ""))
+                elif event == EVENT_STOP:
+                    print("\n✓ Стоп-слово обнаружено! Останавливаю контроллер...")
+                    self.stop()
+                    return
+
+    async def handle_text(self, text: str):
+        """Разбирает распознанную команду и отправляет её устройствам."""
+        if not text:
+            print("Не понял, повторите")
+            return
+        print(f"Вы сказали: {text}")
+        self.commands.append(text)
+        routed, rejected = self.route(self.parser.parse(text))
+        for task, reason in rejected:
+            print(f"  Не отправлено '{task.text}': {reason}")
+        if routed:
+            # Ответы не ждём здесь, чтобы не задерживать разбор аудио
+            report = asyncio.create_task(self._report(*self.send_routed(routed)))
+            self._reports.add(report)
+            report.add_done_callback(self._reports.discard)
+
+    def route(self, tasks: List[Task]) -> Tuple[List[Tuple[AsyncSerialDevice, CompiledBatch]],
+                                                List[Tuple[Task, str]]]:
+        """
+        Распределяет задачи фразы по устройствам: задача достаётся первому устройству,
+        таблица которого её принимает (объект подключён, комната подходит).
+        :return: (устройство и его пакет кадров — только непустые, отклонённые задачи с причиной)
+        """
+        batches = [CompiledBatch() for _ in self.devices]
+        rejected = []
+        for task in tasks:
+            reasons = []
+            for device, batch in zip(self.devices, batches):
+                try:
+                    batch.add((device.compiler or self.compiler).compile_task(task), task)
+                    break
+                except ValueError as e:
+                    reasons.append(str(e))
+            else:
+                rejected.append((task, reasons[0] if reasons else "нет устройств"))
+        return [(device, batch) for device, batch in zip(self.devices, batches) if batch], rejected
+
+    def send_routed(self, routed: List[Tuple[AsyncSerialDevice, CompiledBatch]]
+                    ) -> Tuple[List[str], List[asyncio.Future]]:
+        """Отправляет каждому устройству его пакет; возвращает кадры и Future их ответов."""
+        frames, futures = [], []
+        for device, batch in routed:
+            frames += batch.frames
+            futures += device.send_batch(batch)
+        return frames, futures
+
+    async def _report(self, frames: List[str], futures: List[asyncio.Future]):
+        """Сообщает о командах, на которые устройство так и не ответило."""
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"Команда {frames[i]} не выполнена: {result}")
+
+    def stop(self):
+        """Запрашивает остановку (можно вызывать из любого потока)."""
+        if self._loop is None or self._stop_event is None:
+            return
+        if self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def run(self):
+        """
+        Работает до вызова stop() (или стоп-слова), затем корректно закрывает всё.
+        Обрыв связи с устройством не останавливает контроллер (см. AsyncSerialDevice.serve).
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._audio_queue = asyncio.Queue(maxsize=AUDIO_QUEUE_BLOCKS)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vosk")
+        tasks: List[asyncio.Task] = []    # остановка и аудио: завершение любой останавливает контроллер
+        devices: List[asyncio.Task] = []  # чтение устройств: обрыв связи обрабатывает само устройство
+        try:
+            # Дожидаемся всех подключений, даже если одно не удалось, чтобы закрыть открытые
+            opened = await asyncio.gather(*(device.open() for device in self.devices), return_exceptions=True)
+            for result in opened:
+                if isinstance(result, BaseException):
+                    raise result
+            audio = self.audio if self.audio is not None else load_sounddevice()
+            tasks.append(asyncio.create_task(self._stop_event.wait(), name="stop"))
+            tasks.append(asyncio.create_task(self._audio_loop(), name="audio"))
+            devices += [asyncio.create_task(device.serve(self.reconnect_delay), name=f"serial:{device.name}")
+                        for device in self.devices]
+            print("Асинхронный контроллер запущен. Скажите 'Карма' и команду.")
+            with audio.InputStream(samplerate=self.sample_rate, channels=1, dtype='int16',
+                                   callback=self._audio_callback, blocksize=self.chunk_size):
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is not None:
+                        print(f"Ошибка в задаче {task.get_name()}: {task.exception()}")
+        finally:
+            for task in [*tasks, *devices, *self._reports]:
+                task.cancel()
+            await asyncio.gather(*tasks, *devices, *self._reports, return_exceptions=True)
+            await asyncio.gather(*(device.close() for device in self.devices))
+            # Дожидаемся текущего декодирования, не блокируя цикл событий
+            await self._loop.run_in_executor(None, self._executor.shutdown)
+            print("Контроллер остановлен")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Асинхронный голосовой контроллер Arduino")
+    parser.add_argument("--port", action="append", default=None,
+                        help="Serial-порт (можно несколько); по умолчанию ищется автоматически")
+    parser.add_argument("--baudrate", type=int, default=None,
+                        help="фиксированная скорость; по умолчанию согласуется с прошивкой")
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--text-telemetry", action="store_true", help="не включать двоичную телеметрию")
+    parser.add_argument("--devices", default=None,
+                        help="JSON с таблицами устройств плат (порты берутся из него, если не заданы --port)")
+    args = parser.parse_args()
+
+    tables = load_device_tables(args.devices) if args.devices else {}
+    stt = SpeechToText(backend="vosk", model_path=args.model_path)
+    devices = [AsyncSerialDevice(port, args.baudrate, binary_telemetry=not args.text_telemetry,
+                                 devices=tables.get(port))
+               for port in args.port or list(tables) or [None]]
+    controller = AsyncVoiceController(devices, stt)
+    try:
+        asyncio.run(controller.run())
+    except KeyboardInterrupt:
+        print("\nОстановка...")
+
+
+if __name__ == "__main__":
+    main()
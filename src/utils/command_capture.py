@@ -0,0 +1,225 @@
+"""
+Модуль для потоковой записи голосовой команды после wake word.
+Аудио подаётся в recognizer по мере того, как пользователь говорит; запись
+заканчивается, как только recognizer финализирует фразу, частичный текст уже
+разбирается в полную задачу или наступает пауза. Отдельного прохода STT по
+записанному файлу нет — на выходе сразу финальный текст для NLU.
+"""
+import json
+import threading
+import time
+import wave
+from typing import Dict, Optional
+
+import numpy as np
+
+from src.models.speech_to_text import SpeechToText
+from src.utils.ring_buffer import AudioRingBuffer
+from src.utils.voice_activity import EnergyVadGate
+from src.utils.command_parser import parse_command
+from src.utils.metrics import metrics
+from src.utils.wake_word_detector import load_sounddevice
+
+# Слова отмены записи. Команда отменяется, только если сказано одно из них целиком:
+# "останови музыку" — это команда, а не отмена.
+CANCEL_WORDS = {"стоп", "отмена", "отменить", "выход", "останови"}
+
+# Действия, для которых задача неполна без значения ("поставь температуру на ...")
+VALUE_ACTIONS = {"поставь", "измени"}
+
+# Причины окончания записи
+END_FINAL = "final"        # recognizer сам финализировал фразу
+END_COMPLETE = "complete"  # частичный текст уже разбирается в полную задачу
+END_PAUSE = "pause"        # пауза после речи
+END_TIMEOUT = "timeout"    # речь не началась или превышена максимальная длительность
+END_CANCEL = "cancel"      # пользователь отменил команду стоп-словом
+
+
+def is_complete_command(text: str) -> bool:
+    """
+    Проверяет, разбирается ли текст в законченную команду: у каждого сегмента
+    есть действие и объект, а у действий вроде "поставь" — ещё и значение.
+    """
+    tasks = parse_command(text)
+    if not tasks:
+        return False
+    for task in tasks:
+        if not task.action or not task.object:
+            return False
+        if task.action in VALUE_ACTIONS and not task.value:
+            return False
+    return True
+
+
+class StreamingCommandCapture:
+    def __init__(self, stt: SpeechToText, sample_rate: int = 16000, chunk_size: int = 1600,
+                 max_duration: float = 10.0, pause_threshold: float = 1.0,
+                 start_timeout: float = 5.0, stable_time: float = 0.4, audio=None):
+        """
+        Инициализация потоковой записи команды.
+        :param stt: экземпляр SpeechToText (модель берётся из общего реестра)
+        :param sample_rate: частота дискретизации
+        :param chunk_size: размер блока аудио
+        :param max_duration: максимальная длительность команды в секундах
+        :param pause_threshold: пауза после речи, завершающая запись, в секундах
+        :param start_timeout: сколько ждать начала речи, в секундах
+        :param stable_time: сколько частичный текст полной команды должен не меняться,
+                            чтобы не оборвать составное число ("двадцать | два")
+        :param audio: источник звука с InputStream в стиле sounddevice (по умолчанию sounddevice;
+                      для прогона записей — src.utils.replay.FakeSoundDevice)
+        """
+        self.stt = stt
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.max_samples = int(sample_rate * max_duration)
+        self.start_timeout_samples = int(sample_rate * start_timeout)
+        self.stable_samples = int(sample_rate * stable_time)
+        self.vad = EnergyVadGate(sample_rate=sample_rate, hangover_ms=int(pause_threshold * 1000))
+        # Буфер вмещает всю команду и ещё полсекунды: после окончания команды callback
+        # дописывает блоки, пока поток не закрыт, и не должен затереть её начало
+        self.ring = AudioRingBuffer(self.max_samples + chunk_size + sample_rate // 2, dtype=np.int16)
+        self._data_ready = threading.Event()
+        self._recognizer = None
+        self._reset_state()
+
+    def _reset_state(self):
+        self._results = []
+        self._partial = ''
+        self._partial_since = 0
+        self._speech_started = False
+        self._processed = 0
+        self._start_position = self.ring.total_written  # Абсолютная позиция начала команды в буфере
+        self.end_reason = None
+
+    def _audio_callback(self, indata, frames, time_info, status):
+        """Callback для записи аудио в кольцевой буфер."""
+        if status:
+            print(f"Audio status: {status}")
+        self.ring.write(indata)
+        self._data_ready.set()
+
+    def _get_recognizer(self):
+        if self._recognizer is None:
+            self._recognizer = self.stt.create_recognizer(self.sample_rate, words=True)
+        else:
+            self._recognizer.Reset()
+        return self._recognizer
+
+    def start(self):
+        """Сбрасывает состояние перед новой командой."""
+        self._get_recognizer()
+        self.vad.reset()
+        self.ring.clear()
+        self._reset_state()
+
+    def feed(self, samples: np.ndarray) -> Optional[str]:
+        """
+        Подаёт блок int16 в recognizer и решает, закончилась ли команда.
+        :param samples: блок сэмплов int16 mono
+        :return: None — продолжать запись, иначе причина окончания (END_*)
+        """
+        rec = self._recognizer
+        self._processed += len(samples)
+        speech = self.vad.process(samples)
+        if speech:
+            self._speech_started = True
+
+        if rec.AcceptWaveform(samples.tobytes()):
+            result = json.loads(rec.Result())
+            if result.get('text'):
+                self._results.append(result)
+                return END_FINAL
+        else:
+            partial = json.loads(rec.PartialResult()).get('partial', '')
+            if partial != self._partial:
+                self._partial = partial
+                self._partial_since = self._processed
+                words = partial.split()
+                if words and all(word in CANCEL_WORDS for word in words):
+                    return END_CANCEL
+            elif (partial and self._processed - self._partial_since >= self.stable_samples
+                  and is_complete_command(partial)):
+                return END_COMPLETE
+
+        if self._speech_started and not speech:
+            return END_PAUSE
+        if not self._speech_started and self._processed >= self.start_timeout_samples:
+            return END_TIMEOUT
+        if self._processed >= self.max_samples:
+            return END_TIMEOUT
+        return None
+
+    def finish(self) -> Dict:
+        """Дораспознаёт хвост фразы и возвращает итог: {'text', 'words', 'confidence', ...}."""
+        self._results.append(json.loads(self._recognizer.FinalResult()))
+        result = SpeechToText.merge_results(self._results)
+        result['end_reason'] = self.end_reason
+        result['duration'] = self._processed / self.sample_rate
+        return result
+
+    def capture(self, save_path: Optional[str] = None) -> Optional[Dict]:
+        """
+        Записывает команду с микрофона, распознавая её по ходу речи.
+        :param save_path: если указан, записанное аудио сохраняется в WAV после окончания
+        :return: результат распознавания или None, если команда отменена стоп-словом
+        """
+        self.start()
+        self._data_ready.clear()
+        position = self._start_position
+        started = time.perf_counter()
+
+        if self.audio is None:
+            self.audio = load_sounddevice()
+        with self.audio.InputStream(samplerate=self.sample_rate, channels=1, dtype='int16',
+                                    callback=self._audio_callback, blocksize=self.chunk_size):
+            while self.end_reason is None:
+                if not self._data_ready.wait(timeout=0.1):
+                    continue
+                self._data_ready.clear()
+                new_samples, position = self.ring.read_since(position)
+                metrics.set_gauge("capture_audio_queue_samples", len(new_samples))
+                for start in range(0, len(new_samples), self.chunk_size):
+                    with metrics.span("capture_decode_seconds"):
+                        reason = self.feed(new_samples[start:start + self.chunk_size])
+                    if reason is not None:
+                        self.end_reason = reason
+                        break
+
+        metrics.inc(f"capture_end_{self.end_reason}_total")
+        if self.end_reason == END_CANCEL:
+            print("Стоп-слово: запись команды отменена")
+            return None
+        # Копируем сразу: дальше буфер может понадобиться следующей команде
+        audio = self.command_audio() if save_path else None
+
+        with metrics.span("capture_finalize_seconds"):
+            result = self.finish()
+        result['capture_sec'] = time.perf_counter() - started
+        metrics.observe("capture_seconds", result['capture_sec'])
+        if save_path:
+            self.save(save_path, audio)
+        return result
+
+    def command_audio(self) -> np.ndarray:
+        """
+        Копия аудио команды: ровно те сэмплы, что были поданы в recognizer,
+        без блоков, которые callback дописал после окончания команды.
+        """
+        audio, total = self.ring.read_since(self._start_position)
+        # read_since отдаёт не больше capacity сэмплов, поэтому лишнее отрезаем с конца
+        tail = total - (self._start_position + self._processed)
+        return audio[:max(len(audio) - tail, 0)].copy()
+
+    def save(self, path: str, audio: Optional[np.ndarray] = None):
+        """
+        Сохраняет записанную команду в WAV (вне горячего пути).
+        :param audio: сэмплы команды (по умолчанию command_audio())
+        """
+        if audio is None:
+            audio = self.command_audio()
+        with wave.open(path, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.sample_rate)
+            wf.writeframes(audio.tobytes())
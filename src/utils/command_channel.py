@@ -0,0 +1,267 @@
+"""
+Модуль канала команд к прошивке: каждый отправленный кадр получает Future,
+который завершается строкой ответа OK/ERROR/PONG.
+
+Прошивка обрабатывает команды строго по очереди: на каждую печатает эхо
+"Received: <кадр>", а затем одну строку ответа. По эху канал узнаёт, какую
+команду прошивка взяла в работу (и какие до неё потерялись), а следующая строка
+OK/ERROR/PONG относится именно к ней. Несколько команд могут быть в пути
+одновременно, но не больше max_in_flight, а ещё не прочитанные прошивкой кадры
+не должны переполнить её приёмный буфер. Потерянные и не подтверждённые
+вовремя команды отправляются повторно, но только если для того же устройства
+(SET:type:pin) нет более новой команды: иначе повтор пришёл бы к прошивке после
+неё и вернул бы устройство в старое состояние. Такая вытесненная команда отменяется.
+
+Пример:
+    channel = CommandChannel(ser.write)
+    futures = channel.submit_many(["SET:light:4:1", "SET:servo:12:90"])
+    # в потоке чтения Serial: channel.feed_line(line)
+    result = futures[0].result(timeout=10)   # CommandResult(ok=True, reply="OK: Light ON", ...)
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Deque, Iterable, List, Optional
+
+from src.utils.command_compiler import FIRMWARE_RX_BUFFER
+from src.utils.metrics import metrics
+from src.utils.serial_link import REPLY_TIMEOUT
+
+# Сколько команд может ждать ответа одновременно
+MAX_IN_FLIGHT = 4
+# Сколько ждать ответа на команду, стоящую первой в очереди прошивки, с
+# (прошивка берёт её в работу не позже FIRMWARE_COMMAND_LATENCY, остальное — запас на линию)
+DEFAULT_TIMEOUT = REPLY_TIMEOUT
+# Сколько раз повторять потерянную команду
+DEFAULT_RETRIES = 1
+
+ECHO_PREFIX = "Received:"
+
+
+@dataclass(frozen=True)
+class CommandResult:
+    frame: str
+    reply: str
+    ok: bool          # False для ответа ERROR
+    latency: float    # от постановки в очередь до ответа, с
+    attempts: int     # сколько раз кадр отправлялся
+
+
+class _Pending:
+    __slots__ = ("frame", "key", "order", "future", "submitted", "attempts", "echoed", "deadline")
+
+    def __init__(self, frame: str, submitted: float, order: int):
+        self.frame = frame
+        self.key = device_key(frame)
+        self.order = order  # порядок постановки в очередь
+        self.future: Future = Future()
+        self.submitted = submitted
+        self.attempts = 0
+        self.echoed = False
+        self.deadline: Optional[float] = None
+
+
+def device_key(frame: str) -> Optional[str]:
+    """Устройство, которое меняет кадр ("SET:light:4"); None для кадров без состояния (PING)."""
+    if not frame.startswith("SET:"):
+        return None
+    return frame.rsplit(":", 1)[0]
+
+
+def is_reply(line: str) -> bool:
+    """Строка ответа прошивки на команду."""
+    return line.startswith("OK") or line.startswith("ERROR") or line == "PONG"
+
+
+class CommandChannel:
+    def __init__(self, write: Callable[[bytes], object], max_in_flight: int = MAX_IN_FLIGHT,
+                 timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 rx_buffer: int = FIRMWARE_RX_BUFFER):
+        """
+        :param write: функция записи байтов в порт (ser.write)
+        :param max_in_flight: сколько команд может ждать ответа одновременно
+        :param timeout: сколько ждать ответа на первую в очереди команду, с
+        :param retries: сколько раз повторять потерянную команду
+        :param rx_buffer: размер приёмного буфера прошивки в байтах
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight должен быть не меньше 1")
+        self.write = write
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.rx_buffer = rx_buffer
+        self._waiting: Deque[_Pending] = deque()
+        self._in_flight: Deque[_Pending] = deque()  # в порядке отправки
+        self._cond = threading.Condition()
+        self._watchdog: Optional[threading.Thread] = None
+        self._closed = False
+        self._order = itertools.count()
+        self.lost = 0        # Сколько команд прошивка не получила (нет эха)
+        self.timeouts = 0    # Сколько раз не дождались ответа
+        self.resent = 0      # Сколько повторных отправок
+        self.superseded = 0  # Сколько команд не повторено из-за более новой для того же устройства
+
+    def submit(self, frame: str) -> Future:
+        """
+        Ставит кадр в очередь; Future завершится CommandResult или TimeoutError
+        (или будет отменён, если кадр потерялся, а для устройства уже есть более новая команда).
+        """
+        return self.submit_many([frame])[0]
+
+    def submit_many(self, frames: Iterable[str]) -> List[Future]:
+        """Ставит кадры в очередь; те, что помещаются в окно, уходят одной записью."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Канал команд закрыт")
+            now = time.perf_counter()
+            items = [_Pending(frame, now, next(self._order)) for frame in frames]
+            self._waiting.extend(items)
+            self._pump(now)
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watch, name="command-channel", daemon=True)
+                self._watchdog.start()
+        return [item.future for item in items]
+
+    def feed_line(self, line: str) -> bool:
+        """
+        Передаёт каналу строку, прочитанную из порта.
+        :return: True, если строка — эхо или ответ на команду
+        """
+        if line.startswith(ECHO_PREFIX):
+            self._on_echo(line[len(ECHO_PREFIX):].strip())
+            return True
+        if is_reply(line):
+            self._on_reply(line)
+            return True
+        return False
+
+    @property
+    def pending(self) -> int:
+        """Сколько команд ещё не получили ответа (в очереди и в пути)."""
+        with self._cond:
+            return len(self._waiting) + len(self._in_flight)
+
+    def close(self):
+        """Отменяет неотправленные и неподтверждённые команды и останавливает сторожевой поток."""
+        with self._cond:
+            self._closed = True
+            for item in (*self._in_flight, *self._waiting):
+                item.future.cancel()
+            self._in_flight.clear()
+            self._waiting.clear()
+            self._cond.notify_all()
+        watchdog = self._watchdog
+        if watchdog is not None and watchdog is not threading.current_thread():
+            watchdog.join(timeout=1)
+
+    # --- всё ниже вызывается под self._cond ---
+
+    def _on_echo(self, frame: str):
+        with self._cond:
+            now = time.perf_counter()
+            for i, item in enumerate(self._in_flight):
+                if not item.echoed and item.frame == frame:
+                    # Прошивка читает команды по порядку: всё, что было отправлено раньше, потеряно
+                    for lost in reversed(list(self._in_flight)[:i]):
+                        self.lost += 1
+                        metrics.inc("serial_lost_total")
+                        self._retry_or_fail(lost, "команда потеряна")
+                    item.echoed = True
+                    self._arm_head(now)
+                    break
+            self._pump(now)
+
+    def _on_reply(self, line: str):
+        with self._cond:
+            if not self._in_flight:
+                return  # Ответ на команду, которую уже повторили или отменили
+            now = time.perf_counter()
+            item = next((p for p in self._in_flight if p.echoed), self._in_flight[0])
+            self._in_flight.remove(item)
+            ok = not line.startswith("ERROR")
+            latency = now - item.submitted
+            metrics.observe("serial_ack_seconds", latency)
+            if not ok:
+                metrics.inc("serial_errors_total")
+            self._arm_head(now)
+            self._pump(now)
+            item.future.set_result(CommandResult(item.frame, line, ok, latency, item.attempts))
+
+    def _arm_head(self, now: float):
+        """Запускает таймаут для команды, которая теперь первая в очереди прошивки."""
+        if self._in_flight and self._in_flight[0].deadline is None:
+            self._in_flight[0].deadline = now + self.timeout
+            self._cond.notify_all()
+
+    def _retry_or_fail(self, item: _Pending, reason: str):
+        self._in_flight.remove(item)
+        item.deadline = None
+        item.echoed = False
+        if self._is_superseded(item):
+            # Повтор пришёл бы после более новой команды и отменил бы её
+            self.superseded += 1
+            metrics.inc("serial_superseded_total")
+            item.future.cancel()
+        elif item.attempts <= self.retries:
+            self.resent += 1
+            metrics.inc("serial_retries_total")
+            self._waiting.appendleft(item)
+        else:
+            item.future.set_exception(TimeoutError(f"Нет ответа на {item.frame}: {reason} "
+                                                   f"(попыток: {item.attempts})"))
+
+    def _is_superseded(self, item: _Pending) -> bool:
+        if item.key is None:
+            return False
+        return any(other.key == item.key and other.order > item.order
+                   for other in itertools.chain(self._in_flight, self._waiting))
+
+    def _pump(self, now: float):
+        """Отправляет ожидающие кадры, пока есть место в окне и в буфере прошивки."""
+        unread = sum(len(p.frame) + 1 for p in self._in_flight if not p.echoed)
+        batch = []
+        while self._waiting and len(self._in_flight) < self.max_in_flight:
+            size = len(self._waiting[0].frame) + 1
+            if self._in_flight and unread + size > self.rx_buffer:
+                break
+            item = self._waiting.popleft()
+            item.attempts += 1
+            self._in_flight.append(item)
+            batch.append(item)
+            unread += size
+        if batch:
+            payload = "".join(f"{item.frame}\n" for item in batch).encode("utf-8")
+            try:
+                with metrics.span("serial_write_seconds"):
+                    self.write(payload)
+            except Exception as e:
+                metrics.inc("serial_write_errors_total")
+                for item in batch:
+                    self._in_flight.remove(item)
+                    item.future.set_exception(e)
+            else:
+                metrics.inc("serial_commands_total", len(batch))
+            self._arm_head(now)
+        metrics.set_gauge("serial_in_flight", len(self._in_flight))
+
+    def _watch(self):
+        """Сторожевой поток: повторяет или завершает с ошибкой команды без ответа."""
+        with self._cond:
+            while not self._closed:
+                head = self._in_flight[0] if self._in_flight else None
+                if head is None or head.deadline is None:
+                    self._cond.wait()
+                    continue
+                now = time.perf_counter()
+                if now < head.deadline:
+                    self._cond.wait(head.deadline - now)
+                    continue
+                self.timeouts += 1
+                metrics.inc("serial_timeouts_total")
+                self._retry_or_fail(head, "таймаут")
+                self._arm_head(now)
+                self._pump(now)
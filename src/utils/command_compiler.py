@@ -0,0 +1,241 @@
+"""
+Модуль для перевода разобранных команд в кадры прошивки arduino_controller.ino.
+Прошивка понимает только PING и SET:type:pin:value (и SET:target_temp:value),
+поэтому распознанный текст на Arduino не отправляется: задачи CommandParser
+сопоставляются с таблицей устройств, значения проверяются на стороне хоста,
+а кадры одной фразы собираются в одну запись в порт.
+
+Пример:
+    compiler = CommandCompiler()
+    batch = compiler.compile(parse_command("включи свет и открой окно на 50 процентов"))
+    for payload in batch.payloads():
+        ser.write(payload)          # b"SET:light:4:1\\nSET:servo:12:90\\n"
+    for task, reason in batch.rejected:
+        print(f"Не отправлено: {task.text} ({reason})")
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+from src.utils.command_parser import Task
+from src.utils.telemetry import CMD_BINARY, CMD_TEXT
+
+# Размер приёмного буфера Serial у Arduino Uno: одна запись в порт не должна его превышать
+FIRMWARE_RX_BUFFER = 64
+
+# Действия, которые включают/открывают устройство и выключают/закрывают его
+ON_ACTIONS = ("включи", "открой")
+OFF_ACTIONS = ("выключи", "закрой")
+# Действия, которые задают значение из команды ("поставь температуру 22 градуса")
+SET_ACTIONS = ("поставь", "измени")
+
+Number = Union[int, float]
+
+_NUMBER_RE = re.compile(r"^(-?\d+(?:\.\d+)?)\s*(%|градус\w*)?$")
+
+
+@dataclass(frozen=True, slots=True)
+class Device:
+    type: str                            # тип устройства в кадре SET:type:pin:value
+    pin: Optional[int]                   # None — кадр без пина (SET:target_temp:value)
+    min_value: Number = 0
+    max_value: Number = 1
+    switchable: bool = True              # понимает ли устройство "включи/выключи"
+    fractional: bool = False             # допускает ли прошивка дробное значение
+    rooms: Optional[FrozenSet[str]] = None  # None — устройство отвечает за любую комнату
+
+    def frame(self, value: Number) -> str:
+        """Кадр команды для прошивки."""
+        if not self.fractional or float(value).is_integer():
+            value = int(value)
+        if self.pin is None:
+            return f"SET:{self.type}:{value}"
+        return f"SET:{self.type}:{self.pin}:{value}"
+
+
+# Устройства, подключённые к arduino_controller.ino (пины совпадают с прошивкой)
+DEFAULT_DEVICES: Dict[str, Device] = {
+    "свет": Device("light", 4),
+    "окно": Device("servo", 12, 0, 180),
+    "обогреватель": Device("heating", 8),
+    "вентилятор": Device("fan", 13),
+    "сигнализация": Device("alarm", 11),
+    "температура": Device("target_temp", None, 5, 35, switchable=False, fractional=True),
+}
+
+
+@dataclass
+class CompiledBatch:
+    frames: List[str] = field(default_factory=list)
+    tasks: List[Task] = field(default_factory=list)              # задача для каждого кадра
+    rejected: List[Tuple[Task, str]] = field(default_factory=list)  # задача и причина отказа
+
+    def add(self, frame: str, task: Task):
+        """
+        Добавляет кадр задачи. Если одно устройство упомянуто несколько раз, остаётся только
+        последняя команда: прошивка всё равно оставит последнее состояние.
+        """
+        key = frame.rsplit(":", 1)[0]
+        for i, previous in enumerate(self.frames):
+            if previous.rsplit(":", 1)[0] == key:
+                del self.frames[i]
+                del self.tasks[i]
+                break
+        self.frames.append(frame)
+        self.tasks.append(task)
+
+    def payloads(self, limit: int = FIRMWARE_RX_BUFFER) -> List[bytes]:
+        """
+        Кадры, склеенные в записи не длиннее limit байт (обычно вся фраза — одна запись).
+        :param limit: максимальный размер одной записи в порт
+        :return: список байтовых строк для ser.write
+        """
+        payloads = []
+        current = b""
+        for frame in self.frames:
+            line = f"{frame}\n".encode("ascii")
+            if current and len(current) + len(line) > limit:
+                payloads.append(current)
+                current = b""
+            current += line
+        if current:
+            payloads.append(current)
+        return payloads
+
+    def __bool__(self) -> bool:
+        return bool(self.frames)
+
+
+class CommandCompiler:
+    def __init__(self, devices: Optional[Dict[str, Device]] = None):
+        """
+        :param devices: таблица "объект словаря → устройство" (по умолчанию DEFAULT_DEVICES)
+        """
+        self.devices = dict(devices) if devices is not None else dict(DEFAULT_DEVICES)
+        self._by_frame_type = {device.type: device for device in self.devices.values()}
+
+    def compile_task(self, task: Task) -> str:
+        """
+        Переводит одну задачу в кадр.
+        :return: кадр вида "SET:light:4:1"
+        :raises ValueError: если задачу нельзя выполнить на прошивке (причина в тексте ошибки)
+        """
+        if task.action is None:
+            raise ValueError("не указано действие")
+        if task.object is None:
+            raise ValueError("не указано устройство")
+        device = self.devices.get(task.object)
+        if device is None:
+            raise ValueError(f"устройство '{task.object}' не подключено")
+        if device.rooms is not None and task.room is not None and task.room not in device.rooms:
+            raise ValueError(f"устройство '{task.object}' не установлено в комнате '{task.room}'")
+
+        if task.action in ON_ACTIONS or task.action in OFF_ACTIONS:
+            if not device.switchable:
+                raise ValueError(f"действие '{task.action}' не применимо к '{task.object}'")
+            if task.value is not None and device.max_value != 1 and task.action in ON_ACTIONS:
+                value = parse_value(task.value, device)     # "открой окно на 50%"
+            else:
+                value = device.max_value if task.action in ON_ACTIONS else device.min_value
+        elif task.action in SET_ACTIONS:
+            if task.value is None:
+                raise ValueError("не указано значение")
+            value = parse_value(task.value, device)
+        else:
+            # Прошивка не хранит и не отдаёт состояние для относительных команд ("увеличь")
+            raise ValueError(f"действие '{task.action}' не поддерживается прошивкой")
+
+        if not device.min_value <= value <= device.max_value:
+            raise ValueError(f"значение {value} вне диапазона {device.min_value}..{device.max_value}")
+        return device.frame(value)
+
+    def compile(self, tasks: Iterable[Task]) -> CompiledBatch:
+        """
+        Переводит задачи одной фразы в пакет кадров (см. CompiledBatch.add).
+        """
+        batch = CompiledBatch()
+        for task in tasks:
+            try:
+                frame = self.compile_task(task)
+            except ValueError as e:
+                batch.rejected.append((task, str(e)))
+                continue
+            batch.add(frame, task)
+        return batch
+
+    def validate_frame(self, frame: str) -> str:
+        """
+        Проверяет готовый кадр (например, введённый вручную) по таблице устройств.
+        :return: кадр без пробелов по краям
+        :raises ValueError: если прошивка его не примет
+        """
+        frame = frame.strip()
+        if frame in ("PING", CMD_BINARY, CMD_TEXT):
+            return frame
+        parts = frame.split(":")
+        if parts[0] != "SET" or len(parts) not in (3, 4):
+            raise ValueError(f"неверный формат кадра: {frame}")
+        device = self._by_frame_type.get(parts[1])
+        if device is None:
+            raise ValueError(f"неизвестный тип устройства: {parts[1]}")
+        if (device.pin is None) != (len(parts) == 3):
+            raise ValueError(f"неверный формат кадра: {frame}")
+        if device.pin is not None and parts[2] != str(device.pin):
+            raise ValueError(f"устройство {device.type} подключено к пину {device.pin}, а не {parts[2]}")
+        try:
+            value = float(parts[-1]) if device.fractional else int(parts[-1])
+        except ValueError:
+            raise ValueError(f"неверное значение: {parts[-1]}")
+        if not device.min_value <= value <= device.max_value:
+            raise ValueError(f"значение {parts[-1]} вне диапазона {device.min_value}..{device.max_value}")
+        return frame
+
+
+def parse_value(value: str, device: Device) -> Number:
+    """
+    Переводит значение задачи ("22 градусов", "50%", "максимум", "5") в число для устройства.
+    Проценты отсчитываются от диапазона устройства: "окно на 50%" → угол 90.
+    :raises ValueError: если значение не числовое
+    """
+    if value == "максимум":
+        return device.max_value
+    if value == "минимум":
+        return device.min_value
+    match = _NUMBER_RE.match(value)
+    if match is None:
+        raise ValueError(f"значение '{value}' не подходит для устройства")
+    number = float(match.group(1))
+    if match.group(2) == "%":
+        number = device.min_value + (device.max_value - device.min_value) * number / 100
+    if not device.fractional:
+        number = round(number)
+    elif number.is_integer():
+        number = int(number)
+    return number
+
+
+# Команды ArduinoVoiceController.send_direct_command: имя → (действие, объект)
+DIRECT_COMMANDS = {
+    "alarm_on": ("включи", "сигнализация"),
+    "alarm_off": ("выключи", "сигнализация"),
+    "light_on": ("включи", "свет"),
+    "light_off": ("выключи", "свет"),
+    "window_open": ("открой", "окно"),
+    "window_close": ("закрой", "окно"),
+    "heater_on": ("включи", "обогреватель"),
+    "heater_off": ("выключи", "обогреватель"),
+    "fan_on": ("включи", "вентилятор"),
+    "fan_off": ("выключи", "вентилятор"),
+}
+
+
+def direct_task(name: str) -> Optional[Task]:
+    """Задача для именованной команды из DIRECT_COMMANDS (None, если имя неизвестно)."""
+    if name not in DIRECT_COMMANDS:
+        return None
+    action, obj = DIRECT_COMMANDS[name]
+    return Task(action=action, object=obj, value=None, room=None, text=name, span=(0, len(name)))
+
+
+# Общий компилятор процесса
+default_compiler = CommandCompiler()
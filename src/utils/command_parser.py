@@ -0,0 +1,233 @@
+"""
+Единый конвейер NLU: распознанный текст → список задач.
+Текст нормализуется и токенизируется один раз; сегментация, поиск действий,
+объектов, комнат и местоимений, разбор чисел и разрешение комнат работают
+с одним и тем же списком токенов. Спаны задаются в нормализованном тексте
+(его длина совпадает с исходным, поэтому спаны подходят и для исходной строки).
+
+Частые фразы ("включи свет", "поставь температуру на 22") разбираются один раз:
+результаты хранятся в ограниченном LRU-кэше по последовательности токенов (регистр,
+пунктуация и лишние пробелы не важны), который сбрасывается при перезагрузке словаря.
+cache_size=0 отключает кэш (например, чтобы замерять сам разбор).
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.utils.location_extractor import ends_with_reference, resolve_rooms
+from src.utils.metrics import metrics
+from src.utils.numerals import parse_numbers
+from src.utils.task_extractor import select_value
+from src.utils.text_segments import CommandSegmenter
+from src.utils.tokenizer import Token, tokenize
+from src.utils.vocabulary import Vocabulary, VocabularyStore, default_store
+
+Span = Tuple[int, int]
+
+# Размер LRU-кэша разобранных фраз по умолчанию
+DEFAULT_CACHE_SIZE = 256
+
+
+@dataclass(frozen=True, slots=True)
+class Task:
+    action: Optional[str]
+    object: Optional[str]
+    value: Optional[str]
+    room: Optional[str]
+    text: str                           # текст сегмента из исходной строки
+    span: Span                          # спан сегмента
+    action_span: Optional[Span] = None
+    object_span: Optional[Span] = None
+    value_span: Optional[Span] = None
+    room_span: Optional[Span] = None    # None, если комната унаследована или не указана
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        """Словарь в формате extract_task с добавленной комнатой."""
+        return {
+            'action': self.action,
+            'object': self.object,
+            'value': self.value,
+            'room': self.room,
+            'full_text': self.text,
+        }
+
+
+class CommandParser:
+    def __init__(self, store: Optional[VocabularyStore] = None, cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Конвейер разбора команд. Сегментатор строится по словарю действий
+        и пересобирается, только когда словарь перезагружен.
+        :param store: хранилище словаря (по умолчанию общее хранилище процесса)
+        :param cache_size: сколько разобранных фраз хранить в LRU-кэше (0 — без кэша)
+        """
+        if cache_size < 0:
+            raise ValueError("cache_size не может быть отрицательным")
+        self.store = store if store is not None else default_store
+        self.cache_size = cache_size
+        self._segmenter: Optional[CommandSegmenter] = None
+        self._generation = None
+        self._cache: "OrderedDict[Tuple[str, ...], Tuple[List[Token], Tuple[Task, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0       # Сколько фраз отдано из кэша
+        self.misses = 0     # Сколько фраз разобрано заново
+        self.evictions = 0  # Сколько фраз вытеснено по LRU
+
+    def _prepare(self, vocabulary: Vocabulary) -> CommandSegmenter:
+        """Пересобирает сегментатор и сбрасывает кэш, если словарь перезагружен."""
+        if self._segmenter is None or self._generation != vocabulary.generation:
+            with self._lock:
+                self._cache.clear()
+                self._segmenter = CommandSegmenter.from_actions(vocabulary.actions)
+                self._generation = vocabulary.generation
+        return self._segmenter
+
+    def parse(self, text: str) -> List[Task]:
+        """
+        Разбирает фразу в задачи (повторные фразы берутся из кэша).
+        Пример: "включи свет в гостиной и там же закрой шторы" →
+            [Task(action='включи', object='свет', room='гостиная', ...),
+             Task(action='закрой', object='шторы', room='гостиная', ...)]
+        """
+        with metrics.span("nlu_parse_seconds"):
+            return self._parse_cached(text)
+
+    def _parse_cached(self, text: str) -> List[Task]:
+        vocabulary = self.store.get()
+        segmenter = self._prepare(vocabulary)
+        tokens = tokenize(text)
+        if not self.cache_size:
+            return self._parse(text, tokens, vocabulary, segmenter)
+
+        # Разбор зависит только от токенов: регистр, пунктуация и пробелы на него не влияют
+        key = tuple(token.text for token in tokens)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+        if cached is not None:
+            metrics.inc("nlu_cache_hits_total")
+            cached_tokens, tasks = cached
+            if cached_tokens == tokens:
+                # Токены на тех же местах: спаны совпадают, обновляем только тексты
+                return [replace(task, text=text[task.span[0]:task.span[1]]) for task in tasks]
+            try:
+                return _move_spans(tasks, cached_tokens, tokens, text)
+            except KeyError:
+                # Спан не на границе токена — переносить нечего, разбираем заново
+                return self._parse(text, tokens, vocabulary, segmenter)
+
+        metrics.inc("nlu_cache_misses_total")
+        tasks = self._parse(text, tokens, vocabulary, segmenter)
+        with self._lock:
+            self.misses += 1
+            if self._generation == vocabulary.generation:
+                self._cache[key] = (tokens, tuple(tasks))
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                    self.evictions += 1
+        return tasks
+
+    def cache_info(self) -> Dict[str, int]:
+        """Статистика кэша: попадания, промахи, вытеснения и текущий размер."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._cache), "max_size": self.cache_size}
+
+    def clear_cache(self):
+        """Очищает кэш разобранных фраз."""
+        with self._lock:
+            self._cache.clear()
+
+    def _parse(self, text: str, tokens: List[Token], vocabulary: Vocabulary,
+               segmenter: CommandSegmenter) -> List[Task]:
+        spans = segmenter.split_tokens(tokens)
+        numbers = parse_numbers(tokens, vocabulary.numeral_forms)
+        matcher = vocabulary.matcher
+
+        found = []
+        mentions = []
+        number_index = 0
+        for begin, end in spans:
+            segment_tokens = tokens[begin:end]
+            # Совпадения ищутся в пределах сегмента, как и при разборе каждого сегмента отдельно
+            first = {}
+            pronouns = []
+            for match in matcher.find_tokens(segment_tokens):
+                if match.category == "pronoun":
+                    pronouns.append(match)
+                else:
+                    first.setdefault(match.category, match)
+
+            while number_index < len(numbers) and numbers[number_index].token_start < begin:
+                number_index += 1
+            segment_numbers = []
+            while number_index < len(numbers) and numbers[number_index].token_end <= end:
+                segment_numbers.append(numbers[number_index])
+                number_index += 1
+
+            room = first.get("room")
+            mentions.append((room.canonical if room else None, bool(pronouns),
+                             ends_with_reference(pronouns, len(segment_tokens))))
+            found.append((begin, end, segment_tokens, first, segment_numbers))
+
+        tasks = []
+        for (begin, end, segment_tokens, first, segment_numbers), room in zip(found, resolve_rooms(mentions)):
+            start, stop = tokens[begin].start, tokens[end - 1].end
+            value = select_value(segment_tokens, segment_numbers)
+            number = next((n for n in segment_numbers if n.unit is not None), segment_numbers[0]) \
+                if segment_numbers else None
+            tasks.append(Task(
+                action=_canonical(first.get("action")),
+                object=_canonical(first.get("object")),
+                value=value,
+                room=room,
+                text=text[start:stop],
+                span=(start, stop),
+                action_span=_span(first.get("action")),
+                object_span=_span(first.get("object")),
+                value_span=(number.start, number.end) if number is not None else None,
+                room_span=_span(first.get("room")),
+            ))
+        return tasks
+
+    def parse_many(self, texts: Iterable[str]) -> List[List[Task]]:
+        """Разбирает набор фраз (например, для оценки на корпусе команд)."""
+        return [self.parse(text) for text in texts]
+
+
+def _move_spans(tasks: Iterable[Task], old: List[Token], new: List[Token], text: str) -> List[Task]:
+    """
+    Переносит задачи, разобранные для одной записи фразы, на другую запись с теми же токенами.
+    Спаны переносятся по границам токенов; KeyError — если спан не лежит на границах токенов.
+    """
+    starts = {a.start: b.start for a, b in zip(old, new)}
+    ends = {a.end: b.end for a, b in zip(old, new)}
+
+    def move(span: Optional[Span]) -> Optional[Span]:
+        return (starts[span[0]], ends[span[1]]) if span is not None else None
+
+    moved = []
+    for task in tasks:
+        span = move(task.span)
+        moved.append(replace(task, text=text[span[0]:span[1]], span=span, action_span=move(task.action_span),
+                             object_span=move(task.object_span), value_span=move(task.value_span),
+                             room_span=move(task.room_span)))
+    return moved
+
+
+def _canonical(match) -> Optional[str]:
+    return match.canonical if match is not None else None
+
+
+def _span(match) -> Optional[Span]:
+    return (match.start, match.end) if match is not None else None
+
+
+# Общий конвейер процесса
+default_parser = CommandParser()
+
+
+def parse_command(text: str) -> List[Task]:
+    """Разбирает фразу общим конвейером (см. CommandParser.parse)."""
+    return default_parser.parse(text)
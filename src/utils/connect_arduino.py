@@ -1,19 +1,32 @@
-import serial
 import json
 import time
 import threading
 import queue
 import speech_recognition as sr
 from datetime import datetime
+from functools import partial
+from src.utils.command_channel import CommandChannel, ECHO_PREFIX, is_reply
+from src.utils.command_compiler import default_compiler, direct_task
+from src.utils.command_parser import parse_command
+from src.utils.metrics import metrics
+from src.utils.serial_link import open_link
+from src.utils.telemetry import CMD_BINARY, CMD_TEXT, TelemetryDemux, TelemetryLog
+
+# Метка в очереди данных, по которой поток обработки завершается
+_STOP = None
 
 class ArduinoVoiceController:
-    def __init__(self, port='COM3', baudrate=115200):
-        self.ser = serial.Serial(port, baudrate, timeout=1)
+    def __init__(self, port=None, baudrate=None, binary_telemetry=False):
+        # Порт ищется автоматически, скорость согласуется с прошивкой (см. serial_link)
+        self.ser, self.link = open_link(port, baudrate)
         self.data_queue = queue.Queue()
         self.command_queue = queue.Queue()
         self.running = True
         self.last_data = {}
-        time.sleep(2)  # Ожидание инициализации Arduino
+        # Двоичные кадры телеметрии складываются сюда прямо в потоке чтения
+        self.telemetry = TelemetryLog()
+        # Команды, ожидающие ответа OK/ERROR (конвейер с таймаутами и повторами)
+        self.channel = CommandChannel(self.ser.write)
         
         # Запуск потоков
         self.read_thread = threading.Thread(target=self._read_serial)
@@ -24,36 +37,42 @@ class ArduinoVoiceController:
         self.process_thread.start()
         self.voice_thread.start()
         
-        print("Система голосового управления Arduino запущена")
+        if binary_telemetry:
+            self.set_binary_telemetry(True)
+        
+        print(f"Система голосового управления Arduino запущена: {self.link.port}, {self.link.baudrate} бод")
         print("Скажите 'помощь' для списка команд")
     
     def _read_serial(self):
-        """Чтение данных из Serial в отдельном потоке"""
-        buffer = ""
+        """
+        Чтение данных из Serial в отдельном потоке.
+        read() блокируется до прихода данных (или до таймаута порта), после чего
+        забирается всё накопленное сразу; строки передаются в обработку без задержки.
+        """
+        splitter = TelemetryDemux(self.telemetry)
         while self.running:
             try:
-                if self.ser.in_waiting > 0:
-                    char = self.ser.read().decode('utf-8', errors='ignore')
-                    buffer += char
-                    
-                    if char == '\n' or char == '\r':
-                        if buffer.strip():
-                            self.data_queue.put(buffer.strip())
-                        buffer = ""
-            except:
-                pass
-            time.sleep(0.01)
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                if self.running:
+                    print(f"Ошибка чтения Serial: {e}")
+                    time.sleep(0.5)  # Не крутимся в цикле, если порт отвалился
+                continue
+            if data:
+                for line in splitter.feed(data):
+                    self.data_queue.put(line)
+        self.data_queue.put(_STOP)
     
     def _process_data(self):
-        """Обработка полученных данных"""
-        while self.running:
+        """Обработка полученных данных: поток спит в queue.get(), пока строк нет"""
+        while True:
+            line = self.data_queue.get()
+            if line is _STOP:
+                break
             try:
-                if not self.data_queue.empty():
-                    line = self.data_queue.get_nowait()
-                    self._handle_message(line)
-            except queue.Empty:
-                pass
-            time.sleep(0.01)
+                self._handle_message(line)
+            except Exception as e:
+                print(f"Ошибка обработки '{line}': {e}")
     
     def _handle_message(self, message):
         """Обработка разных типов сообщений от Arduino"""
@@ -81,9 +100,38 @@ class ArduinoVoiceController:
             # Игнорируем список команд при старте
             pass
         
+        elif message.startswith(ECHO_PREFIX):
+            # Эхо команды: по нему канал понимает, какую команду прошивка взяла в работу
+            self.channel.feed_line(message)
+        
+        elif is_reply(message):
+            # Ответ прошивки на команду завершает её Future в канале
+            self.channel.feed_line(message)
+            print(f"Ардуино: {message}")
+        
         else:
             print(f"Ардуино: {message}")
     
+    def set_binary_telemetry(self, enabled=True):
+        """
+        Переключение телеметрии прошивки на двоичные кадры (или обратно на текст).
+        Если прошивка не знает команды, телеметрия остаётся текстовой.
+        """
+        future = self.send_command(CMD_BINARY if enabled else CMD_TEXT)
+        if future is not None:
+            future.add_done_callback(self._report_telemetry_mode)
+        return future
+    
+    def _report_telemetry_mode(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        if not future.result().ok:
+            print("Прошивка не поддерживает двоичную телеметрию, остаётся текстовый режим")
+    
+    def current_data(self):
+        """Последние показания: из двоичной телеметрии, если она включена, иначе из DATA:"""
+        return self.telemetry.latest_dict() or self.last_data
+    
     def _display_data(self, data):
         """Отображение данных в консоли"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -125,22 +173,22 @@ class ArduinoVoiceController:
                             self.stop()
                             break
                         
-                        # Отправка команды на Arduino
-                        self.send_command(text)
+                        # Отправка команды на Arduino (только кадры, которые поймёт прошивка)
+                        self.send_voice_command(text)
                         
                         # Локальная обработка некоторых команд
-                        self._process_voice_command(text.lower())
+                        with metrics.span("nlu_local_seconds"):
+                            self._process_voice_command(text.lower())
                         
                     except sr.UnknownValueError:
                         print("Не понял, повторите")
-                        self.send_command("UNKNOWN")
                     except sr.RequestError:
                         print("Ошибка сервиса распознавания")
                         # Попробуем офлайн распознавание
                         try:
                             text = recognizer.recognize_sphinx(audio, language="ru-RU")
                             print(f"Офлайн: {text}")
-                            self.send_command(text)
+                            self.send_voice_command(text)
                         except:
                             pass
                             
@@ -153,43 +201,67 @@ class ArduinoVoiceController:
         """Локальная обработка голосовых команд"""
         command = command.lower()
         
+        data = self.current_data()
         if "температура" in command or "сколько градусов" in command:
-            if self.last_data:
-                print(f"Сейчас {self.last_data['temperature']}°C")
+            if data:
+                print(f"Сейчас {data['temperature']}°C")
         
         elif "статус" in command or "как дела" in command:
-            if self.last_data:
-                self._display_data(self.last_data)
+            if data:
+                self._display_data(data)
     
     def send_command(self, command):
-        """Отправка команды на Arduino"""
+        """
+        Отправка одного кадра на Arduino.
+        Возвращает Future с CommandResult (или None, если канал уже закрыт).
+        """
+        futures = self._submit([command])
+        return futures[0] if futures else None
+    
+    def send_voice_command(self, text):
+        """
+        Разбор голосовой команды и отправка её кадров SET: одной записью.
+        Задачи, которые прошивка не выполнит, на Arduino не уходят.
+        """
+        batch = default_compiler.compile(parse_command(text))
+        for task, reason in batch.rejected:
+            print(f"Не отправлено '{task.text}': {reason}")
+        if batch:
+            self._submit(batch.frames)
+        return batch
+    
+    def _submit(self, frames):
+        """Постановка кадров в канал команд; кадры одной фразы уходят в порт одной записью"""
         try:
-            self.ser.write(f"{command}\n".encode('utf-8'))
-            print(f"Отправлено: {command}")
-        except Exception as e:
+            futures = self.channel.submit_many(frames)
+        except RuntimeError as e:
             print(f"Ошибка отправки: {e}")
+            return []
+        print(f"Отправлено: {'; '.join(frames)}")
+        for frame, future in zip(frames, futures):
+            future.add_done_callback(partial(self._report_result, frame))
+        return futures
+    
+    def _report_result(self, frame, future):
+        """Сообщает о командах, на которые прошивка так и не ответила"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            print(f"Команда {frame} не выполнена: {error}")
     
     def send_direct_command(self, command):
-        """Отправка прямой команды (не голосовой)"""
-        commands = {
-            "alarm_on": "ALARM_ON",
-            "alarm_off": "ALARM_OFF",
-            "light_on": "LIGHT_ON",
-            "light_off": "LIGHT_OFF",
-            "window_open": "WINDOW_OPEN",
-            "window_close": "WINDOW_CLOSE",
-            "heater_on": "HEATER_ON",
-            "heater_off": "HEATER_OFF",
-            "fan_on": "FAN_ON",
-            "fan_off": "FAN_OFF",
-            "status": "STATUS",
-            "help": "HELP"
-        }
-        
-        if command in commands:
-            self.send_command(commands[command])
-        else:
-            self.send_command(command)
+        """Отправка прямой команды (не голосовой): имя из DIRECT_COMMANDS или готовый кадр"""
+        task = direct_task(command)
+        try:
+            if task is not None:
+                frame = default_compiler.compile_task(task)
+            else:
+                frame = default_compiler.validate_frame(command)
+        except ValueError as e:
+            print(f"Команда не отправлена: {e}")
+            return
+        self.send_command(frame)
     
     def _log_event(self, event_type, message):
         """Логирование событий в файл"""
@@ -201,7 +273,17 @@ class ArduinoVoiceController:
     def stop(self):
         """Остановка системы"""
         self.running = False
-        time.sleep(0.5)
+        self.channel.close()
+        # Прерываем блокирующее чтение, чтобы поток чтения завершился сразу, а не по таймауту
+        cancel_read = getattr(self.ser, "cancel_read", None)
+        if cancel_read is not None:
+            try:
+                cancel_read()
+            except Exception:
+                pass
+        for thread in (self.read_thread, self.process_thread):
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
         
         if self.ser.is_open:
             self.ser.close()
@@ -218,10 +300,9 @@ class ArduinoVoiceController:
 
 # Упрощенная версия без speech recognition
 class ArduinoSimpleController:
-    def __init__(self, port='COM3', baudrate=115200):
-        self.ser = serial.Serial(port, baudrate, timeout=1)
-        time.sleep(2)
-        print("Простой контроллер Arduino запущен")
+    def __init__(self, port=None, baudrate=None):
+        self.ser, self.link = open_link(port, baudrate)
+        print(f"Простой контроллер Arduino запущен: {self.link.port}, {self.link.baudrate} бод")
     
     def read_data(self):
         """Чтение данных от Arduino"""
@@ -233,14 +314,33 @@ class ArduinoSimpleController:
             return None
     
     def send_command(self, command):
-        """Отправка команды"""
-        self.ser.write(f"{command}\n".encode('utf-8'))
+        """
+        Отправка команды: имя из DIRECT_COMMANDS, готовый кадр (SET:..., PING)
+        или фраза на русском, которая переводится в кадры прошивки.
+        """
+        task = direct_task(command)
+        try:
+            if task is not None:
+                frames = [default_compiler.compile_task(task)]
+            elif command.upper() == "PING" or command.upper().startswith("SET:"):
+                frames = [default_compiler.validate_frame(command)]
+            else:
+                batch = default_compiler.compile(parse_command(command))
+                for rejected, reason in batch.rejected:
+                    print(f"Не отправлено '{rejected.text}': {reason}")
+                frames = batch.frames
+        except ValueError as e:
+            print(f"Команда не отправлена: {e}")
+            return
+        if frames:
+            self.ser.write("".join(f"{frame}\n" for frame in frames).encode('utf-8'))
     
     def interactive_mode(self):
         """Интерактивный режим с командной строки"""
         print("\nИнтерактивный режим")
         print("Команды: alarm_on, alarm_off, light_on, light_off")
-        print("         window_open, window_close, status, help")
+        print("         window_open, window_close, heater_on, heater_off, fan_on, fan_off")
+        print("         кадр прошивки (SET:light:4:1, PING)")
         print("         или голосовая команда на русском")
         print("Введите 'exit' для выхода\n")
         
@@ -276,13 +376,13 @@ if __name__ == "__main__":
     
     choice = input("Ваш выбор (1/2): ").strip()
     
-    # Замените 'COM3' на нужный порт
-    port = input("Порт Arduino (по умолчанию COM3): ").strip() or 'COM3'
+    # Без указания порта перебираются найденные USB-порты
+    port = input("Порт Arduino (Enter — найти автоматически): ").strip() or None
     
     try:
         if choice == "1":
             # Установите: pip install SpeechRecognition pyaudio
-            controller = ArduinoVoiceController(port=port)
+            controller = ArduinoVoiceController(port=port, binary_telemetry=True)
             controller.monitor()
         else:
             controller = ArduinoSimpleController(port=port)
@@ -1,8 +1,13 @@
 """
 Модуль для извлечения информации о комнатах/локациях из голосовых команд и разрешения анафор.
 """
-import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from src.utils.phrase_matcher import Match
+from src.utils.tokenizer import tokenize
+from src.utils.vocabulary import get_vocabulary
+# Встроенные словари. Рабочие словари загружаются из data/custom_dataset/synonyms.json
+# (см. src/utils/vocabulary.py); эти значения используются, если ключа в файле нет.
+
 # Список известных комнат/локаций (в именительном падеже)
 KNOWN_ROOMS = [
     "гостиная", "спальня", "кухня", "ванная", "туалет", "коридор", "прихожая",
@@ -29,100 +34,79 @@ CASE_ENDINGS = {
 # Местоимения, которые могут ссылаться на предыдущую комнату
 LOCATION_PRONOUNS = ["там", "туда", "в ней", "в нем", "там же", "в той же", "в этой", "и там же", "и там"]
 
+# Местоимения в конце сегмента, после которых следующий сегмент наследует комнату
+END_REFERENCES = ["там же", "и там же", "там", "и там"]
+
 def extract_room(text: str) -> Optional[str]:
     """
     Извлекает название комнаты из текста команды.
     Возвращает None, если комната не найдена.
-    Учитывает падежные формы комнат.
+    Учитывает падежные формы комнат; совпадения ищутся только целыми словами.
     """
-    text_lower = text.lower()
-    
-    # Сначала ищем именительный падеж
-    for room in KNOWN_ROOMS:
-        if room in text_lower:
-            return room
-    
-    # Ищем падежные формы
-    for room in KNOWN_ROOMS:
-        if room in CASE_ENDINGS:
-            for case_form in CASE_ENDINGS[room]:
-                if case_form in text_lower:
-                    return room
-    
-    # Ищем с предлогами "в", "на"
-    for room in KNOWN_ROOMS:
-        if f"в {room}" in text_lower or f"на {room}" in text_lower:
-            return room
-        if room in CASE_ENDINGS:
-            for case_form in CASE_ENDINGS[room]:
-                if f"в {case_form}" in text_lower or f"на {case_form}" in text_lower:
-                    return room
-    
-    return None
+    match = get_vocabulary().matcher.first(text, "room")
+    return match.canonical if match else None
 
-def resolve_location_reference(segments: List[str]) -> List[Dict[str, str]]:
+def ends_with_reference(pronouns: List[Match], segment_end: int) -> bool:
     """
-    Обрабатывает список сегментов команд, извлекая комнаты и разрешая анафоры.
-    Возвращает список словарей с полями: 'command', 'room', 'original_text'
+    Проверяет, заканчивается ли сегмент на "там же" или подобное.
+    :param pronouns: найденные в сегменте местоимения (по порядку)
+    :param segment_end: индекс токена после последнего токена сегмента
+    """
+    return bool(pronouns) and pronouns[-1].phrase in END_REFERENCES and pronouns[-1].token_end == segment_end
+
+def resolve_rooms(mentions: List[Tuple[Optional[str], bool, bool]]) -> List[Optional[str]]:
+    """
+    Разрешает комнаты сегментов по уже найденным упоминаниям.
+    :param mentions: для каждого сегмента тройка (комната или None, есть ли местоимение,
+                     заканчивается ли сегмент на "там же" и т.п.)
+    :return: комната каждого сегмента (явная или унаследованная) или None
     """
-    resolved = []
+    rooms = []
     last_room = None
     previous_had_reference = False  # Флаг, что предыдущий сегмент содержал "там же" и т.д.
-    
-    for i, segment in enumerate(segments):
-        segment_lower = segment.lower()
-        room = extract_room(segment)
-        
-        # Проверяем, есть ли местоимение, указывающее на предыдущую комнату
-        has_pronoun = any(pronoun in segment_lower for pronoun in LOCATION_PRONOUNS)
-        
-        # Проверяем, заканчивается ли сегмент на "там же" или подобное
-        ends_with_reference = any(segment_lower.endswith(pronoun) or 
-                                  segment_lower.endswith(f" {pronoun}") 
-                                  for pronoun in ["там же", "и там же", "там", "и там"])
-        
+
+    for i, (room, has_pronoun, has_end_reference) in enumerate(mentions):
         if room:
             # Нашли явное упоминание комнаты
             last_room = room
-            previous_had_reference = ends_with_reference
-            resolved.append({
-                'command': segment,
-                'room': room,
-                'original_text': segment
-            })
+            previous_had_reference = has_end_reference
+            rooms.append(room)
         elif has_pronoun and last_room:
             # Нашли местоимение, используем последнюю упомянутую комнату
-            previous_had_reference = ends_with_reference
-            resolved.append({
-                'command': segment,
-                'room': last_room,
-                'original_text': segment
-            })
+            previous_had_reference = has_end_reference
+            rooms.append(last_room)
         elif previous_had_reference and last_room:
             # Предыдущий сегмент заканчивался на "там же", наследуем комнату
             previous_had_reference = False
-            resolved.append({
-                'command': segment,
-                'room': last_room,
-                'original_text': segment
-            })
+            rooms.append(last_room)
         elif last_room and i > 0:
             # Если в предыдущем сегменте была комната, а в текущем нет явного упоминания другой комнаты,
             # наследуем комнату из предыдущего сегмента
             previous_had_reference = False
-            resolved.append({
-                'command': segment,
-                'room': last_room,
-                'original_text': segment
-            })
+            rooms.append(last_room)
         else:
             # Комната не указана
             previous_had_reference = False
-            resolved.append({
-                'command': segment,
-                'room': None,
-                'original_text': segment
-            })
-    
-    return resolved
+            rooms.append(None)
+
+    return rooms
+
+def resolve_location_reference(segments: List[str]) -> List[Dict[str, str]]:
+    """
+    Обрабатывает список сегментов команд, извлекая комнаты и разрешая анафоры.
+    Возвращает список словарей с полями: 'command', 'room', 'original_text'
+    """
+    matcher = get_vocabulary().matcher
+    mentions = []
+    for segment in segments:
+        # Один проход по сегменту находит и комнату, и местоимения
+        tokens = tokenize(segment)
+        matches = matcher.find_tokens(tokens)
+        room = next((m.canonical for m in matches if m.category == "room"), None)
+        pronouns = [m for m in matches if m.category == "pronoun"]
+        mentions.append((room, bool(pronouns), ends_with_reference(pronouns, len(tokens))))
 
+    return [
+        {'command': segment, 'room': room, 'original_text': segment}
+        for segment, room in zip(segments, resolve_rooms(mentions))
+    ]
@@ -0,0 +1,244 @@
+"""
+Модуль для замеров задержек по этапам конвейера (wake word → STT → NLU → serial).
+Спаны меряют время по монотонным часам (time.perf_counter), счётчики и гистограммы
+накапливаются в памяти и выгружаются в JSONL-файл или отдаются по HTTP в текстовом
+формате Prometheus. Пока замеры выключены, все вызовы сразу возвращаются, поэтому
+инструментирование горячего пути практически ничего не стоит.
+
+Включение: переменная окружения ALTAIR_METRICS=1 или metrics.enable().
+Пример:
+    from src.utils.metrics import metrics
+    with metrics.span("nlu_parse_seconds"):
+        tasks = parser.parse(text)
+    metrics.inc("wake_detections_total")
+    metrics.serve_prometheus(port=9464)   # http://127.0.0.1:9464/metrics
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+
+# Границы корзин гистограмм по умолчанию, в секундах (от 1 мс до 10 с)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_ENV = "ALTAIR_METRICS"
+METRIC_PREFIX = "altair_"
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя корзина — +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по корзинам (верхняя граница корзины, как в Prometheus без интерполяции)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {"count": self.count, "sum": round(self.sum, 6), "max": round(self.max, 6),
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99)}
+
+
+class _Span:
+    __slots__ = ("registry", "name", "started")
+
+    def __init__(self, registry: "MetricsRegistry", name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Хранилище метрик процесса.
+        :param enabled: собирать ли метрики (выключенный реестр ничего не делает)
+        :param buckets: границы корзин гистограмм в секундах
+        """
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._exporter: Optional[threading.Thread] = None
+        self._exporter_stop = threading.Event()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name: str):
+        """Контекстный менеджер, записывающий длительность блока в гистограмму name."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name)
+
+    def inc(self, name: str, value: float = 1):
+        """Увеличивает счётчик."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        """Устанавливает текущее значение (например, глубину очереди аудио)."""
+        if not self.enabled:
+            return
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Добавляет значение в гистограмму (для задержек — в секундах)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        """Сбрасывает все накопленные значения."""
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> Dict:
+        """Текущие значения всех метрик в виде словаря."""
+        with self._lock:
+            return {
+                "time": time.time(),
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+            }
+
+    def to_prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus (exposition format 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines += [f"# TYPE {METRIC_PREFIX}{name} counter", f"{METRIC_PREFIX}{name} {value}"]
+            for name, value in sorted(self.gauges.items()):
+                lines += [f"# TYPE {METRIC_PREFIX}{name} gauge", f"{METRIC_PREFIX}{name} {value}"]
+            for name, histogram in sorted(self.histograms.items()):
+                full = METRIC_PREFIX + name
+                lines.append(f"# TYPE {full} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{full}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{full}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{full}_sum {histogram.sum}")
+                lines.append(f"{full}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_jsonl(self, path: str):
+        """Дописывает текущий снимок метрик строкой в JSONL-файл."""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.snapshot(), ensure_ascii=False) + "\n")
+
+    def start_jsonl_export(self, path: str, interval: float = 10.0):
+        """Периодически (раз в interval секунд) дописывает снимки метрик в JSONL в фоновом потоке."""
+        self.stop_jsonl_export()
+        self._exporter_stop.clear()
+
+        def run():
+            while not self._exporter_stop.wait(interval):
+                try:
+                    self.write_jsonl(path)
+                except OSError as e:
+                    print(f"Ошибка записи метрик в {path}: {e}")
+            self.write_jsonl(path)
+
+        self._exporter = threading.Thread(target=run, daemon=True)
+        self._exporter.start()
+
+    def stop_jsonl_export(self):
+        """Останавливает фоновую выгрузку, записав последний снимок."""
+        if self._exporter is not None:
+            self._exporter_stop.set()
+            self._exporter.join()
+            self._exporter = None
+
+    def serve_prometheus(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Запускает HTTP-сервер с метриками по адресу http://host:port/metrics в фоновом потоке.
+        По умолчанию слушает только локальный интерфейс.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Не засоряем консоль ассистента запросами сборщика
+
+        self.stop_prometheus()
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    def stop_prometheus(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Общий реестр процесса
+metrics = MetricsRegistry(enabled=os.environ.get(METRICS_ENV, "") not in ("", "0"))
@@ -0,0 +1,220 @@
+"""
+Модуль для приведения словоформ к лемме ("светом" → "свет", "шторами" → "штора").
+Индекс лемм строится офлайн (см. scripts/build_lemma_index.py) и хранится
+в виде отсортированного массива 64-битных хэшей словоформ и массива номеров лемм.
+При запуске массивы открываются через np.load(mmap_mode='r'): в память читаются
+только страницы, которые реально понадобились при поиске, поэтому даже словарь
+на миллионы форм не увеличивает время старта и потребление памяти.
+
+Для слов из словарей ассистента формы дополнительно порождаются по простым
+правилам склонения существительных (noun_forms), так что падежи устройств
+и комнат распознаются и без внешнего списка словоформ.
+"""
+import hashlib
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.tokenizer import normalize, tokenize
+
+DEFAULT_LEMMA_INDEX_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "../../data/custom_dataset/lemma_index"))
+
+# Файлы индекса в каталоге
+KEYS_FILE = "keys.npy"                # uint64: отсортированные хэши словоформ
+LEMMA_IDS_FILE = "lemma_ids.npy"      # uint32: номер леммы для каждого хэша
+LEMMA_BYTES_FILE = "lemma_bytes.npy"  # uint8: все леммы подряд в UTF-8
+LEMMA_OFFSETS_FILE = "lemma_offsets.npy"  # uint32: границы лемм в lemma_bytes (len = лемм + 1)
+
+_VOWELS = set("аеиоуыэюя")
+_VELARS_SIBILANTS = set("гкхжшщч")  # после них "ы" переходит в "и"
+
+
+def form_key(word: str) -> int:
+    """64-битный хэш нормализованной словоформы (ключ индекса)."""
+    return int.from_bytes(hashlib.blake2b(normalize(word).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _plural_i(stem: str) -> str:
+    return "и" if stem and stem[-1] in _VELARS_SIBILANTS else "ы"
+
+
+def noun_forms(word: str) -> List[str]:
+    """
+    Порождает падежные формы существительного (или субстантивированного прилагательного)
+    по окончанию начальной формы. Правила упрощённые: лишние формы безвредны,
+    так как используются только для поиска по словарю.
+    Пример: "окно" → ["окна", "окну", "окном", "окне", "окон", "окнам", "окнами", "окнах"]
+    """
+    word = normalize(word)
+    if len(word) < 3 or " " in word:
+        return []
+    stem, last = word[:-1], word[-1]
+    if word.endswith(("ая", "яя")):
+        # гостиная, детская
+        adj_stem = word[:-2]
+        y = _plural_i(adj_stem)
+        return [adj_stem + e for e in ("ой", "ую", "ою", y + "е", y + "х", y + "м", y + "ми")]
+    if word.endswith("ия"):
+        # лоджия
+        return [stem + e for e in ("и", "ю", "ей", "ею", "й", "ям", "ями", "ях")]
+    if last == "а":
+        # штора, лампа, батарея (см. ниже "я")
+        y = _plural_i(stem)
+        return [stem + e for e in (y, "е", "у", "ой", "ою", "", "ам", "ами", "ах")]
+    if last == "я":
+        return [stem + e for e in ("и", "е", "ю", "ей", "ею", "ь", "й", "ям", "ями", "ях")]
+    if last == "о":
+        if stem[-1] in _VOWELS:
+            return []  # несклоняемые: радио, кино
+        return [stem + e for e in ("а", "у", "ом", "е", "ам", "ами", "ах")]
+    if last == "е":
+        return [stem + e for e in ("я", "ю", "ем", "и", "й", "ям", "ями", "ях")]
+    if last in "ыи":
+        # формы множественного числа: шторы, двери
+        return [stem + e for e in ("ам", "ами", "ах", "ям", "ями", "ях")]
+    if last == "ь":
+        # мужской (обогреватель) и женский (дверь) род
+        return [stem + e for e in ("я", "ю", "ем", "е", "и", "ью", "ей", "ям", "ями", "ях")]
+    if last == "й":
+        return [stem + e for e in ("я", "ю", "ем", "е", "и", "ев", "ям", "ями", "ях")]
+    if last in _VOWELS:
+        return []
+    # Мужской род на согласную: свет, телевизор, коридор
+    y = _plural_i(word)
+    o = "е" if last in "жшщчц" else "о"
+    return [word + e for e in ("а", "у", o + "м", "е", y, o + "в", "ей", "ам", "ами", "ах")]
+
+
+def paradigm_pairs(words: Iterable[str]) -> List[Tuple[str, str]]:
+    """Пары (словоформа, лемма) для однословных фраз словаря."""
+    pairs = []
+    for word in words:
+        tokens = tokenize(word)
+        if len(tokens) != 1 or not tokens[0].text.isalpha():
+            continue
+        lemma = tokens[0].text
+        pairs.append((lemma, lemma))
+        pairs.extend((form, lemma) for form in noun_forms(lemma))
+    return pairs
+
+
+class LemmaIndex:
+    def __init__(self, keys: np.ndarray, lemma_ids: np.ndarray, lemma_bytes: np.ndarray,
+                 lemma_offsets: np.ndarray, path: Optional[str] = None):
+        """
+        Индекс словоформа → лемма. Обычно создаётся через LemmaIndex.build или LemmaIndex.load.
+        :param keys: отсортированные хэши словоформ (uint64)
+        :param lemma_ids: номер леммы для каждого хэша (uint32)
+        :param lemma_bytes: леммы подряд в UTF-8 (uint8)
+        :param lemma_offsets: границы лемм в lemma_bytes (uint32)
+        :param path: каталог, из которого индекс загружен (None — индекс в памяти)
+        """
+        self.keys = keys
+        self.lemma_ids = lemma_ids
+        self.lemma_bytes = lemma_bytes
+        self.lemma_offsets = lemma_offsets
+        self.path = path
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[str, str]]) -> "LemmaIndex":
+        """
+        Строит индекс из пар (словоформа, лемма).
+        Если словоформа встречается несколько раз ("стали" — сталь/стать), остаётся первая лемма.
+        """
+        lemma_numbers: Dict[str, int] = {}
+        forms: Dict[int, int] = {}
+        for form, lemma in pairs:
+            lemma = normalize(lemma)
+            number = lemma_numbers.setdefault(lemma, len(lemma_numbers))
+            forms.setdefault(form_key(form), number)
+
+        keys = np.fromiter(forms.keys(), dtype=np.uint64, count=len(forms))
+        ids = np.fromiter(forms.values(), dtype=np.uint32, count=len(forms))
+        order = np.argsort(keys, kind="stable")
+        encoded = [lemma.encode("utf-8") for lemma in lemma_numbers]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        lemma_bytes = np.frombuffer(b"".join(encoded), dtype=np.uint8).copy()
+        return cls(keys[order], ids[order], lemma_bytes, offsets)
+
+    def save(self, path: str):
+        """Сохраняет индекс в каталог в виде .npy-файлов."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, KEYS_FILE), self.keys)
+        np.save(os.path.join(path, LEMMA_IDS_FILE), self.lemma_ids)
+        np.save(os.path.join(path, LEMMA_BYTES_FILE), self.lemma_bytes)
+        np.save(os.path.join(path, LEMMA_OFFSETS_FILE), self.lemma_offsets)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_LEMMA_INDEX_PATH, mmap: bool = True) -> "LemmaIndex":
+        """
+        Открывает индекс из каталога.
+        :param path: каталог с .npy-файлами индекса
+        :param mmap: отображать файлы в память, а не читать целиком
+        """
+        mode = "r" if mmap else None
+        arrays = [np.load(os.path.join(path, name), mmap_mode=mode)
+                  for name in (KEYS_FILE, LEMMA_IDS_FILE, LEMMA_BYTES_FILE, LEMMA_OFFSETS_FILE)]
+        return cls(*arrays, path=path)
+
+    def lookup(self, word: str) -> Optional[str]:
+        """Возвращает лемму словоформы или None, если формы нет в индексе."""
+        if not len(self.keys):
+            return None
+        key = np.uint64(form_key(word))
+        i = int(np.searchsorted(self.keys, key))
+        if i >= len(self.keys) or self.keys[i] != key:
+            return None
+        number = int(self.lemma_ids[i])
+        start, end = int(self.lemma_offsets[number]), int(self.lemma_offsets[number + 1])
+        return bytes(self.lemma_bytes[start:end]).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class Lemmatizer:
+    def __init__(self, indexes: Iterable[LemmaIndex], cache_size: int = 4096):
+        """
+        Последовательный поиск леммы в нескольких индексах (первый найденный результат).
+        Частые токены запоминаются в LRU-кэше, поэтому поиск по ним не трогает массивы.
+        :param indexes: индексы в порядке приоритета
+        :param cache_size: размер LRU-кэша словоформ
+        """
+        self.indexes = list(indexes)
+        self.cache_size = cache_size
+        self._lookup = lru_cache(maxsize=cache_size)(self._find)
+
+    def _find(self, word: str) -> Optional[str]:
+        for index in self.indexes:
+            lemma = index.lookup(word)
+            if lemma is not None:
+                return lemma
+        return None
+
+    def __call__(self, word: str) -> Optional[str]:
+        return self._lookup(word)
+
+
+def lemma_index_stamp(path: str = DEFAULT_LEMMA_INDEX_PATH) -> Optional[Tuple[str, int, int]]:
+    """Путь, время изменения и размер файла ключей индекса (None, если индекс не собран)."""
+    keys_path = os.path.join(path, KEYS_FILE)
+    try:
+        st = os.stat(keys_path)
+    except OSError:
+        return None
+    return keys_path, st.st_mtime_ns, st.st_size
+
+
+def load_lemma_index(path: str = DEFAULT_LEMMA_INDEX_PATH) -> Optional[LemmaIndex]:
+    """Открывает внешний индекс лемм, если он собран; иначе возвращает None."""
+    if not os.path.exists(os.path.join(path, KEYS_FILE)):
+        return None
+    try:
+        return LemmaIndex.load(path)
+    except (OSError, ValueError) as e:
+        print(f"Не удалось открыть индекс лемм {path}: {e}")
+        return None
@@ -0,0 +1,216 @@
+"""
+Модуль для разбора русских числительных за один проход по токенам.
+Понимает составные числа ("двести тридцать пять"), падежные формы
+("двадцати двух", "пятью"), порядковые ("двадцать второй") и цифры ("22", "22,5"),
+а также единицы измерения сразу после числа (градус, процент, "%").
+Формы, совпадающие с обычными словами ("семью", "сорока"), считаются числом,
+только если рядом есть другое числительное, единица измерения или предлог "на"/"до".
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from src.utils.tokenizer import Token
+
+# Разряды числительных: после разряда могут идти только меньшие
+ORDER_UNITS = 0      # 0-9
+ORDER_TEENS = 1      # 10-19
+ORDER_TENS = 2       # 20-90
+ORDER_HUNDREDS = 3   # 100-900
+ORDER_THOUSANDS = 4  # тысяча (множитель)
+
+UNIT_DEGREE = "градус"
+UNIT_PERCENT = "процент"
+
+_UNITS = {
+    0: ["ноль", "нуль", "ноля", "нуля", "нолю", "нулю", "нолем", "нулем"],
+    1: ["один", "одна", "одно", "одного", "одной", "одному", "одним", "одном", "одну", "одною"],
+    2: ["два", "две", "двух", "двум", "двумя"],
+    3: ["три", "трех", "трем", "тремя"],
+    4: ["четыре", "четырех", "четырем", "четырьмя"],
+    5: ["пять", "пяти", "пятью"],
+    6: ["шесть", "шести", "шестью"],
+    7: ["семь", "семи", "семью"],
+    8: ["восемь", "восьми", "восемью", "восьмью"],
+    9: ["девять", "девяти", "девятью"],
+}
+_TEEN_STEMS = {
+    10: "десят", 11: "одиннадцат", 12: "двенадцат", 13: "тринадцат", 14: "четырнадцат",
+    15: "пятнадцат", 16: "шестнадцат", 17: "семнадцат", 18: "восемнадцат", 19: "девятнадцат",
+}
+_TENS = {
+    20: ["двадцать", "двадцати", "двадцатью"],
+    30: ["тридцать", "тридцати", "тридцатью"],
+    40: ["сорок", "сорока"],
+    50: ["пятьдесят", "пятидесяти", "пятьюдесятью"],
+    60: ["шестьдесят", "шестидесяти", "шестьюдесятью"],
+    70: ["семьдесят", "семидесяти", "семьюдесятью"],
+    80: ["восемьдесят", "восьмидесяти", "восемьюдесятью", "восьмьюдесятью"],
+    90: ["девяносто", "девяноста"],
+}
+_HUNDREDS = {
+    100: ["сто", "ста"],
+    200: ["двести", "двухсот", "двумстам", "двумястами", "двухстах"],
+    300: ["триста", "трехсот", "тремстам", "тремястами", "трехстах"],
+    400: ["четыреста", "четырехсот", "четыремстам", "четырьмястами", "четырехстах"],
+}
+# 500-900: (именительный, косвенная основа, творительная основа)
+_HUNDRED_STEMS = {
+    500: ("пять", "пяти", "пятью"), 600: ("шесть", "шести", "шестью"), 700: ("семь", "семи", "семью"),
+    800: ("восемь", "восьми", "восемью"), 900: ("девять", "девяти", "девятью"),
+}
+_THOUSAND = ["тысяча", "тысячи", "тысячу", "тысячей", "тысячею", "тысяче", "тысяч", "тысячам", "тысячами", "тысячах"]
+
+# Порядковые числительные: основа → значение (окончания прилагательных добавляются ниже)
+_ORDINAL_STEMS = {
+    "перв": 1, "втор": 2, "четверт": 4, "пят": 5, "шест": 6, "седьм": 7, "восьм": 8, "девят": 9,
+    **{stem: value for value, stem in _TEEN_STEMS.items()},
+    "двадцат": 20, "тридцат": 30, "сороков": 40, "пятидесят": 50, "шестидесят": 60,
+    "семидесят": 70, "восьмидесят": 80, "девяност": 90, "сот": 100,
+}
+_ORDINAL_ENDINGS = ["ый", "ой", "ий", "ая", "ое", "ые", "ого", "ому", "ым", "ом", "ую", "ых", "ыми"]
+_THIRD = ["третий", "третья", "третье", "третьи", "третьего", "третьему", "третьим", "третьем",
+          "третьей", "третью", "третьих", "третьими"]
+
+# Падежные формы, совпадающие с существительными: "всей семью", "сорока на ветке", "шестом"
+AMBIGUOUS_FORMS = frozenset({"семью", "сорока", "шестом"})
+# Предлоги, после которых одиночная неоднозначная форма — число: "на семью градусов", "до сорока"
+NUMBER_PREPOSITIONS = frozenset({"на", "до"})
+
+# Форма слова → (значение, разряд, порядковое ли)
+NumeralForm = Tuple[int, int, bool]
+
+
+def _order_of(value: int) -> int:
+    if value < 10:
+        return ORDER_UNITS
+    if value < 20:
+        return ORDER_TEENS
+    if value < 100:
+        return ORDER_TENS
+    if value < 1000:
+        return ORDER_HUNDREDS
+    return ORDER_THOUSANDS
+
+
+def _base_forms() -> Dict[str, NumeralForm]:
+    forms: Dict[str, NumeralForm] = {}
+    for value, words in _UNITS.items():
+        for word in words:
+            forms[word] = (value, ORDER_UNITS, False)
+    for value, stem in _TEEN_STEMS.items():
+        for ending in ("ь", "и", "ью"):
+            forms[stem + ending] = (value, ORDER_TEENS, False)
+    for value, words in _TENS.items():
+        for word in words:
+            forms[word] = (value, ORDER_TENS, False)
+    for value, words in _HUNDREDS.items():
+        for word in words:
+            forms[word] = (value, ORDER_HUNDREDS, False)
+    for value, (nominative, oblique, instrumental) in _HUNDRED_STEMS.items():
+        for word in (nominative + "сот", oblique + "сот", oblique + "стам", instrumental + "стами", oblique + "стах"):
+            forms[word] = (value, ORDER_HUNDREDS, False)
+    for word in _THOUSAND:
+        forms[word] = (1000, ORDER_THOUSANDS, False)
+    for stem, value in _ORDINAL_STEMS.items():
+        for ending in _ORDINAL_ENDINGS:
+            forms.setdefault(stem + ending, (value, _order_of(value), True))
+    for word in _THIRD:
+        forms[word] = (3, ORDER_UNITS, True)
+    return forms
+
+
+NUMERAL_FORMS: Dict[str, NumeralForm] = _base_forms()
+
+
+def build_numeral_forms(number_words: Optional[Dict[str, int]] = None) -> Dict[str, NumeralForm]:
+    """
+    Дополняет встроенные формы числительных словами из словаря (например, NUMBER_WORDS
+    из synonyms.json). Встроенные формы имеют приоритет.
+    """
+    forms = dict(NUMERAL_FORMS)
+    for word, value in (number_words or {}).items():
+        forms.setdefault(word.lower().replace("ё", "е"), (value, _order_of(value), False))
+    return forms
+
+
+class NumberSpan(NamedTuple):
+    value: Union[int, float]
+    unit: Optional[str]  # UNIT_DEGREE, UNIT_PERCENT или None
+    ordinal: bool
+    start: int           # начало в нормализованном тексте
+    end: int             # конец (включая единицу измерения)
+    token_start: int
+    token_end: int
+
+
+def _parse_digits(text: str) -> Union[int, float]:
+    if "," in text or "." in text:
+        return float(text.replace(",", "."))
+    return int(text)
+
+
+def _unit_of(word: str) -> Optional[str]:
+    if word.startswith(UNIT_DEGREE):
+        return UNIT_DEGREE
+    if word.startswith(UNIT_PERCENT) or word == "%":
+        return UNIT_PERCENT
+    return None
+
+
+def parse_numbers(tokens: List[Token], forms: Optional[Dict[str, NumeralForm]] = None) -> List[NumberSpan]:
+    """
+    Находит все числа в списке токенов за один линейный проход.
+    :param tokens: токены (см. src.utils.tokenizer.tokenize)
+    :param forms: таблица форм числительных (по умолчанию NUMERAL_FORMS)
+    :return: список NumberSpan по порядку
+    """
+    if forms is None:
+        forms = NUMERAL_FORMS
+    numbers = []
+    n = len(tokens)
+    i = 0
+    while i < n:
+        word = tokens[i].text
+        ordinal = False
+        if word[0].isdigit():
+            value = _parse_digits(word)
+            j = i + 1
+        elif word in forms:
+            total = 0          # уже набранные тысячи
+            group = 0          # текущая группа (до тысячи)
+            last_order = ORDER_THOUSANDS + 1
+            j = i
+            while j < n and tokens[j].text in forms:
+                number, order, is_ordinal = forms[tokens[j].text]
+                if order == ORDER_THOUSANDS:
+                    if total or is_ordinal:
+                        break
+                    total = (group or 1) * number
+                    group = 0
+                    last_order = ORDER_THOUSANDS
+                    j += 1
+                    continue
+                if order >= last_order:
+                    break
+                group += number
+                j += 1
+                # После единиц и "-надцати" число закончено; после десятков возможны только единицы
+                last_order = ORDER_UNITS if order <= ORDER_TEENS else (ORDER_TEENS if order == ORDER_TENS else order)
+                if is_ordinal:
+                    ordinal = True
+                    break
+            value = total + group
+        else:
+            i += 1
+            continue
+
+        end = j
+        unit = _unit_of(tokens[j].text) if j < n else None
+        if unit is not None:
+            end = j + 1
+        elif j == i + 1 and word in AMBIGUOUS_FORMS and not (i and tokens[i - 1].text in NUMBER_PREPOSITIONS):
+            # Одиночная неоднозначная форма без предлога и единицы — обычное слово
+            i += 1
+            continue
+        numbers.append(NumberSpan(value, unit, ordinal, tokens[i].start, tokens[end - 1].end, i, end))
+        i = end
+    return numbers
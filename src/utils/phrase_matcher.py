@@ -0,0 +1,105 @@
+"""
+Модуль для поиска словарных фраз (действий, объектов, комнат) в тексте.
+Все словари компилируются в один префиксный граф по словам, и текст
+просматривается за один проход с возвратом каждого совпадения и его спана.
+Совпадения ищутся по границам слов, поэтому "зал" не находится внутри "зальцбург".
+Если задан лемматизатор, слово, которого нет в графе, ищется ещё и по лемме
+("светом" → "свет"), поэтому в словарях достаточно начальных форм.
+"""
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from src.utils.tokenizer import Token, normalize, tokenize
+
+_TERMINAL = ""  # Ключ узла графа со списком фраз, заканчивающихся в этом узле
+
+
+class Match(NamedTuple):
+    category: str     # словарь, из которого фраза ("action", "object", "room", ...)
+    canonical: str    # каноническое значение ("включи", "свет", "гостиная")
+    phrase: str       # найденная форма фразы ("запусти", "лампу", "гостиной")
+    start: int        # начало в нормализованном тексте
+    end: int          # конец в нормализованном тексте
+    token_start: int  # индекс первого токена
+    token_end: int    # индекс токена после последнего
+
+
+class PhraseMatcher:
+    def __init__(self, lemmatizer: Optional[Callable[[str], Optional[str]]] = None):
+        """
+        :param lemmatizer: функция словоформа → лемма или None (см. src.utils.morphology.Lemmatizer)
+        """
+        self._trie: Dict = {}
+        self.max_phrase_len = 0  # Длина самой длинной фразы в словах
+        self.lemmatizer = lemmatizer
+
+    def add(self, phrase: str, category: str, canonical: str):
+        """Добавляет фразу в граф."""
+        words = [token.text for token in tokenize(phrase)]
+        if not words:
+            return
+        node = self._trie
+        for word in words:
+            node = node.setdefault(word, {})
+        entries = node.setdefault(_TERMINAL, [])
+        entry = (category, canonical, " ".join(words))
+        if entry not in entries:
+            entries.append(entry)
+        self.max_phrase_len = max(self.max_phrase_len, len(words))
+
+    def add_dictionary(self, category: str, dictionary: Dict[str, Iterable[str]]):
+        """
+        Добавляет словарь вида {каноническое значение: [синонимы/формы]}.
+        Каноническое значение само тоже считается формой.
+        """
+        for canonical, phrases in dictionary.items():
+            self.add(canonical, category, normalize(canonical))
+            for phrase in phrases:
+                self.add(phrase, category, normalize(canonical))
+
+    def find_tokens(self, tokens: List[Token]) -> List[Match]:
+        """
+        Ищет фразы в готовом списке токенов.
+        Из пересекающихся совпадений выбирается самое левое, среди них — самое длинное.
+        """
+        matches = []
+        i = 0
+        n = len(tokens)
+        lemmatizer = self.lemmatizer
+        lemmas: List[Optional[str]] = [None] * n  # Леммы токенов, вычисляются по необходимости
+        while i < n:
+            node = self._trie
+            best_end = -1
+            best_entries = None
+            j = i
+            while j < n:
+                child = node.get(tokens[j].text)
+                if child is None and lemmatizer is not None:
+                    if lemmas[j] is None:
+                        lemmas[j] = lemmatizer(tokens[j].text) or ""
+                    if lemmas[j]:
+                        child = node.get(lemmas[j])
+                node = child
+                if node is None:
+                    break
+                j += 1
+                if _TERMINAL in node:
+                    best_end, best_entries = j, node[_TERMINAL]
+            if best_entries is None:
+                i += 1
+                continue
+            for category, canonical, phrase in best_entries:
+                matches.append(Match(category, canonical, phrase,
+                                     tokens[i].start, tokens[best_end - 1].end, i, best_end))
+            i = best_end
+        return matches
+
+    def find_all(self, text: str) -> List[Match]:
+        """Токенизирует текст и возвращает все совпадения по порядку."""
+        return self.find_tokens(tokenize(text))
+
+    def first(self, text: str, category: str) -> Optional[Match]:
+        """Возвращает первое в тексте совпадение из заданного словаря."""
+        for match in self.find_all(text):
+            if match.category == category:
+                return match
+        return None
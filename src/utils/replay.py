@@ -0,0 +1,420 @@
+"""
+Замены оборудования для прогона записанных команд без микрофона и Arduino.
+FakeSoundDevice подставляется вместо модуля sounddevice и проигрывает WAV-запись
+в callback блоками, в реальном времени или быстрее. LoopbackSerial ведёт себя
+как serial.Serial, а ответы на команды формирует FirmwareEmulator — так же,
+как их печатает прошивка arduino_controller.ino. Для асинхронного контроллера
+open_loopback_connection отдаёт ту же эмуляцию как пару потоков asyncio.
+"""
+import asyncio
+import threading
+import time
+import wave
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.command_compiler import FIRMWARE_RX_BUFFER
+from src.utils.serial_link import BASE_BAUDRATE, BAUD_CONFIRM_SEC, SUPPORTED_BAUDRATES
+from src.utils.telemetry import (CMD_BINARY, CMD_TEXT, FLAG_ALARM, FLAG_FAN, FLAG_HEATING, FLAG_LIGHT,
+                                 TELEMETRY_HEARTBEAT_MS, encode_frame)
+
+
+def read_wav(path: str) -> Tuple[np.ndarray, int]:
+    """Читает WAV-файл (16-bit mono) и возвращает (сэмплы int16, частота дискретизации)."""
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+            raise ValueError(f"Ожидается 16-bit mono WAV: {path}")
+        frames = wf.readframes(wf.getnframes())
+        return np.frombuffer(frames, dtype=np.int16), wf.getframerate()
+
+
+class FakeInputStream:
+    def __init__(self, device: "FakeSoundDevice", samplerate: int, channels: int = 1, dtype: str = "int16",
+                 callback: Optional[Callable] = None, blocksize: int = 1600, **kwargs):
+        """
+        Поток, повторяющий интерфейс sounddevice.InputStream: после входа в контекст
+        отдельный поток вызывает callback(indata, frames, time, status) блоками записи.
+        После конца записи подаётся тишина, пока поток не закроют.
+        """
+        if samplerate != device.sample_rate:
+            raise ValueError(f"Частота записи {device.sample_rate} Гц, а поток открыт на {samplerate} Гц")
+        if channels != 1:
+            raise ValueError("FakeInputStream поддерживает только mono")
+        self.device = device
+        self.dtype = np.dtype(dtype)
+        self.callback = callback
+        self.blocksize = blocksize
+        self.samplerate = samplerate
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _block(self, start: int) -> np.ndarray:
+        block = np.zeros((self.blocksize, 1), dtype=self.dtype)
+        chunk = self.device.samples[start:start + self.blocksize]
+        if self.dtype == np.float32:
+            block[:len(chunk), 0] = chunk.astype(np.float32) / 32768
+        else:
+            block[:len(chunk), 0] = chunk
+        return block
+
+    def _run(self):
+        position = 0
+        started = time.perf_counter()
+        block_sec = self.blocksize / self.samplerate
+        blocks = 0
+        while not self._closed.is_set():
+            if position >= len(self.device.samples) and self.device.eof is None:
+                self.device.eof = time.perf_counter()
+            self.callback(self._block(position), self.blocksize, None, None)
+            position += self.blocksize
+            blocks += 1
+            self.device.blocks_played += 1
+            if self.device.speed > 0:
+                # Держим темп микрофона: следующий блок — не раньше, чем "записан"
+                delay = started + blocks * block_sec / self.device.speed - time.perf_counter()
+                if delay > 0:
+                    self._closed.wait(delay)
+            elif position >= len(self.device.samples):
+                # Без ограничения скорости тишина после записи не должна занимать весь процессор
+                self._closed.wait(block_sec / 10)
+
+    def start(self):
+        self.device.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._closed.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    close = stop
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+class FakeSoundDevice:
+    def __init__(self, samples: np.ndarray, sample_rate: int = 16000, speed: float = 1.0):
+        """
+        Замена модуля sounddevice, проигрывающая запись.
+        :param samples: сэмплы int16 mono
+        :param sample_rate: частота дискретизации записи
+        :param speed: 1.0 — реальное время, 2.0 — вдвое быстрее, 0 — без ограничения скорости
+        """
+        self.samples = np.asarray(samples, dtype=np.int16)
+        self.sample_rate = sample_rate
+        self.speed = speed
+        self.started: Optional[float] = None  # perf_counter() начала проигрывания
+        self.eof: Optional[float] = None      # perf_counter() конца записи (дальше идёт тишина)
+        self.blocks_played = 0
+
+    @classmethod
+    def from_wav(cls, path: str, speed: float = 1.0) -> "FakeSoundDevice":
+        samples, sample_rate = read_wav(path)
+        return cls(samples, sample_rate, speed)
+
+    def InputStream(self, **kwargs) -> FakeInputStream:
+        return FakeInputStream(self, **kwargs)
+
+
+class FirmwareEmulator:
+    def __init__(self, reply_delay: float = 0.0, baudrate: int = BASE_BAUDRATE,
+                 max_reliable_baudrate: Optional[int] = None, baud_confirm: float = BAUD_CONFIRM_SEC):
+        """
+        Эмулятор протокола arduino_controller.ino: отвечает на PING и SET:type:pin:value
+        теми же строками, что и прошивка, включая эхо "Received: ...".
+        :param reply_delay: задержка ответа в секундах (у прошивки не больше FIRMWARE_COMMAND_LATENCY)
+        :param baudrate: скорость Serial после включения (BASE_BAUD в прошивке)
+        :param max_reliable_baudrate: выше этой скорости ответы ECHO приходят искажёнными
+                                      (как при плохом кабеле); None — все скорости надёжны
+        :param baud_confirm: через сколько секунд без команд вернуться на прежнюю скорость
+        """
+        self.reply_delay = reply_delay
+        self.max_reliable_baudrate = max_reliable_baudrate
+        self.baud_confirm = baud_confirm
+        self.baudrate = baudrate
+        self._fallback_baudrate = baudrate
+        self._baud_deadline: Optional[float] = None
+        self.pins = {"light": 4, "servo": 12, "heating": 8, "fan": 13, "alarm": 11}
+        self.state = {"light": 0, "heating": 1, "fan": 0, "alarm": 0, "window_angle": 70,
+                      "target_temperature": 22.0}
+        self.binary_telemetry = False
+        self.telemetry_seq = 0
+        self._last_frame: Optional[Tuple[bytes, float]] = None
+
+    def handle(self, command: str) -> List[str]:
+        """Обрабатывает одну строку команды и возвращает строки ответа."""
+        if len(command.encode("utf-8")) > FIRMWARE_RX_BUFFER:
+            return ["ERROR: Command too long"]  # Прошивка не хранит строку длиннее своего буфера
+        command = command.strip()
+        replies = [f"Received: {command}"]
+        if command == "PING":
+            self._extend_baud_deadline()
+            return replies + ["PONG"]
+        if command == "LOOP?":
+            return replies + [f"OK: Loop max_us={int(self.reply_delay * 1e6)}"]
+        if command == "BAUD?":
+            return replies + ["BAUDS: " + ",".join(str(rate) for rate in SUPPORTED_BAUDRATES)]
+        if command == "BAUD:OK":
+            self._baud_deadline = None
+            return replies + ["OK: Baud confirmed"]
+        if command.startswith("BAUD:"):
+            rate = _to_int(command[5:])
+            if rate not in SUPPORTED_BAUDRATES:
+                return replies + ["ERROR: Unsupported baud"]
+            if self._baud_deadline is None:
+                self._fallback_baudrate = self.baudrate
+            self.baudrate = rate
+            self._baud_deadline = time.monotonic() + self.baud_confirm
+            return replies + [f"OK: Baud {rate}"]
+        if command.startswith("ECHO:"):
+            self._extend_baud_deadline()
+            if self.max_reliable_baudrate is not None and self.baudrate > self.max_reliable_baudrate:
+                return replies + [command[::-1]]  # Искажённые байты
+            return replies + [command]
+        if command in (CMD_BINARY, CMD_TEXT):
+            self.binary_telemetry = command == CMD_BINARY
+            return replies + [f"OK: Telemetry {'BINARY' if self.binary_telemetry else 'TEXT'}"]
+        if not command.startswith("SET:"):
+            return replies + ["ERROR: Unknown command"]
+
+        parts = command.split(":", 3)
+        if len(parts) == 4:
+            _, device, pin, value = parts
+            pin, value = _to_int(pin), _to_int(value)
+            if device in ("light", "heating", "fan"):
+                self.state[device] = 1 if value == 1 else 0
+                return replies + [f"OK: {device.capitalize()} {'ON' if value == 1 else 'OFF'}"]
+            if device == "servo":
+                if pin != self.pins["servo"]:
+                    return replies + ["ERROR: Invalid servo pin"]
+                self.state["window_angle"] = min(max(value, 0), 180)
+                return replies + [f"OK: Window angle set to {self.state['window_angle']}"]
+            if device == "alarm":
+                if pin != self.pins["alarm"]:
+                    return replies + ["ERROR: Invalid alarm pin"]
+                self.state["alarm"] = value
+                return replies + [f"OK: Alarm {'ACTIVATED' if value == 1 else 'DEACTIVATED'}"]
+            return replies + ["ERROR: Unknown device type"]
+        if command.startswith("SET:target_temp:"):
+            # Как в прошивке: значение берётся после последнего двоеточия
+            self.state["target_temperature"] = _to_float(command[command.rindex(":") + 1:])
+            return replies + ["OK: Target temperature set"]
+        return replies + ["ERROR: Invalid command format"]
+
+    def _extend_baud_deadline(self):
+        if self._baud_deadline is not None:
+            self._baud_deadline = time.monotonic() + self.baud_confirm
+
+    def check_baud(self, now: Optional[float] = None):
+        """Как checkBaudWatchdog(): возврат на прежнюю скорость, если новую не подтвердили."""
+        now = time.monotonic() if now is None else now
+        if self._baud_deadline is not None and now > self._baud_deadline:
+            self.baudrate = self._fallback_baudrate
+            self._baud_deadline = None
+
+    def telemetry(self, temperature: float, distance: int, now: Optional[float] = None) -> bytes:
+        """
+        Байты, которые sendSensorData() отправит за один проход loop():
+        строка "Temperature: ..., Distance: ..." или двоичный кадр (только при изменении
+        показаний или по истечении TELEMETRY_HEARTBEAT_MS).
+        :param now: время в секундах (по умолчанию time.monotonic())
+        """
+        if not self.binary_telemetry:
+            return f"Temperature: {temperature:.2f}, Distance: {distance}\r\n".encode("ascii")
+        now = time.monotonic() if now is None else now
+        state = self.state
+        flags = ((FLAG_LIGHT if state["light"] else 0) | (FLAG_HEATING if state["heating"] else 0)
+                 | (FLAG_FAN if state["fan"] else 0) | (FLAG_ALARM if state["alarm"] else 0))
+        frame = encode_frame(self.telemetry_seq, temperature, distance, flags, state["window_angle"])
+        if (self._last_frame is not None and self._last_frame[0][6:12] == frame[6:12]
+                and (now - self._last_frame[1]) * 1000 < TELEMETRY_HEARTBEAT_MS):
+            return b""
+        self._last_frame = (frame, now)
+        self.telemetry_seq = (self.telemetry_seq + 1) & 0xFFFF
+        return frame
+
+
+def _to_int(text: str) -> int:
+    """Аналог String.toInt(): ведущие цифры или 0."""
+    digits = ""
+    for i, ch in enumerate(text.strip()):
+        if ch.isdigit() or (i == 0 and ch in "+-"):
+            digits += ch
+        else:
+            break
+    try:
+        return int(digits)
+    except ValueError:
+        return 0
+
+
+def _to_float(text: str) -> float:
+    """Аналог String.toFloat(): ведущее число или 0."""
+    number = ""
+    for ch in text.strip():
+        if ch.isdigit() or (ch in "+-." and ch not in number):
+            number += ch
+        else:
+            break
+    try:
+        return float(number)
+    except ValueError:
+        return 0.0
+
+
+class LoopbackSerial:
+    def __init__(self, firmware: Optional[FirmwareEmulator] = None, baudrate: int = 9600, timeout: float = 1.0,
+                 simulate_wire: bool = True):
+        """
+        Замена serial.Serial: записанные строки обрабатывает FirmwareEmulator,
+        его ответы становятся доступны для чтения.
+        :param firmware: эмулятор прошивки (по умолчанию — работающий на скорости baudrate)
+        :param baudrate: скорость порта хоста; строки доходят до прошивки, только если она
+                         совпадает со скоростью эмулятора (и учитывается при simulate_wire)
+        :param timeout: таймаут чтения в секундах, как у serial.Serial
+        :param simulate_wire: добавлять время передачи байтов по UART (10 бит на байт)
+        """
+        self.firmware = firmware if firmware is not None else FirmwareEmulator(baudrate=baudrate)
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.simulate_wire = simulate_wire
+        self.is_open = True
+        self._rx = bytearray()          # данные "от Arduino"
+        self._tx = bytearray()          # недописанная строка "к Arduino"
+        self._pending: List[Tuple[float, bytes]] = []  # (время готовности, ответ)
+        self._cond = threading.Condition()
+        self.sent: List[Tuple[float, str]] = []        # (perf_counter, команда) — для замеров
+        self.received: List[Tuple[float, str]] = []    # (perf_counter, строка ответа)
+
+    def _wire_time(self, size: int) -> float:
+        return size * 10 / self.baudrate if self.simulate_wire else 0.0
+
+    def write(self, data: bytes) -> int:
+        if not self.is_open:
+            raise OSError("Порт закрыт")
+        now = time.perf_counter()
+        with self._cond:
+            self._tx.extend(data)
+            ready = now + self._wire_time(len(data))
+            while b"\n" in self._tx:
+                line, _, rest = bytes(self._tx).partition(b"\n")
+                self._tx = bytearray(rest)
+                command = line.decode("utf-8", errors="ignore")
+                self.sent.append((now, command))
+                self.firmware.check_baud()
+                if self.baudrate != self.firmware.baudrate:
+                    continue  # Прошивка слушает на другой скорости и видит только шум
+                ready += self.firmware.reply_delay
+                for reply in self.firmware.handle(command):
+                    payload = (reply + "\r\n").encode("utf-8")
+                    ready += self._wire_time(len(payload))
+                    self._pending.append((ready, payload))
+            self._cond.notify_all()
+        return len(data)
+
+    def _deliver(self):
+        now = time.perf_counter()
+        while self._pending and self._pending[0][0] <= now:
+            ready, payload = self._pending.pop(0)
+            self._rx.extend(payload)
+            self.received.append((ready, payload.decode("utf-8").rstrip("\r\n")))
+
+    @property
+    def in_waiting(self) -> int:
+        with self._cond:
+            self._deliver()
+            return len(self._rx)
+
+    def read(self, size: int = 1) -> bytes:
+        return self._read(lambda: size if len(self._rx) >= size else 0, size)
+
+    def readline(self) -> bytes:
+        return self._read(lambda: self._rx.index(b"\n") + 1 if b"\n" in self._rx else 0, None)
+
+    def _read(self, ready: Callable[[], int], size: Optional[int]) -> bytes:
+        deadline = time.perf_counter() + (self.timeout if self.timeout is not None else 1e9)
+        with self._cond:
+            while True:
+                self._deliver()
+                count = ready()
+                now = time.perf_counter()
+                if count or now >= deadline:
+                    if not count:
+                        # Таймаут: как serial.Serial, отдаём то, что успело прийти
+                        count = len(self._rx) if size is None else min(size, len(self._rx))
+                    data = bytes(self._rx[:count])
+                    del self._rx[:count]
+                    return data
+                wait = deadline - now
+                if self._pending:
+                    wait = min(wait, max(self._pending[0][0] - now, 0))
+                self._cond.wait(wait)
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._rx.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+        with self._cond:
+            self._cond.notify_all()
+
+
+class LoopbackStreamWriter:
+    def __init__(self, reader: asyncio.StreamReader, firmware: FirmwareEmulator):
+        """Writer в стиле asyncio.StreamWriter: строки обрабатывает эмулятор, ответы попадают в reader."""
+        self.reader = reader
+        self.firmware = firmware
+        self.sent: List[str] = []
+        self._tx = bytearray()
+        self._closing = False
+
+    def write(self, data: bytes):
+        self._tx.extend(data)
+        while b"\n" in self._tx:
+            line, _, rest = bytes(self._tx).partition(b"\n")
+            self._tx = bytearray(rest)
+            command = line.decode("utf-8", errors="ignore")
+            self.sent.append(command)
+            payload = "".join(reply + "\r\n" for reply in self.firmware.handle(command)).encode("utf-8")
+            loop = asyncio.get_running_loop()
+            loop.call_later(self.firmware.reply_delay, self._deliver, payload)
+
+    def _deliver(self, payload: bytes):
+        if not self._closing:
+            self.reader.feed_data(payload)
+
+    async def drain(self):
+        pass
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self):
+        if not self._closing:
+            self._closing = True
+            self.reader.feed_eof()
+
+    async def wait_closed(self):
+        pass
+
+
+async def open_loopback_connection(port: str = "loop://", baudrate: int = 9600,
+                                   firmware: Optional[FirmwareEmulator] = None):
+    """
+    Аналог serial_asyncio.open_serial_connection с эмулятором прошивки вместо Arduino.
+    Подходит как connect для src.utils.async_controller.AsyncSerialDevice.
+    """
+    reader = asyncio.StreamReader()
+    return reader, LoopbackStreamWriter(reader, firmware if firmware is not None else FirmwareEmulator())
@@ -0,0 +1,97 @@
+"""
+Модуль с кольцевым буфером для аудио с микрофона.
+Память выделяется один раз; запись идёт прямо из callback'а sd.InputStream,
+а чтение «последних N сэмплов» возвращает view без копирования, если писатель
+не перезапишет эти сэмплы, пока читатель с ними работает.
+"""
+import numpy as np
+
+
+class AudioRingBuffer:
+    def __init__(self, capacity: int, dtype=np.float32):
+        """
+        Инициализация буфера.
+        :param capacity: ёмкость в сэмплах (например, sample_rate * 4 для 4 секунд)
+        :param dtype: тип сэмплов (np.float32 или np.int16)
+
+        Данные хранятся дважды подряд (массив длиной 2 * capacity), поэтому любой
+        отрезок из последних capacity сэмплов лежит в памяти непрерывно и отдаётся
+        как view. Каждый записанный блок перезаписывает самые старые сэмплы, поэтому
+        view корректен, пока писатель не дописал до его начала (см. guard в latest).
+        """
+        if capacity <= 0:
+            raise ValueError("Ёмкость буфера должна быть положительной")
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros(2 * capacity, dtype=self.dtype)
+        self._total = 0  # Сколько сэмплов записано за всё время
+        self.overruns = 0  # Сколько раз читатель отстал больше чем на capacity
+
+    @property
+    def total_written(self) -> int:
+        """Абсолютная позиция записи (число сэмплов, записанных с момента создания/сброса)."""
+        return self._total
+
+    @property
+    def filled(self) -> int:
+        """Сколько сэмплов сейчас доступно для чтения."""
+        return min(self._total, self.capacity)
+
+    def write(self, block: np.ndarray):
+        """
+        Записывает блок в буфер без промежуточных аллокаций.
+        :param block: одномерный массив сэмплов (или (frames, 1) из InputStream)
+        """
+        block = block.reshape(-1)
+        written = len(block)
+        if written > self.capacity:
+            block = block[-self.capacity:]
+        n = len(block)
+        cap = self.capacity
+        pos = (self._total + written - n) % cap
+        first = min(n, cap - pos)
+        self._data[pos:pos + first] = block[:first]
+        self._data[pos + cap:pos + cap + first] = block[:first]
+        rest = n - first
+        if rest:
+            self._data[:rest] = block[first:]
+            self._data[cap:cap + rest] = block[first:]
+        # Позицию сдвигаем после копирования: читатель не увидит недописанный блок
+        self._total += written
+
+    def latest(self, n: int, guard: int = 0) -> np.ndarray:
+        """
+        Возвращает последние n сэмплов (не больше заполненной части буфера).
+        :param guard: сколько сэмплов писатель может дописать, пока читатель работает с результатом
+                      (обычно размер блока callback'а)
+        :return: view без копирования, если n <= capacity - guard: следующие guard сэмплов
+                 ложатся на более старые данные. Иначе копия — view на весь буфер
+                 писатель начал бы перезаписывать уже на следующем блоке.
+        """
+        n = min(n, self.filled)
+        end = self._total % self.capacity
+        if end < n:
+            end += self.capacity
+        if n > self.capacity - guard:
+            return self._data[end - n:end].copy()
+        return self._data[end - n:end]
+
+    def read_since(self, position: int) -> tuple:
+        """
+        Возвращает сэмплы, записанные после абсолютной позиции position.
+        :param position: позиция, до которой данные уже прочитаны
+        :return: (view на новые сэмплы, новая позиция)
+        """
+        total = self._total
+        pending = max(0, total - position)
+        if pending > self.capacity:
+            self.overruns += 1
+            pending = self.capacity
+        end = total % self.capacity
+        if end < pending:
+            end += self.capacity
+        return self._data[end - pending:end], total
+
+    def clear(self):
+        """Сбрасывает буфер (память не освобождается)."""
+        self._total = 0
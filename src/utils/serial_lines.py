@@ -0,0 +1,72 @@
+"""
+Модуль для разбивки потока байтов из Serial на строки.
+Данные читаются из порта пачками (read(in_waiting or 1)), а не по одному байту;
+LineSplitter накапливает их в bytearray и отдаёт только завершённые строки.
+"""
+from typing import List
+
+# Строка длиннее этого (например, мусор на линии при неверной скорости) отбрасывается
+MAX_LINE_BYTES = 4096
+
+
+class LineSplitter:
+    def __init__(self, max_line: int = MAX_LINE_BYTES, encoding: str = "utf-8"):
+        """
+        :param max_line: максимальная длина строки в байтах
+        :param encoding: кодировка строк
+        """
+        self.max_line = max_line
+        self.encoding = encoding
+        self._buffer = bytearray()
+        self.dropped = 0  # Сколько раз буфер переполнился без перевода строки
+
+    def feed(self, data: bytes) -> List[str]:
+        """
+        Добавляет прочитанные байты и возвращает завершённые непустые строки
+        (разделители — "\\n" и "\\r", пробелы по краям обрезаются).
+        """
+        buffer = self._buffer
+        buffer += data
+        lines = []
+        start = 0
+        end = len(buffer)
+        while start < end:
+            cut = self._next_record(buffer, start, end, lines)
+            if cut == -1:
+                break
+            start = cut
+        del buffer[:start]
+        if len(buffer) > self.max_line:
+            buffer.clear()
+            self.dropped += 1
+        return lines
+
+    def _next_record(self, buffer: bytearray, start: int, end: int, lines: List[str]) -> int:
+        """
+        Разбирает одну запись потока с позиции start (здесь — строку, непустую добавляет в lines).
+        Наследники переопределяют, чтобы выделять из потока и другие записи.
+        :return: позиция после записи или -1, если она ещё не пришла целиком
+        """
+        cut = self._line_end(buffer, start, end)
+        if cut == -1:
+            return -1
+        line = bytes(buffer[start:cut]).decode(self.encoding, errors="ignore").strip()
+        if line:
+            lines.append(line)
+        return cut + 1
+
+    @staticmethod
+    def _line_end(buffer: bytearray, start: int, end: int) -> int:
+        """Позиция первого "\\n" или "\\r" начиная со start (-1, если строка не завершена)."""
+        newline = buffer.find(b"\n", start, end)
+        carriage = buffer.find(b"\r", start, newline if newline != -1 else end)
+        return carriage if carriage != -1 else newline
+
+    def reset(self):
+        """Отбрасывает недописанную строку."""
+        self._buffer.clear()
+
+    @property
+    def pending(self) -> int:
+        """Сколько байт недописанной строки в буфере."""
+        return len(self._buffer)
@@ -0,0 +1,235 @@
+"""
+Модуль установки связи с Arduino: поиск порта, согласование скорости и проверка линии.
+
+Прошивка после включения всегда работает на BASE_BAUDRATE. Хост:
+    1. находит порт (Arduino и популярные USB-UART мосты — первыми) и проверяет PING/PONG;
+    2. спрашивает список скоростей прошивки (BAUD?) и, начиная с самой высокой,
+       переключает обе стороны (BAUD:<скорость>);
+    3. на новой скорости проверяет линию: PING и несколько строк ECHO, сравнивая их с отправленными;
+    4. подтверждает скорость (BAUD:OK). Если проверка не прошла, хост ничего не отправляет:
+       прошивка сама возвращается на прежнюю скорость через BAUD_CONFIRM_SEC, и пробуется
+       следующая скорость.
+Прошивка без команды BAUD? остаётся на базовой скорости.
+
+Пример:
+    ser, link = open_link()     # порт и скорость подбираются автоматически
+    print(link)                 # LinkInfo(port='/dev/ttyACM0', baudrate=250000, rtt=..., throughput=...)
+"""
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# Скорость прошивки после включения (BASE_BAUD в arduino_controller.ino)
+BASE_BAUDRATE = 9600
+# Скорости, которые умеет хост (прошивка сообщает свои в ответ на BAUD?)
+SUPPORTED_BAUDRATES = (9600, 19200, 38400, 57600, 115200, 230400, 250000, 500000, 1000000)
+# Через сколько секунд без команд прошивка возвращается на прежнюю скорость (BAUD_CONFIRM_MS)
+BAUD_CONFIRM_SEC = 2.0
+# Не позже чем через столько секунд прошивка начинает обрабатывать дошедшую команду
+# (COMMAND_LATENCY_MS: loop() не ждёт через delay() и разбирает команды на каждом проходе)
+FIRMWARE_COMMAND_LATENCY = 0.1
+# Сколько ждать ответа: задержка прошивки с запасом на USB и передачу команды и ответа
+REPLY_TIMEOUT = 1.0
+# Открытие порта перезагружает Arduino; столько ждём, пока прошивка запустится
+RESET_DELAY = 2.0
+
+# USB VID плат Arduino и USB-UART мостов, которые на них ставят
+ARDUINO_USB_VIDS = {
+    0x2341: "Arduino",
+    0x2A03: "Arduino",
+    0x1A86: "CH340",
+    0x0403: "FTDI",
+    0x10C4: "CP210x",
+}
+
+
+@dataclass(frozen=True)
+class LinkInfo:
+    port: str
+    baudrate: int
+    rtt: Optional[float] = None         # PING → PONG на итоговой скорости, с
+    throughput: Optional[float] = None  # байт/с в проверке ECHO (None, если не проводилась)
+
+
+def _serial_module():
+    try:
+        import serial
+    except ImportError:
+        raise ImportError("Требуется установка pyserial: pip install pyserial")
+    return serial
+
+
+def list_candidate_ports() -> List[str]:
+    """Порты, на которых может быть Arduino: сначала платы с известным USB VID, затем остальные USB."""
+    _serial_module()
+    from serial.tools import list_ports
+
+    known, other = [], []
+    for info in list_ports.comports():
+        if info.vid in ARDUINO_USB_VIDS:
+            known.append(info.device)
+        elif info.vid is not None or "USB" in info.device or "ACM" in info.device:
+            other.append(info.device)
+    return known + other
+
+
+def wait_line(ser, accept: Callable[[str], bool], timeout: float = REPLY_TIMEOUT) -> Optional[str]:
+    """Читает строки, пропуская эхо команд и телеметрию, пока не придёт подходящая (или таймаут)."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        line = ser.readline().decode("utf-8", errors="ignore").strip()
+        if line and accept(line):
+            return line
+    return None
+
+
+def ping(ser, timeout: float = REPLY_TIMEOUT, attempts: int = 3) -> Optional[float]:
+    """
+    Проверяет, что прошивка отвечает на текущей скорости.
+    :return: время PING → PONG в секундах или None
+    """
+    for _ in range(attempts):
+        ser.reset_input_buffer()
+        started = time.perf_counter()
+        ser.write(b"PING\n")
+        if wait_line(ser, lambda line: line == "PONG", timeout) is not None:
+            return time.perf_counter() - started
+    return None
+
+
+def loop_time(ser, timeout: float = REPLY_TIMEOUT) -> Optional[float]:
+    """
+    Самый долгий проход loop() прошивки с прошлого запроса (счётчик сбрасывается).
+    Для проверки, что прошивка укладывается в FIRMWARE_COMMAND_LATENCY.
+    :return: время в секундах или None, если прошивка не знает LOOP?
+    """
+    ser.write(b"LOOP?\n")
+    line = wait_line(ser, lambda l: l.startswith(("OK: Loop", "ERROR")), timeout)
+    if line is None or not line.startswith("OK: Loop max_us="):
+        return None
+    try:
+        return int(line[len("OK: Loop max_us="):]) / 1e6
+    except ValueError:
+        return None
+
+
+def firmware_baudrates(ser, timeout: float = REPLY_TIMEOUT) -> List[int]:
+    """Скорости, которые поддерживает прошивка (пустой список, если она не знает BAUD?)."""
+    ser.write(b"BAUD?\n")
+    line = wait_line(ser, lambda l: l.startswith(("BAUDS:", "ERROR")), timeout)
+    if line is None or not line.startswith("BAUDS:"):
+        return []
+    rates = []
+    for item in line[len("BAUDS:"):].split(","):
+        try:
+            rates.append(int(item))
+        except ValueError:
+            pass
+    return rates
+
+
+def self_test(ser, count: int = 4, size: int = 40, timeout: float = REPLY_TIMEOUT) -> Optional[float]:
+    """
+    Проверка линии: прошивка возвращает строки ECHO, они сравниваются с отправленными.
+    Строки отправляются по одной, чтобы не переполнить приёмный буфер прошивки.
+    :param count: сколько строк отправить
+    :param size: длина полезной нагрузки строки (вместе с эхо "Received:" строка ответа
+                 укладывается в буфер прошивки)
+    :return: пропускная способность в байт/с (в обе стороны) или None, если хоть одна строка искажена
+    """
+    transferred = 0
+    started = time.perf_counter()
+    for i in range(count):
+        # Все печатные символы ASCII по кругу: искажение любого бита меняет строку
+        payload = "".join(chr(33 + (i * 7 + j) % 94) for j in range(size))
+        command = f"ECHO:{payload}"
+        ser.write(f"{command}\n".encode("ascii"))
+        reply = wait_line(ser, lambda line: line.startswith(("ECHO:", "ERROR")), timeout)
+        if reply != command:
+            return None
+        # Команда туда, эхо "Received: ..." и ответ обратно (с переводами строк)
+        transferred += len(command) + 1 + len(f"Received: {command}") + 2 + len(reply) + 2
+    return transferred / (time.perf_counter() - started)
+
+
+def switch_baudrate(ser, rate: int, timeout: float = REPLY_TIMEOUT) -> bool:
+    """Переключает прошивку и порт на новую скорость (без подтверждения)."""
+    ser.write(f"BAUD:{rate}\n".encode("ascii"))
+    reply = wait_line(ser, lambda line: line.startswith(("OK: Baud", "ERROR")), timeout)
+    if reply != f"OK: Baud {rate}":
+        return False
+    ser.baudrate = rate
+    ser.reset_input_buffer()
+    return True
+
+
+def negotiate(ser, rates: Sequence[int] = SUPPORTED_BAUDRATES, test_lines: int = 4,
+              reply_timeout: float = REPLY_TIMEOUT, confirm_timeout: float = BAUD_CONFIRM_SEC) -> LinkInfo:
+    """
+    Согласует самую высокую скорость, на которой линия проходит проверку.
+    :param ser: открытый порт на текущей скорости прошивки
+    :param rates: скорости, которые можно пробовать
+    :param test_lines: сколько строк ECHO в проверке линии
+    :param reply_timeout: сколько ждать ответа на команду, с
+    :param confirm_timeout: через сколько секунд прошивка откатывает неподтверждённую скорость
+    :raises ConnectionError: если прошивка не отвечает
+    """
+    port = getattr(ser, "port", None) or "loop://"
+    base = ser.baudrate
+    rtt = ping(ser, reply_timeout)
+    if rtt is None:
+        raise ConnectionError(f"Arduino не отвечает на PING на скорости {base}")
+
+    for rate in sorted(set(firmware_baudrates(ser, reply_timeout)) & set(rates), reverse=True):
+        if rate <= base:
+            break
+        if not switch_baudrate(ser, rate, reply_timeout):
+            continue
+        rate_rtt = ping(ser, reply_timeout, attempts=1)
+        throughput = self_test(ser, test_lines, timeout=reply_timeout) if rate_rtt is not None else None
+        if throughput is not None:
+            ser.write(b"BAUD:OK\n")
+            if wait_line(ser, lambda line: line == "OK: Baud confirmed", reply_timeout) is not None:
+                return LinkInfo(port, rate, rate_rtt, throughput)
+        # Линия на этой скорости ненадёжна: ждём, пока прошивка вернётся на прежнюю
+        print(f"Скорость {rate} не прошла проверку, возврат на {base}")
+        ser.baudrate = base
+        if ping(ser, reply_timeout, attempts=int(confirm_timeout / reply_timeout) + 2) is None:
+            raise ConnectionError(f"Arduino не вернулся на скорость {base}")
+
+    return LinkInfo(port, base, rtt, self_test(ser, test_lines, timeout=reply_timeout))
+
+
+def open_link(port: Optional[str] = None, baudrate: Optional[int] = None, timeout: float = 1.0,
+              rates: Sequence[int] = SUPPORTED_BAUDRATES) -> Tuple[object, LinkInfo]:
+    """
+    Открывает порт Arduino и согласует скорость.
+    :param port: имя порта; None — перебрать найденные порты
+    :param baudrate: фиксированная скорость без согласования; None — согласовать самую высокую
+    :param timeout: таймаут чтения порта, с
+    :param rates: скорости, которые можно пробовать при согласовании
+    :return: (открытый serial.Serial, LinkInfo)
+    :raises ConnectionError: если ни на одном порту Arduino не ответил
+    """
+    serial = _serial_module()
+    ports = [port] if port else list_candidate_ports()
+    errors = []
+    for name in ports:
+        try:
+            ser = serial.Serial(name, baudrate or BASE_BAUDRATE, timeout=timeout)
+        except (serial.SerialException, OSError) as e:
+            errors.append(f"{name}: {e}")
+            continue
+        time.sleep(RESET_DELAY)
+        try:
+            if baudrate is not None:
+                rtt = ping(ser)
+                if rtt is None:
+                    raise ConnectionError(f"Arduino не отвечает на PING на скорости {baudrate}")
+                return ser, LinkInfo(name, baudrate, rtt)
+            return ser, negotiate(ser, rates)
+        except ConnectionError as e:
+            errors.append(f"{name}: {e}")
+            ser.close()
+    details = "; ".join(errors) if errors else "портов не найдено"
+    raise ConnectionError(f"Arduino не найден ({details})")
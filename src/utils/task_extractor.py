@@ -1,8 +1,13 @@
 """
 Модуль для извлечения задачи (действие + объект) из голосовых команд.
 """
-import re
 from typing import Dict, Optional, List
+from src.utils.numerals import NumberSpan, UNIT_DEGREE, UNIT_PERCENT, parse_numbers
+from src.utils.tokenizer import Token, tokenize
+from src.utils.vocabulary import get_vocabulary
+
+# Встроенные словари. Рабочие словари загружаются из data/custom_dataset/synonyms.json
+# (см. src/utils/vocabulary.py); эти значения используются, если ключа в файле нет.
 
 # Словарь действий и их синонимов
 ACTIONS = {
@@ -33,7 +38,8 @@ OBJECTS = {
     "музыка": ["музыка", "музыку", "музыке", "музыки", "песня", "песню"],
     "радио": ["радио"],
     "вентилятор": ["вентилятор", "вентилятора", "вентилятору"],
-    "громкость": ["громкость", "громкости", "громкостью", "звук", "звука", "звуку", "звуком"]
+    "громкость": ["громкость", "громкости", "громкостью", "звук", "звука", "звуку", "звуком"],
+    "сигнализация": ["сигнализация", "сигнализацию", "сигнализации", "охрана", "охрану"]
 }
 
 # Словарь для преобразования текстовых числительных в числа
@@ -49,141 +55,89 @@ NUMBER_WORDS = {
     "девятьсот": 900, "тысяча": 1000
 }
 
+# Слова, при которых число без единицы измерения трактуется как проценты
+PERCENT_CONTEXT = ("процент", "громкост", "звук")
+
+# Качественные значения: слово (или пара слов) → значение
+QUALITATIVE_VALUES = {
+    "максимум": "максимум", "максимально": "максимум", "на полную": "максимум",
+    "минимум": "минимум", "минимально": "минимум",
+    "тихо": "тихо", "тише": "тихо",
+    "громко": "громко", "громче": "громко",
+}
+
 def text_to_number(text: str) -> Optional[int]:
     """
     Преобразует текстовое числительное в число.
-    Например: "двадцать два" → 22, "тридцать пять" → 35
-    """
-    text_lower = text.lower().strip()
-    
-    # Сначала проверяем точное совпадение
-    if text_lower in NUMBER_WORDS:
-        return NUMBER_WORDS[text_lower]
-    
-    # Разбиваем на слова и ищем составные числа
-    words = text_lower.split()
-    total = 0
-    
-    for word in words:
-        if word in NUMBER_WORDS:
-            total += NUMBER_WORDS[word]
-    
-    return total if total > 0 else None
+    Например: "двадцать два" → 22, "тридцать пять" → 35, "двухсот" → 200
+    """
+    numbers = parse_numbers(tokenize(text), get_vocabulary().numeral_forms)
+    return numbers[0].value if numbers else None
 
 def extract_action(text: str) -> Optional[str]:
     """
     Извлекает действие из текста команды.
-    Возвращает каноническое название действия или None.
+    Возвращает каноническое название первого в тексте действия или None.
     """
-    text_lower = text.lower()
-    for action, synonyms in ACTIONS.items():
-        for synonym in synonyms:
-            if synonym in text_lower:
-                return action
-    return None
+    match = get_vocabulary().matcher.first(text, "action")
+    return match.canonical if match else None
 
 def extract_object(text: str) -> Optional[str]:
     """
     Извлекает объект из текста команды.
-    Возвращает каноническое название объекта или None.
+    Возвращает каноническое название первого в тексте объекта или None.
+    """
+    match = get_vocabulary().matcher.first(text, "object")
+    return match.canonical if match else None
+
+def format_value(number: NumberSpan, tokens: List[Token]) -> str:
     """
-    text_lower = text.lower()
-    for obj, synonyms in OBJECTS.items():
-        for synonym in synonyms:
-            if synonym in text_lower:
-                return obj
+    Форматирует число с единицей измерения: "22 градусов", "50%", "5".
+    Если единица не стоит сразу после числа, она берётся из контекста команды
+    ("поставь громкость на 30" → "30%").
+    """
+    value = number.value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    unit = number.unit
+    if unit is None:
+        words = [token.text for token in tokens]
+        if any(word.startswith(UNIT_DEGREE) for word in words):
+            unit = UNIT_DEGREE
+        elif "%" in words or any(word.startswith(PERCENT_CONTEXT) for word in words):
+            unit = UNIT_PERCENT
+    if unit == UNIT_DEGREE:
+        return f"{value} градусов"
+    if unit == UNIT_PERCENT:
+        return f"{value}%"
+    return str(value)
+
+def select_value(tokens: List[Token], numbers: List[NumberSpan]) -> Optional[str]:
+    """
+    Выбирает значение команды из уже разобранных чисел: приоритет у числа
+    с единицей измерения, иначе берётся первое число. Без чисел ищутся
+    качественные значения ("максимум", "тише", ...).
+    """
+    if numbers:
+        number = next((n for n in numbers if n.unit is not None), numbers[0])
+        return format_value(number, tokens)
+    for i, token in enumerate(tokens):
+        if i + 1 < len(tokens):
+            pair = f"{token.text} {tokens[i + 1].text}"
+            if pair in QUALITATIVE_VALUES:
+                return QUALITATIVE_VALUES[pair]
+        if token.text in QUALITATIVE_VALUES:
+            return QUALITATIVE_VALUES[token.text]
     return None
 
 def extract_value(text: str) -> Optional[str]:
     """
     Извлекает значение/параметр из команды (например, "22 градуса", "двадцать два градуса", "на 5").
-    Поддерживает как цифровые, так и текстовые числительные.
+    Поддерживает как цифровые, так и текстовые числительные в любом падеже;
+    текст разбирается за один проход по токенам.
     """
-    text_lower = text.lower()
-    
-    # Сначала ищем цифровые числа
-    numbers = re.findall(r'\d+', text)
-    if numbers:
-        # Ищем единицы измерения или контекст
-        if "градус" in text_lower:
-            return f"{numbers[0]} градусов"
-        elif "процент" in text_lower or "%" in text or "громкость" in text_lower or "звук" in text_lower:
-            return f"{numbers[0]}%"
-        else:
-            return numbers[0]
-    
-    # Ищем текстовые числительные для процентов (громкость)
-    if "процент" in text_lower or "%" in text_lower or ("громкость" in text_lower or "звук" in text_lower):
-        # Извлекаем часть текста до "процент" или ищем числительное перед "громкость"/"звук"
-        if "процент" in text_lower:
-            parts = text_lower.split("процент")[0].strip()
-        else:
-            # Ищем числительное перед "громкость" или "звук"
-            parts = ""
-            words = text_lower.split()
-            for i, word in enumerate(words):
-                if word in ["громкость", "звук", "звука", "звуку", "звуком"]:
-                    if i > 0:
-                        # Берем предыдущие 1-3 слова
-                        start = max(0, i - 3)
-                        parts = " ".join(words[start:i])
-                    break
-        
-        if parts:
-            number = text_to_number(parts)
-            if number is not None:
-                return f"{number}%"
-            # Если не нашли, пробуем найти в последних 2-3 словах
-            words = parts.split()
-            if len(words) >= 2:
-                for i in range(len(words) - 2, len(words)):
-                    if i >= 0:
-                        phrase = " ".join(words[i:])
-                        number = text_to_number(phrase)
-                        if number is not None:
-                            return f"{number}%"
-    
-    # Ищем текстовые числительные
-    # Ищем фразы типа "двадцать два градуса", "тридцать пять градусов"
-    if "градус" in text_lower:
-        # Извлекаем часть текста до "градус"
-        parts = text_lower.split("градус")[0].strip()
-        # Пробуем найти числительное в этой части
-        number = text_to_number(parts)
-        if number is not None:
-            return f"{number} градусов"
-        # Если не нашли, пробуем найти в последних 2-3 словах перед "градус"
-        words = parts.split()
-        if len(words) >= 2:
-            # Пробуем последние 2-3 слова
-            for i in range(len(words) - 2, len(words)):
-                if i >= 0:
-                    phrase = " ".join(words[i:])
-                    number = text_to_number(phrase)
-                    if number is not None:
-                        return f"{number} градусов"
-    
-    # Ищем текстовые числительные без единиц измерения
-    # Пробуем найти числительное в тексте
-    words = text_lower.split()
-    for i in range(len(words)):
-        for j in range(i + 1, min(i + 4, len(words) + 1)):  # Проверяем фразы до 3 слов
-            phrase = " ".join(words[i:j])
-            number = text_to_number(phrase)
-            if number is not None:
-                return str(number)
-    
-    # Ищем текстовые значения
-    if "максимум" in text_lower or "максимально" in text_lower or "на полную" in text_lower:
-        return "максимум"
-    if "минимум" in text_lower or "минимально" in text_lower:
-        return "минимум"
-    if "тихо" in text_lower or "тише" in text_lower:
-        return "тихо"
-    if "громко" in text_lower or "громче" in text_lower:
-        return "громко"
-    
-    return None
+    tokens = tokenize(text)
+    return select_value(tokens, parse_numbers(tokens, get_vocabulary().numeral_forms))
 
 def extract_task(segment: str) -> Dict[str, Optional[str]]:
     """
@@ -0,0 +1,240 @@
+"""
+Модуль двоичной телеметрии прошивки arduino_controller.ino.
+
+В текстовом режиме (по умолчанию) прошивка печатает строки
+"Temperature: 23.50, Distance: 120" и "STATUS: ..." — около 40–100 байт на отсчёт.
+После команды TELEMETRY:BIN она отправляет кадр фиксированного формата (14 байт)
+и только когда показания изменились (или раз в TELEMETRY_HEARTBEAT_MS):
+
+    смещение  размер  поле
+    0         2       синхрослово 0xAA 0x55
+    2         1       длина полезной нагрузки (9)
+    3         1       тип кадра (0x01 — телеметрия)
+    4         2       номер кадра (uint16, растёт на каждый отправленный кадр)
+    6         2       температура, сотые доли °C (int16)
+    8         2       расстояние, см (uint16)
+    10        1       флаги: свет, отопление, вентилятор, сигнализация, тревога (биты 0–4)
+    11        1       угол окна, градусы
+    12        2       CRC-16/CCITT-FALSE байтов 2..11
+
+Все многобайтовые поля — little-endian (как на AVR). Кадры идут подряд без
+разделителей, текстовые ответы на команды — между ними в том же потоке:
+TelemetryDemux отделяет строки от кадров, а кадры складываются в кольцевой
+массив NumPy без создания словаря на каждый отсчёт. Если байт потерян или
+искажён, демультиплексор ищет следующее синхрослово и принимает кадр только
+с верной CRC. Команда TELEMETRY:TEXT возвращает текстовый режим.
+"""
+import binascii
+import struct
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.utils.serial_lines import MAX_LINE_BYTES, LineSplitter
+
+SYNC = b"\xaa\x55"
+FRAME_TELEMETRY = 0x01
+PAYLOAD_SIZE = 9
+FRAME_SIZE = 14
+# Прошивка повторяет неизменившийся кадр не реже, чем раз в столько миллисекунд
+TELEMETRY_HEARTBEAT_MS = 1000
+
+CMD_BINARY = "TELEMETRY:BIN"
+CMD_TEXT = "TELEMETRY:TEXT"
+
+FLAG_LIGHT = 0x01
+FLAG_HEATING = 0x02
+FLAG_FAN = 0x04
+FLAG_ALARM = 0x08
+FLAG_TRIGGERED = 0x10
+
+_FRAME = struct.Struct("<2sBBHhHBBH")
+
+# Кадр как он лежит в потоке
+FRAME_DTYPE = np.dtype([("sync", "<u2"), ("length", "u1"), ("type", "u1"), ("seq", "<u2"),
+                        ("temperature", "<i2"), ("distance", "<u2"), ("flags", "u1"),
+                        ("window", "u1"), ("crc", "<u2")])
+
+# Отсчёт в истории телеметрии
+SAMPLE_DTYPE = np.dtype([("time", "<f8"), ("seq", "<u2"), ("temperature", "<f4"),
+                         ("distance", "<u2"), ("flags", "u1"), ("window", "u1")])
+
+
+def crc16(data: bytes) -> int:
+    """CRC-16/CCITT-FALSE (полином 0x1021, начальное значение 0xFFFF), как _crc_xmodem_update на AVR."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(seq: int, temperature: float, distance: int, flags: int, window: int) -> bytes:
+    """Собирает кадр телеметрии (так же, как прошивка)."""
+    body = _FRAME.pack(SYNC, PAYLOAD_SIZE, FRAME_TELEMETRY, seq & 0xFFFF,
+                       int(round(temperature * 100)), max(distance, 0), flags, window, 0)[:-2]
+    return body + struct.pack("<H", crc16(body[2:]))
+
+
+def decode_frames(data: bytes) -> np.ndarray:
+    """
+    Разбирает подряд идущие кадры одним вызовом np.frombuffer.
+    :param data: байты, длина кратна FRAME_SIZE
+    :return: структурированный массив FRAME_DTYPE только с кадрами, у которых сошлась CRC
+    """
+    frames = np.frombuffer(data, dtype=FRAME_DTYPE)
+    valid = np.fromiter((crc16(data[i + 2:i + FRAME_SIZE - 2]) for i in range(0, len(data), FRAME_SIZE)),
+                        dtype=np.uint16, count=len(frames))
+    return frames[valid == frames["crc"]]
+
+
+class TelemetryLog:
+    def __init__(self, capacity: int = 1024):
+        """
+        Кольцевая история отсчётов телеметрии в структурированном массиве NumPy.
+        :param capacity: сколько последних отсчётов хранить
+        """
+        if capacity < 1:
+            raise ValueError("Ёмкость истории должна быть положительной")
+        self.samples = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.count = 0    # Сколько отсчётов записано за всё время
+        self.lost = 0     # Сколько кадров пропущено (по разрывам в номерах)
+        self._last_seq: Optional[int] = None
+
+    def append_frames(self, frames: np.ndarray, timestamp: Optional[float] = None):
+        """Добавляет разобранные кадры (массив FRAME_DTYPE)."""
+        n = len(frames)
+        if not n:
+            return
+        seq = frames["seq"].astype(np.int64)
+        previous = np.concatenate(([self._last_seq if self._last_seq is not None else seq[0] - 1], seq[:-1]))
+        # Номер кадра 16-битный: разница берётся по модулю 2^16; скачок назад — перезапуск прошивки
+        gaps = (seq - previous - 1) % 65536
+        self.lost += int(gaps[gaps < 32768].sum())
+        self._last_seq = int(seq[-1])
+
+        capacity = len(self.samples)
+        index = (self.count + np.arange(n)) % capacity
+        samples = self.samples
+        samples["time"][index] = time.time() if timestamp is None else timestamp
+        samples["seq"][index] = frames["seq"]
+        samples["temperature"][index] = frames["temperature"] / 100.0
+        samples["distance"][index] = frames["distance"]
+        samples["flags"][index] = frames["flags"]
+        samples["window"][index] = frames["window"]
+        self.count += n
+
+    def latest(self) -> Optional[np.void]:
+        """Последний отсчёт (запись NumPy) или None."""
+        if not self.count:
+            return None
+        return self.samples[(self.count - 1) % len(self.samples)]
+
+    def history(self) -> np.ndarray:
+        """Сохранённые отсчёты в порядке поступления."""
+        capacity = len(self.samples)
+        if self.count <= capacity:
+            return self.samples[:self.count]
+        start = self.count % capacity
+        return np.concatenate((self.samples[start:], self.samples[:start]))
+
+    def latest_dict(self) -> Optional[Dict]:
+        """Последний отсчёт в формате DATA: JSON (для вывода пользователю)."""
+        sample = self.latest()
+        if sample is None:
+            return None
+        flags = int(sample["flags"])
+        return {
+            "temperature": round(float(sample["temperature"]), 2),
+            "distance": int(sample["distance"]),
+            "alarm_enabled": bool(flags & FLAG_ALARM),
+            "alarm_triggered": bool(flags & FLAG_TRIGGERED),
+            "heater": bool(flags & FLAG_HEATING),
+            "fan": bool(flags & FLAG_FAN),
+            "light": bool(flags & FLAG_LIGHT),
+            "window_angle": int(sample["window"]),
+        }
+
+
+class TelemetryDemux(LineSplitter):
+    def __init__(self, log: Optional[TelemetryLog] = None, max_line: int = MAX_LINE_BYTES,
+                 encoding: str = "utf-8"):
+        """
+        Разделяет поток байтов из порта на текстовые строки и кадры телеметрии.
+        LineSplitter для порта, на котором может быть включён двоичный режим: строки режутся
+        так же, кадры с верной CRC копятся и за один вызов feed переводятся в массив.
+        Байты, которые не складываются ни в кадр, ни в печатную строку (остаток кадра
+        после потерянного байта), пропускаются до следующего синхрослова.
+        :param log: куда складывать кадры (по умолчанию новая история)
+        :param max_line: максимальная длина строки в байтах
+        :param encoding: кодировка строк
+        """
+        super().__init__(max_line, encoding)
+        self.log = log if log is not None else TelemetryLog()
+        self._frames = bytearray()
+        self.frames = 0     # Сколько кадров принято
+        self.corrupt = 0    # Сколько кадров отброшено (неверная CRC или заголовок)
+        self.skipped = 0    # Сколько байт пропущено при поиске синхрослова
+
+    def feed(self, data: bytes) -> List[str]:
+        """
+        Добавляет прочитанные байты: кадры уходят в историю, возвращаются
+        завершённые непустые текстовые строки.
+        """
+        lines = super().feed(data)
+        if self._frames:
+            decoded = np.frombuffer(bytes(self._frames), dtype=FRAME_DTYPE)  # CRC уже проверены
+            self._frames.clear()
+            self.frames += len(decoded)
+            self.log.append_frames(decoded)
+        return lines
+
+    def _next_record(self, buffer: bytearray, start: int, end: int, lines: List[str]) -> int:
+        if buffer[start] == 0xAA:
+            if end - start < 2:
+                return -1
+            if buffer[start + 1] == 0x55:
+                if end - start < FRAME_SIZE:
+                    return -1
+                frame = buffer[start:start + FRAME_SIZE]
+                if (frame[2] == PAYLOAD_SIZE and frame[3] == FRAME_TELEMETRY
+                        and crc16(bytes(frame[2:-2])) == frame[-2] | frame[-1] << 8):
+                    self._frames += frame
+                    return start + FRAME_SIZE
+                # Искажённый кадр: если байты потеряны, следующий кадр начинается внутри этого
+                # (его синхрослово может занять последний байт окна и следующий за ним)
+                if end - start < FRAME_SIZE + 1:
+                    return -1
+                self.corrupt += 1
+                resync = buffer.find(SYNC, start + 1, start + FRAME_SIZE + 1)
+                return resync if resync != -1 else start + FRAME_SIZE
+
+        cut = self._line_end(buffer, start, end)
+        sync = buffer.find(SYNC, start, cut if cut != -1 else end)
+        if sync != -1:
+            # Строка не может продолжаться кадром: до синхрослова — остаток испорченного кадра
+            self.skipped += sync - start
+            return sync
+        if cut == -1:
+            return -1
+        try:
+            line = bytes(buffer[start:cut]).decode(self.encoding).strip()
+        except UnicodeDecodeError:
+            line = None
+        if line is None or not line.isprintable():
+            self.skipped += cut - start  # Двоичный мусор, в котором встретился байт перевода строки
+        elif line:
+            lines.append(line)
+        return cut + 1
+
+
+def parse_text_telemetry(line: str) -> Optional[Dict[str, float]]:
+    """
+    Разбирает текстовую строку телеметрии "Temperature: 23.50, Distance: 120".
+    :return: {"temperature": ..., "distance": ...} или None, если это не строка телеметрии
+    """
+    if not line.startswith("Temperature:"):
+        return None
+    try:
+        temperature, distance = line.split(",", 1)
+        return {"temperature": float(temperature.split(":", 1)[1]),
+                "distance": float(distance.split(":", 1)[1])}
+    except (IndexError, ValueError):
+        return None
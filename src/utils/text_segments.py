@@ -1,8 +1,9 @@
 """
 Модуль для разбивки распознанного текста на сегменты команды (токенизация, выделение основных частей для последующей обработки).
 """
-import re
-from typing import List
+from typing import Iterable, List, NamedTuple, Optional
+
+from src.utils.tokenizer import Token, normalize, tokenize
 
 # Типовой список глаголов команд (расширяемый)
 COMMAND_VERBS = [
@@ -10,6 +11,83 @@ COMMAND_VERBS = [
     "убавь", "добавь", "измени", "подними", "опусти", "сохрани", "переключи", "переведи"
 ]
 
+# Союзы-связки между командами, которые отбрасываются в конце сегмента
+CONNECTORS = ["и", "затем", "потом"]
+
+
+class Segment(NamedTuple):
+    text: str         # текст сегмента из исходной строки
+    start: int        # начало в исходном тексте
+    end: int          # конец в исходном тексте
+    token_start: int  # индекс первого токена
+    token_end: int    # индекс токена после последнего
+
+
+class CommandSegmenter:
+    def __init__(self, verbs: Optional[Iterable[str]] = None, connectors: Optional[Iterable[str]] = None):
+        """
+        Сегментатор строится один раз и переиспользуется для каждой фразы
+        и каждой частичной гипотезы распознавания.
+        :param verbs: глаголы, с которых начинается новая команда (по умолчанию COMMAND_VERBS)
+        :param connectors: связки, отбрасываемые в конце сегмента (по умолчанию CONNECTORS)
+        """
+        self.verbs = frozenset(normalize(v) for v in (verbs if verbs is not None else COMMAND_VERBS))
+        self.connectors = frozenset(normalize(c) for c in (connectors if connectors is not None else CONNECTORS))
+
+    @classmethod
+    def from_actions(cls, actions: dict, verbs: Optional[Iterable[str]] = None) -> "CommandSegmenter":
+        """
+        Строит сегментатор, который дополнительно режет по синонимам действий
+        (например, ACTIONS из словаря): "запусти", "отключи", "найди мне", ...
+        """
+        words = set(verbs if verbs is not None else COMMAND_VERBS)
+        for canonical, synonyms in actions.items():
+            for phrase in [canonical, *synonyms]:
+                tokens = tokenize(phrase)
+                if tokens:
+                    words.add(tokens[0].text)
+        return cls(words)
+
+    def split_tokens(self, tokens: List[Token]) -> List[tuple]:
+        """
+        Делит готовый список токенов на команды за один проход.
+        :return: список пар (token_start, token_end) без завершающих связок
+        """
+        spans = []
+        start = 0
+        for i, token in enumerate(tokens):
+            if token.text in self.verbs and i > start:
+                spans.append((start, i))
+                start = i
+        if start < len(tokens):
+            spans.append((start, len(tokens)))
+
+        result = []
+        for begin, end in spans:
+            while end > begin and tokens[end - 1].text in self.connectors:
+                end -= 1
+            if end > begin:
+                result.append((begin, end))
+        return result
+
+    def segment(self, text: str, tokens: Optional[List[Token]] = None) -> List[Segment]:
+        """
+        Разбивает текст на сегменты со спанами.
+        :param text: исходный текст
+        :param tokens: уже готовые токены этого текста (чтобы не токенизировать повторно)
+        """
+        if tokens is None:
+            tokens = tokenize(text)
+        return [
+            Segment(text[tokens[begin].start:tokens[end - 1].end],
+                    tokens[begin].start, tokens[end - 1].end, begin, end)
+            for begin, end in self.split_tokens(tokens)
+        ]
+
+
+_default_segmenter = CommandSegmenter()
+
+
 def segment_command(text: str) -> List[str]:
     """
     Разбивка по глаголам, объединяя фрагменты без глагола с предыдущей командой.
@@ -22,33 +100,11 @@ def segment_command(text: str) -> List[str]:
         'поставь температуру 22'
     ]
     """
-    COMMAND_VERBS = [
-        "включи", "выключи", "открой", "закрой", "установи", "сделай", "поставь", "запусти",
-        "останови", "увеличь", "уменьши", "убавь", "добавь", "измени", "подними", "опусти",
-        "сохрани", "переключи", "переведи"
-    ]
-    segments = re.split(r'(?=\b(?:' + '|'.join(COMMAND_VERBS) + r')\b)', text, flags=re.IGNORECASE)
-    result = []
-    buffer = ''
-    for seg in segments:
-        seg = seg.strip(' ,.;\n')
-        if not seg:
-            continue
-        if re.match(r'^(' + '|'.join(COMMAND_VERBS) + r')\b', seg, flags=re.IGNORECASE):
-            if buffer:
-                result.append(buffer.strip())
-            buffer = seg
-        else:
-            buffer += ' ' + seg
-    if buffer:
-        result.append(buffer.strip())
-
-    def clean_segment(text: str) -> str:
-        return re.sub(r'(и|затем|потом)\s*$', '', text.strip(), flags=re.IGNORECASE).strip()
-    return [clean_segment(r) for r in result if clean_segment(r)]
+    return [segment.text for segment in _default_segmenter.segment(text)]
 
 
 # Пример:
 # segments = segment_command("Включи свет в гостиной и выключи телевизор.")
 # print(segments)  # ['Включи свет в гостиной', 'выключи телевизор']
-
+# spans = CommandSegmenter().segment("Включи свет и выключи телевизор")
+# print(spans[1])  # Segment(text='выключи телевизор', start=14, end=31, token_start=3, token_end=5)
@@ -0,0 +1,29 @@
+"""
+Модуль для нормализации и токенизации распознанного текста.
+Токены хранят позиции в нормализованном тексте, поэтому все этапы NLU
+могут работать с одним и тем же списком токенов и возвращать спаны.
+"""
+import re
+from typing import List, NamedTuple
+
+# Числа (в том числе десятичные), слова из букв и знак процента
+TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)?|[^\W\d_]+|%")
+
+
+class Token(NamedTuple):
+    text: str   # нормализованная форма токена
+    start: int  # начало в нормализованном тексте
+    end: int    # конец в нормализованном тексте
+
+
+def normalize(text: str) -> str:
+    """Приводит текст к нижнему регистру и заменяет "ё" на "е" (длина текста не меняется)."""
+    return text.lower().replace("ё", "е")
+
+
+def tokenize(text: str) -> List[Token]:
+    """
+    Разбивает текст на токены за один проход.
+    Пример: "Поставь 22,5 градуса" → [Token('поставь', 0, 7), Token('22,5', 8, 12), Token('градуса', 13, 20)]
+    """
+    return [Token(m.group(), m.start(), m.end()) for m in TOKEN_RE.finditer(normalize(text))]
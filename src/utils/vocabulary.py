@@ -0,0 +1,176 @@
+"""
+Модуль для загрузки словарей NLU (действия, объекты, комнаты, местоимения, числительные)
+из JSON-конфигурации, например data/custom_dataset/synonyms.json.
+
+Индекс (граф фраз) компилируется при загрузке — это миллисекунды, поэтому на диске
+он не кэшируется. Изменение файла подхватывается на лету, без перезапуска ассистента.
+
+Падежные формы объектов и комнат не обязательно перечислять вручную: они ищутся
+по леммам (src/utils/morphology.py) — из форм, порождённых для слов словаря,
+и из внешнего индекса лемм, если он собран scripts/build_lemma_index.py.
+Пересборка индекса считается новой версией словаря, как и изменение JSON.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.utils.morphology import (DEFAULT_LEMMA_INDEX_PATH, LemmaIndex, Lemmatizer, lemma_index_stamp,
+                                  load_lemma_index, paradigm_pairs)
+from src.utils.numerals import build_numeral_forms
+from src.utils.phrase_matcher import PhraseMatcher
+
+DEFAULT_VOCABULARY_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "../../data/custom_dataset/synonyms.json"))
+
+# Версия правил компиляции словаря: входит в source_hash, чтобы сохранённые хэши
+# (например, в результатах scripts/benchmark_nlu.py) различали словари, собранные разным кодом
+COMPILER_VERSION = 3
+
+VOCABULARY_KEYS = ["KNOWN_ROOMS", "CASE_ENDINGS", "LOCATION_PRONOUNS", "ACTIONS", "OBJECTS", "NUMBER_WORDS"]
+
+
+def builtin_vocabulary() -> Dict:
+    """Встроенные словари из кода — используются для ключей, которых нет в JSON."""
+    from src.utils import location_extractor, task_extractor
+    return {
+        "KNOWN_ROOMS": location_extractor.KNOWN_ROOMS,
+        "CASE_ENDINGS": location_extractor.CASE_ENDINGS,
+        "LOCATION_PRONOUNS": location_extractor.LOCATION_PRONOUNS,
+        "ACTIONS": task_extractor.ACTIONS,
+        "OBJECTS": task_extractor.OBJECTS,
+        "NUMBER_WORDS": task_extractor.NUMBER_WORDS,
+    }
+
+
+class Vocabulary:
+    def __init__(self, data: Dict, source_hash: str = "", lemma_index_path: str = DEFAULT_LEMMA_INDEX_PATH):
+        """
+        Компилирует словари в индекс.
+        :param data: словари в формате synonyms.json
+        :param source_hash: хэш исходных данных (по нему хранилище узнаёт новую версию словаря)
+        :param lemma_index_path: каталог внешнего индекса лемм (если индекс не собран, он не нужен)
+        """
+        self.source_hash = source_hash
+        self.known_rooms: List[str] = list(data["KNOWN_ROOMS"])
+        self.case_endings: Dict[str, List[str]] = dict(data["CASE_ENDINGS"])
+        self.location_pronouns: List[str] = list(data["LOCATION_PRONOUNS"])
+        self.actions: Dict[str, List[str]] = dict(data["ACTIONS"])
+        self.objects: Dict[str, List[str]] = dict(data["OBJECTS"])
+        self.number_words: Dict[str, int] = dict(data["NUMBER_WORDS"])
+        # Таблица форм числительных (все падежи и порядковые) с учётом NUMBER_WORDS
+        self.numeral_forms = build_numeral_forms(self.number_words)
+        self.generation = 0  # Номер загрузки в VocabularyStore (растёт при каждой перезагрузке)
+
+        # Формы объектов и комнат, порождённые по правилам склонения, плюс внешний индекс лемм
+        indexes = [LemmaIndex.build(paradigm_pairs(self.noun_words()))]
+        external = load_lemma_index(lemma_index_path)
+        if external is not None:
+            indexes.append(external)
+        self.lemmatizer = Lemmatizer(indexes)
+
+        # Один граф фраз на все словари: действия, объекты, комнаты и местоимения за один проход
+        self.matcher = PhraseMatcher(self.lemmatizer)
+        self.matcher.add_dictionary("action", self.actions)
+        self.matcher.add_dictionary("object", self.objects)
+        self.matcher.add_dictionary("room", {room: self.case_endings.get(room, []) for room in self.known_rooms})
+        self.matcher.add_dictionary("pronoun", {pronoun: [] for pronoun in self.location_pronouns})
+
+    def noun_words(self) -> List[str]:
+        """Слова объектов и комнат, для которых порождаются падежные формы."""
+        words = [word for canonical, synonyms in self.objects.items() for word in [canonical, *synonyms]]
+        return words + self.known_rooms
+
+
+def _read_source(path: str, lemma_index_path: str = DEFAULT_LEMMA_INDEX_PATH) -> tuple:
+    """
+    Читает JSON, дополняет встроенными словарями и возвращает (данные, хэш).
+    В хэш входит и отметка внешнего индекса лемм: его пересборка меняет словарь.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = builtin_vocabulary()
+    data.update({k: v for k, v in json.loads(raw.decode("utf-8")).items() if k in VOCABULARY_KEYS})
+    digest = hashlib.sha256()
+    digest.update(str(COMPILER_VERSION).encode())
+    digest.update(json.dumps(data, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    digest.update(repr(lemma_index_stamp(lemma_index_path)).encode("utf-8"))
+    return data, digest.hexdigest()
+
+
+def load_vocabulary(path: str = DEFAULT_VOCABULARY_PATH,
+                    lemma_index_path: str = DEFAULT_LEMMA_INDEX_PATH) -> Vocabulary:
+    """
+    Загружает словари и возвращает скомпилированный индекс.
+    :param path: путь к JSON со словарями
+    :param lemma_index_path: каталог внешнего индекса лемм
+    """
+    data, source_hash = _read_source(path, lemma_index_path)
+    return Vocabulary(data, source_hash, lemma_index_path)
+
+
+class VocabularyStore:
+    def __init__(self, path: str = DEFAULT_VOCABULARY_PATH, check_interval: float = 1.0,
+                 lemma_index_path: str = DEFAULT_LEMMA_INDEX_PATH):
+        """
+        Хранилище текущего словаря с горячей перезагрузкой.
+        :param path: путь к JSON со словарями
+        :param check_interval: как часто (в секундах) проверять изменение файла
+        :param lemma_index_path: каталог внешнего индекса лемм (его пересборка тоже перезагружает словарь)
+        """
+        self.path = path
+        self.lemma_index_path = lemma_index_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._vocabulary: Optional[Vocabulary] = None
+        self._stat = None
+        self._next_check = 0.0
+        self.generation = 0
+
+    def _file_stat(self):
+        """Отметки JSON (None, если файла нет) и внешнего индекса лемм."""
+        try:
+            st = os.stat(self.path)
+            source = st.st_mtime_ns, st.st_size
+        except OSError:
+            source = None
+        return source, lemma_index_stamp(self.lemma_index_path)
+
+    def get(self) -> Vocabulary:
+        """Возвращает текущий словарь, перезагружая его, если файл изменился."""
+        now = time.monotonic()
+        if self._vocabulary is not None and now < self._next_check:
+            return self._vocabulary
+        with self._lock:
+            self._next_check = now + self.check_interval
+            stat = self._file_stat()
+            if self._vocabulary is not None and stat == self._stat:
+                return self._vocabulary
+            self._stat = stat
+            if stat[0] is None:
+                # Файла нет — работаем на встроенных словарях
+                vocabulary = Vocabulary(builtin_vocabulary(), "builtin", self.lemma_index_path)
+            else:
+                try:
+                    vocabulary = load_vocabulary(self.path, self.lemma_index_path)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Ошибка загрузки словаря {self.path}: {e}")
+                    if self._vocabulary is not None:
+                        return self._vocabulary
+                    vocabulary = Vocabulary(builtin_vocabulary(), "builtin", self.lemma_index_path)
+            if self._vocabulary is None or vocabulary.source_hash != self._vocabulary.source_hash:
+                self.generation += 1
+                vocabulary.generation = self.generation
+                self._vocabulary = vocabulary
+            return self._vocabulary
+
+
+# Общее хранилище словаря процесса
+default_store = VocabularyStore()
+
+
+def get_vocabulary() -> Vocabulary:
+    """Возвращает текущий словарь из общего хранилища (с горячей перезагрузкой)."""
+    return default_store.get()
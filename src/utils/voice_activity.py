@@ -0,0 +1,110 @@
+"""
+Модуль для дешёвой детекции речевой активности (VAD) перед декодером.
+Оценивает энергию (RMS) и частоту пересечений нуля (ZCR) векторно на NumPy
+и пропускает к распознаванию только блоки, похожие на речь.
+"""
+import numpy as np
+
+
+class EnergyVadGate:
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20, threshold_ratio: float = 3.0,
+                 min_rms: float = 0.005, zcr_range: tuple = (0.01, 0.45), min_speech_frames: int = 2,
+                 hangover_ms: int = 600, adapt_rate: float = 0.05):
+        """
+        Инициализация энергетического гейта.
+        :param sample_rate: частота дискретизации
+        :param frame_ms: длина кадра анализа в миллисекундах
+        :param threshold_ratio: во сколько раз RMS кадра должен превышать уровень шума
+        :param min_rms: абсолютный минимальный порог RMS (в долях полной шкалы)
+        :param zcr_range: допустимый диапазон доли пересечений нуля для речи
+        :param min_speech_frames: сколько речевых кадров в блоке достаточно для открытия гейта
+        :param hangover_ms: сколько гейт остаётся открытым после последнего речевого кадра
+        :param adapt_rate: скорость адаптации уровня шума (0..1)
+        """
+        self.sample_rate = sample_rate
+        self.frame_length = max(1, int(sample_rate * frame_ms / 1000))
+        self.threshold_ratio = threshold_ratio
+        self.min_rms = min_rms
+        self.zcr_min, self.zcr_max = zcr_range
+        self.min_speech_frames = min_speech_frames
+        self.hangover_samples = int(sample_rate * hangover_ms / 1000)
+        self.adapt_rate = adapt_rate
+        # Начинаем с min_rms, а не с уровня первого блока: если пользователь заговорил сразу,
+        # порог не должен встать на уровень речи. Шум выше min_rms уровень догоняет адаптацией.
+        self.noise_floor = min_rms
+        self.frames_skipped = 0  # Блоки аудио, не дошедшие до декодера
+        self.frames_decoded = 0  # Блоки аудио, переданные декодеру
+        self._position = 0
+        self._open_until = 0
+
+    @staticmethod
+    def _to_float(block: np.ndarray) -> np.ndarray:
+        """Приводит блок int16/float к float32 в диапазоне [-1, 1]."""
+        block = np.asarray(block).reshape(-1)
+        if block.dtype == np.int16:
+            return block.astype(np.float32) / 32768.0
+        return block.astype(np.float32, copy=False)
+
+    def frame_features(self, block: np.ndarray) -> tuple:
+        """
+        Считает признаки кадров блока.
+        :param block: блок аудио (int16 или float)
+        :return: (rms, zcr) — массивы по кадрам
+        """
+        audio = self._to_float(block)
+        n_frames = len(audio) // self.frame_length
+        if n_frames == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+        frames = audio[:n_frames * self.frame_length].reshape(n_frames, self.frame_length)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_length - 1)
+        return rms, zcr
+
+    def process(self, block: np.ndarray) -> bool:
+        """
+        Решает, нужно ли передавать блок декодеру, и обновляет уровень шума.
+        :param block: блок аудио (int16 или float)
+        :return: True, если блок содержит речь или гейт ещё открыт после неё
+        """
+        rms, zcr = self.frame_features(block)
+        self._position += len(np.asarray(block).reshape(-1))
+
+        if rms.size:
+            threshold = max(self.noise_floor * self.threshold_ratio, self.min_rms)
+            speech = (rms > threshold) & (zcr >= self.zcr_min) & (zcr <= self.zcr_max)
+
+            quiet = rms[~speech]
+            if quiet.size:
+                self.noise_floor += self.adapt_rate * (float(quiet.mean()) - self.noise_floor)
+            else:
+                # Непрерывный «речевой» сигнал: медленно поднимаем порог, чтобы стационарный шум не держал гейт
+                self.noise_floor *= 1.0 + self.adapt_rate * 0.1
+
+            if np.count_nonzero(speech) >= self.min_speech_frames:
+                self._open_until = self._position + self.hangover_samples
+
+        is_open = self._position <= self._open_until
+        if is_open:
+            self.frames_decoded += 1
+        else:
+            self.frames_skipped += 1
+        return is_open
+
+    def reset(self):
+        """
+        Сбрасывает состояние гейта. Уровень шума сохраняется: гейт сбрасывают перед каждым
+        прослушиванием, а заново подстраиваться под шум комнаты пришлось бы секунды.
+        """
+        self._position = 0
+        self._open_until = 0
+
+    def stats(self) -> dict:
+        """Возвращает счётчики пропущенных и декодированных блоков."""
+        total = self.frames_skipped + self.frames_decoded
+        return {
+            'frames_skipped': self.frames_skipped,
+            'frames_decoded': self.frames_decoded,
+            'skip_ratio': self.frames_skipped / total if total else 0.0,
+            'noise_floor': self.noise_floor,
+        }
@@ -1,36 +1,119 @@
 """
 Модуль для детекции wake word (ключевого слова) "Карма" для активации голосового ассистента.
 """
-import sounddevice as sd
 import numpy as np
 from src.models.speech_to_text import SpeechToText
-import queue
+from src.utils.voice_activity import EnergyVadGate
+from src.utils.ring_buffer import AudioRingBuffer
+from src.utils.metrics import metrics
+from collections import deque
+import json
+import re
 import threading
+from typing import Optional
 
 WAKE_WORDS = ["карма", "карму", "карме", "кармой", "кармы", "кармой", "кармою"]
 STOP_WORDS = ["стоп", "останови", "отмена", "отменить", "выход"]
+GARBAGE_TOKEN = "[unk]"  # Любое слово вне грамматики keyword spotting
+
+# Режимы детекции
+MODE_STREAMING = "streaming"  # один долгоживущий recognizer, аудио подаётся напрямую из потока
+MODE_KWS = "kws"              # потоковый keyword spotting с ограниченной грамматикой
+MODE_WINDOW = "window"        # прежний режим: окна по 0.8 с через временные WAV-файлы
+MODES = (MODE_STREAMING, MODE_KWS, MODE_WINDOW)
+
+
+def build_kws_grammar() -> list:
+    """
+    Строит грамматику для keyword spotting: wake words, стоп-слова и мусорный токен.
+    Всё, что не похоже на ключевые слова, декодер сводит к "[unk]".
+    """
+    words = list(dict.fromkeys(WAKE_WORDS + STOP_WORDS))
+    return words + [GARBAGE_TOKEN]
+
+
+def load_sounddevice():
+    """Импортирует sounddevice при первом обращении к микрофону."""
+    try:
+        import sounddevice
+    except ImportError:
+        raise ImportError("Требуется установка sounddevice: pip install sounddevice")
+    return sounddevice
 
 class WakeWordDetector:
     def __init__(self, stt_model_path: str = "models/asr/vosk/vosk-model-small-ru-0.22", 
-                 sample_rate: int = 16000, chunk_size: int = 1600):
+                 sample_rate: int = 16000, chunk_size: int = 1600, mode: str = MODE_STREAMING,
+                 use_vad: bool = True, preroll_chunks: int = 3, buffer_duration: float = 4.0,
+                 stt: Optional[SpeechToText] = None, audio=None):
         """
         Инициализация детектора wake word.
         :param stt_model_path: путь к модели Vosk для распознавания
         :param sample_rate: частота дискретизации
         :param chunk_size: размер чанка для обработки
+        :param mode: режим детекции: "streaming" (по умолчанию, открытый словарь),
+                     "kws" (ограниченная грамматика из WAKE_WORDS + STOP_WORDS) или "window"
+        :param use_vad: пропускать к декодеру только блоки с речью (для потоковых режимов)
+        :param preroll_chunks: сколько блоков до открытия VAD-гейта подать в декодер,
+                               чтобы не обрезать начало слова
+        :param buffer_duration: длина кольцевого буфера микрофона в секундах
+        :param stt: готовый экземпляр SpeechToText (например, общий с распознаванием команд)
+        :param audio: источник звука с InputStream в стиле sounddevice (по умолчанию sounddevice;
+                      для прогона записей — src.utils.replay.FakeSoundDevice)
         """
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим детекции: {mode}")
         self.sample_rate = sample_rate
         self.chunk_size = chunk_size
-        self.stt = SpeechToText(backend="vosk", model_path=stt_model_path)
+        self.mode = mode
+        self.stt = stt if stt is not None else SpeechToText(backend="vosk", model_path=stt_model_path)
+        self.audio = audio
         self.is_listening = False
         self.should_stop = False  # Флаг для полной остановки скрипта
-        self.audio_queue = queue.Queue()
+        # Аудио пишется из callback'а прямо в предвыделенный кольцевой буфер:
+        # int16 для потоковых режимов (формат Vosk), float32 для оконного
+        dtype = np.float32 if mode == MODE_WINDOW else np.int16
+        self.ring = AudioRingBuffer(int(sample_rate * buffer_duration), dtype=dtype)
+        self._data_ready = threading.Event()
+        self.overflows = 0  # Сколько раз PortAudio сообщил о переполнении входного буфера
+        self._recognizer = None  # Создаётся один раз и переиспользуется между активациями
+        self._last_text = ''
+        self.vad = EnergyVadGate(sample_rate=sample_rate) if use_vad else None
+        self._preroll = deque(maxlen=preroll_chunks)
+        self._vad_open = False
         
     def _audio_callback(self, indata, frames, time, status):
-        """Callback для записи аудио в очередь."""
+        """Callback для записи аудио в кольцевой буфер (без аллокаций в аудиопотоке)."""
         if status:
+            if status.input_overflow:
+                self.overflows += 1
             print(f"Audio status: {status}")
-        self.audio_queue.put(indata.copy())
+        self.ring.write(indata)
+        self._data_ready.set()
+
+    @staticmethod
+    def _match_keywords(text: str) -> tuple:
+        """
+        Проверяет текст на наличие wake word или стоп-слова.
+        :param text: распознанный текст
+        :return: (wake_word_detected, stop_word_detected)
+        """
+        text = text.lower().replace(GARBAGE_TOKEN, ' ').strip()
+        if not text:
+            return (False, False)
+        
+        # Проверяем наличие wake word (используем регулярные выражения для точного поиска)
+        for wake_word in WAKE_WORDS:
+            # Ищем wake word как отдельное слово или в начале/конце фразы
+            pattern = r'\b' + re.escape(wake_word) + r'\b|^' + re.escape(wake_word) + r'|' + re.escape(wake_word) + r'$'
+            if re.search(pattern, text):
+                return (True, False)
+        
+        # Проверяем наличие стоп-слова
+        for stop_word in STOP_WORDS:
+            if stop_word in text:
+                return (False, True)
+        
+        return (False, False)
     
     def _process_audio_chunk(self, audio_data: np.ndarray) -> tuple:
         """
@@ -50,20 +133,7 @@ class WakeWordDetector:
             
             try:
                 result = self.stt.transcribe(tmp_path)
-                text = result.get('text', '').lower().strip()
-                
-                # Проверяем наличие wake word (используем регулярные выражения для точного поиска)
-                import re
-                for wake_word in WAKE_WORDS:
-                    # Ищем wake word как отдельное слово или в начале/конце фразы
-                    pattern = r'\b' + re.escape(wake_word) + r'\b|^' + re.escape(wake_word) + r'|' + re.escape(wake_word) + r'$'
-                    if re.search(pattern, text):
-                        return (True, False)
-                
-                # Проверяем наличие стоп-слова
-                for stop_word in STOP_WORDS:
-                    if stop_word in text:
-                        return (False, True)
+                return self._match_keywords(result.get('text', ''))
             except Exception as e:
                 pass  # Игнорируем ошибки распознавания для отдельных чанков
             finally:
@@ -82,69 +152,166 @@ class WakeWordDetector:
         """
         print("Слушаю wake word 'Карма'... (скажите 'Стоп' для остановки скрипта, Ctrl+C для выхода)")
         self.is_listening = True
+        # Аудио, оставшееся с прошлого прослушивания, не нужно
+        self.ring.clear()
+        self._data_ready.clear()
+        
+        if self.mode in (MODE_STREAMING, MODE_KWS):
+            return self._listen_streaming(callback)
+        return self._listen_window(callback)
+
+    def _on_detection(self, wake_detected: bool, stop_detected: bool, callback=None):
+        """
+        Реагирует на результат проверки ключевых слов.
+        :return: True — wake word, False — стоп-слово, None — ничего не найдено
+        """
+        if stop_detected:
+            metrics.inc("stop_detections_total")
+            print("\n✓ Стоп-слово обнаружено! Останавливаю скрипт...")
+            self.is_listening = False
+            self.should_stop = True
+            return False
+        
+        if wake_detected:
+            metrics.inc("wake_detections_total")
+            print("✓ Wake word обнаружен! Активирую запись команды...")
+            self.is_listening = False
+            if callback:
+                callback()
+            return True
+        
+        return None
+
+    def _get_recognizer(self):
+        """Возвращает долгоживущий recognizer, сбрасывая его состояние перед новым прослушиванием."""
+        if self._recognizer is None:
+            grammar = build_kws_grammar() if self.mode == MODE_KWS else None
+            self._recognizer = self.stt.create_recognizer(self.sample_rate, grammar=grammar)
+        else:
+            self._recognizer.Reset()
+        self._last_text = ''
+        self._preroll.clear()
+        self._vad_open = False
+        if self.vad is not None:
+            self.vad.reset()
+        return self._recognizer
+
+    def reset_stream(self):
+        """Сбрасывает состояние потокового recognizer (например, между независимыми записями)."""
+        self._get_recognizer()
+
+    def process_stream_block(self, samples: np.ndarray) -> tuple:
+        """
+        Подаёт блок int16 в потоковый recognizer и проверяет гипотезу на ключевые слова.
+        :param samples: блок сэмплов int16 mono (может быть view на кольцевой буфер)
+        :return: (wake_word_detected, stop_word_detected)
+        """
+        rec = self._recognizer if self._recognizer is not None else self._get_recognizer()
+        
+        if self.vad is not None:
+            if not self.vad.process(samples):
+                # Храним только view: буфер перезапишет их не раньше, чем через buffer_duration
+                self._preroll.append(samples)
+                if self._vad_open:
+                    # Речь закончилась — дораспознаём фразу и ждём следующей активности
+                    self._vad_open = False
+                    self._last_text = ''
+                    return self._match_keywords(json.loads(rec.FinalResult()).get('text', ''))
+                return (False, False)
+            if not self._vad_open:
+                # Гейт открылся — подаём накопленное начало фразы вместе с текущим блоком
+                self._vad_open = True
+                samples = np.concatenate(list(self._preroll) + [samples])
+                self._preroll.clear()
+        
+        if rec.AcceptWaveform(samples.tobytes()):
+            # Фраза завершена — частичная гипотеза сбрасывается
+            text = json.loads(rec.Result()).get('text', '')
+        else:
+            text = json.loads(rec.PartialResult()).get('partial', '')
+        
+        # Частичный результат растёт постепенно — проверяем только изменения
+        if text == self._last_text:
+            return (False, False)
+        self._last_text = text
+        return self._match_keywords(text)
+
+    def _listen_streaming(self, callback=None):
+        """
+        Потоковая детекция: блоки int16 из кольцевого буфера подаются в один recognizer,
+        ключевые слова ищутся в частичных результатах. Каждый сэмпл декодируется один раз,
+        без временных файлов. Тишину отсекает VAD-гейт (self.vad), счётчики пропущенных
+        и декодированных блоков доступны через self.vad.stats().
+        """
+        self._get_recognizer()
+        position = self.ring.total_written
+        
+        try:
+            with self._audio().InputStream(samplerate=self.sample_rate, channels=1,
+                                           dtype='int16', callback=self._audio_callback,
+                                           blocksize=self.chunk_size):
+                while self.is_listening:
+                    if not self._data_ready.wait(timeout=0.1):
+                        continue
+                    self._data_ready.clear()
+                    new_samples, position = self.ring.read_since(position)
+                    # Сколько аудио накопилось между итерациями (глубина очереди) и переполнения PortAudio
+                    metrics.set_gauge("wake_audio_queue_samples", len(new_samples))
+                    metrics.set_gauge("audio_overflows", self.overflows)
+                    
+                    for start in range(0, len(new_samples), self.chunk_size):
+                        block = new_samples[start:start + self.chunk_size]
+                        with metrics.span("wake_decode_seconds"):
+                            keywords = self.process_stream_block(block)
+                        detected = self._on_detection(*keywords, callback=callback)
+                        if detected is not None:
+                            self._recognizer.Reset()
+                            return detected
+        except KeyboardInterrupt:
+            print("\nОстановка прослушивания...")
+            self.is_listening = False
+        except Exception as e:
+            print(f"Ошибка при прослушивании: {e}")
+            self.is_listening = False
         
-        audio_buffer = []
-        buffer_duration = 4.0  # секунды для буфера (увеличено для лучшего распознавания)
-        buffer_size = int(self.sample_rate * buffer_duration)
+        return False
+
+    def _listen_window(self, callback=None):
+        """Детекция окнами по 0.8 с с распознаванием через временные WAV-файлы."""
         check_interval = int(self.sample_rate * 0.8)  # Проверяем каждые 0.8 секунды
-        chunks_to_check = check_interval // self.chunk_size
+        check_interval -= check_interval % self.chunk_size
         
         try:
-            with sd.InputStream(samplerate=self.sample_rate, channels=1, 
+            with self._audio().InputStream(samplerate=self.sample_rate, channels=1, 
                               dtype='float32', callback=self._audio_callback,
                               blocksize=self.chunk_size):
-                chunk_count = 0
+                last_check = self.ring.total_written
                 while self.is_listening:
-                    try:
-                        chunk = self.audio_queue.get(timeout=0.1)
-                        audio_buffer.append(chunk.flatten())
-                        chunk_count += 1
+                    if not self._data_ready.wait(timeout=0.1):
+                        continue
+                    self._data_ready.clear()
+                    
+                    # Проверяем каждые 0.8 секунды на наличие wake word или стоп-слова
+                    # Используем последние 2-3 секунды для более точного распознавания
+                    if self.ring.total_written - last_check >= check_interval and self.ring.filled >= check_interval:
+                        last_check = self.ring.total_written
+                        # Берем последние 2-3 секунды для проверки (view без копирования,
+                        # если callback за время распознавания не доберётся до этих сэмплов)
+                        recent_audio = self.ring.latest(check_interval * 3, guard=self.chunk_size)
+                        wake_detected, stop_detected = self._process_audio_chunk(recent_audio)
                         
-                        # Ограничиваем размер буфера
-                        if len(audio_buffer) * self.chunk_size > buffer_size:
-                            audio_buffer.pop(0)
+                        detected = self._on_detection(wake_detected, stop_detected, callback)
+                        if detected is not None:
+                            return detected
                         
-                        # Проверяем каждые 0.8 секунды на наличие wake word или стоп-слова
-                        # Используем последние 2-3 секунды для более точного распознавания
-                        if chunk_count >= chunks_to_check and len(audio_buffer) >= chunks_to_check:
-                            # Берем последние 2-3 секунды для проверки
-                            check_chunks = min(chunks_to_check * 3, len(audio_buffer))
-                            recent_audio = np.concatenate(audio_buffer[-check_chunks:])
-                            wake_detected, stop_detected = self._process_audio_chunk(recent_audio)
-                            chunk_count = 0  # Сбрасываем счетчик
-                            
-                            if stop_detected:
-                                print("\n✓ Стоп-слово обнаружено! Останавливаю скрипт...")
-                                self.is_listening = False
-                                self.should_stop = True
-                                return False
+                        # Дополнительно проверяем весь буфер каждые 2 секунды для надежности
+                        if self.ring.filled >= check_interval * 2:
+                            full_audio = self.ring.latest(self.ring.capacity, guard=self.chunk_size)
+                            wake_detected_full, stop_detected_full = self._process_audio_chunk(full_audio)
                             
-                            if wake_detected:
-                                print("✓ Wake word обнаружен! Активирую запись команды...")
-                                self.is_listening = False
-                                if callback:
-                                    callback()
-                                return True
-                            
-                            # Дополнительно проверяем весь буфер каждые 2 секунды для надежности
-                            if len(audio_buffer) >= chunks_to_check * 2:
-                                full_audio = np.concatenate(audio_buffer)
-                                wake_detected_full, stop_detected_full = self._process_audio_chunk(full_audio)
-                                
-                                if stop_detected_full:
-                                    print("\n✓ Стоп-слово обнаружено! Останавливаю скрипт...")
-                                    self.is_listening = False
-                                    self.should_stop = True
-                                    return False
-                                
-                                if wake_detected_full:
-                                    print("✓ Wake word обнаружен! Активирую запись команды...")
-                                    self.is_listening = False
-                                    if callback:
-                                        callback()
-                                    return True
-                    except queue.Empty:
-                        continue
+                            detected = self._on_detection(wake_detected_full, stop_detected_full, callback)
+                            if detected is not None:
+                                return detected
         except KeyboardInterrupt:
             print("\nОстановка прослушивания...")
             self.is_listening = False
@@ -154,6 +321,11 @@ class WakeWordDetector:
         
         return False
     
+    def _audio(self):
+        if self.audio is None:
+            self.audio = load_sounddevice()
+        return self.audio
+
     def stop(self):
         """Останавливает прослушивание."""
         self.is_listening = False
@@ -0,0 +1,224 @@
+"""
+Тесты для асинхронного контроллера: wake word → команда → Serial на эмуляторе прошивки.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import asyncio
+import json
+import numpy as np
+import pytest
+from src.utils import async_controller, serial_link
+from src.utils.async_controller import AsyncSerialDevice, AsyncVoiceController, load_device_tables
+from src.utils.replay import FakeSoundDevice, FirmwareEmulator, LoopbackSerial, LoopbackStreamWriter, \
+    open_loopback_connection
+
+
+class PhraseRecognizer:
+    """Распознаватель, который выдаёт заданную фразу после заданного числа байт."""
+    def __init__(self, text: str, final_after: int):
+        self.text = text
+        self.final_after = final_after
+        self.received = 0
+
+    def AcceptWaveform(self, data):
+        self.received += len(data)
+        return self.received >= self.final_after
+
+    def Result(self):
+        return json.dumps({"text": self.text})
+
+    def PartialResult(self):
+        return json.dumps({"partial": ""})
+
+    def FinalResult(self):
+        return json.dumps({"text": ""})
+
+    def Reset(self):
+        self.received = 0
+
+
+class PhraseStt:
+    def create_recognizer(self, sample_rate, grammar=None, words=False):
+        # Recognizer команды создаётся с words=True, recognizer wake word — без
+        if words:
+            return PhraseRecognizer("включи свет", final_after=sample_rate)
+        return PhraseRecognizer("карма", final_after=sample_rate)
+
+
+def test_controller_sends_command_and_stops_cleanly():
+    connections = []
+
+    async def connect(port, baudrate):
+        reader, writer = await open_loopback_connection(port, baudrate)
+        connections.append(writer)
+        return reader, writer
+
+    async def scenario():
+        device = AsyncSerialDevice("loop://", name="arduino", connect=connect)
+        audio = FakeSoundDevice(np.zeros(16000 * 3, dtype=np.int16), speed=0)
+        controller = AsyncVoiceController([device], PhraseStt(), use_vad=False, audio=audio)
+        run = asyncio.create_task(controller.run())
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if device.last_line and device.last_line.startswith(("OK", "ERROR")):
+                break
+        controller.stop()
+        await asyncio.wait_for(run, timeout=5)
+        return controller, device
+
+    controller, device = asyncio.run(scenario())
+    assert controller.commands[0] == "включи свет"
+    # На прошивку уходит кадр команды, а не распознанный текст
+    assert set(connections[0].sent) == {"SET:light:4:1"}
+    assert device.last_line == "OK: Light ON"
+    assert connections[0].is_closing()
+
+
+def test_disconnected_device_does_not_stop_controller():
+    attempts = {"flaky": 0}
+    connections = {}
+
+    async def connect(port, baudrate):
+        reader, writer = await open_loopback_connection(port, baudrate)
+        if port == "flaky":
+            attempts["flaky"] += 1
+            if attempts["flaky"] == 1:
+                reader.feed_eof()  # Первое подключение сразу обрывается
+        connections[port] = writer
+        return reader, writer
+
+    async def scenario():
+        stable = AsyncSerialDevice("stable", connect=connect)
+        flaky = AsyncSerialDevice("flaky", connect=connect)
+        audio = FakeSoundDevice(np.zeros(16000 * 3, dtype=np.int16), speed=0)
+        controller = AsyncVoiceController([stable, flaky], PhraseStt(), use_vad=False, audio=audio,
+                                          reconnect_delay=0.01)
+        run = asyncio.create_task(controller.run())
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if stable.last_line == "OK: Light ON" and attempts["flaky"] >= 2:
+                break
+        assert not run.done()  # Обрыв связи с одним устройством не останавливает контроллер
+        assert flaky.connected
+        controller.stop()
+        await asyncio.wait_for(run, timeout=5)
+        return stable
+
+    stable = asyncio.run(scenario())
+    assert stable.last_line == "OK: Light ON"
+    assert attempts["flaky"] == 2
+    assert all(writer.is_closing() for writer in connections.values())
+
+
+def test_failed_open_closes_opened_devices():
+    writers = []
+
+    async def connect(port, baudrate):
+        if port == "missing":
+            raise ConnectionError("Arduino не найден")
+        reader, writer = await open_loopback_connection(port, baudrate)
+        writers.append(writer)
+        return reader, writer
+
+    async def scenario():
+        devices = [AsyncSerialDevice("loop://", connect=connect), AsyncSerialDevice("missing", connect=connect)]
+        controller = AsyncVoiceController(devices, PhraseStt(), use_vad=False,
+                                          audio=FakeSoundDevice(np.zeros(1600, dtype=np.int16), speed=0))
+        with pytest.raises(ConnectionError):
+            await controller.run()
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert writers and writers[0].is_closing()
+    assert controller._executor._shutdown
+
+
+def test_commands_are_routed_to_the_device_that_owns_them(tmp_path):
+    writers = {}
+    path = tmp_path / "devices.json"
+    path.write_text(json.dumps({
+        "kitchen": {"свет": {"type": "light", "pin": 4, "rooms": ["кухня"]},
+                    "окно": {"type": "servo", "pin": 12, "max_value": 180}},
+        "bedroom": {"свет": {"type": "light", "pin": 7, "rooms": ["спальня"]},
+                    "вентилятор": {"type": "fan", "pin": 13}},
+    }, ensure_ascii=False), encoding="utf-8")
+    tables = load_device_tables(str(path))
+
+    async def connect(port, baudrate):
+        reader, writer = await open_loopback_connection(port, baudrate)
+        writers[port] = writer
+        return reader, writer
+
+    async def scenario():
+        kitchen = AsyncSerialDevice("kitchen", connect=connect, devices=tables["kitchen"])
+        bedroom = AsyncSerialDevice("bedroom", connect=connect, devices=tables["bedroom"])
+        controller = AsyncVoiceController([kitchen, bedroom], PhraseStt(), use_vad=False)
+        for device in (kitchen, bedroom):
+            await device.open()
+        readers = [asyncio.create_task(device.read_loop()) for device in (kitchen, bedroom)]
+        routed, rejected = controller.route(controller.parser.parse(
+            "включи свет на кухне и включи свет в спальне, затем включи вентилятор и включи обогреватель"))
+        frames, futures = controller.send_routed(routed)
+        await asyncio.wait_for(asyncio.gather(*futures), timeout=5)
+        for device in (kitchen, bedroom):
+            await device.close()
+        await asyncio.gather(*readers)
+        return frames, rejected
+
+    frames, rejected = asyncio.run(scenario())
+    assert writers["kitchen"].sent == ["SET:light:4:1"]
+    assert writers["bedroom"].sent == ["SET:light:7:1", "SET:fan:13:1"]
+    assert frames == ["SET:light:4:1", "SET:light:7:1", "SET:fan:13:1"]
+    # Обогреватель не подключён ни к одной плате: кадр не отправляется никому
+    assert [task.object for task, _ in rejected] == ["обогреватель"]
+
+class ResettingSerialModule:
+    """Вместо pyserial: каждое открытие порта перезагружает эмулятор прошивки на BASE_BAUDRATE."""
+    SerialException = OSError
+
+    def __init__(self):
+        self.opened = []
+
+    def Serial(self, port, baudrate, timeout=1.0):
+        ser = LoopbackSerial(FirmwareEmulator(), baudrate=baudrate, timeout=0.02, simulate_wire=False)
+        ser.port = port
+        self.opened.append(ser)
+        return ser
+
+
+def test_negotiated_device_renegotiates_after_reconnect(monkeypatch):
+    serial_module = ResettingSerialModule()
+    readers = []
+
+    async def open_connection(ser):
+        reader = asyncio.StreamReader()
+        readers.append(reader)
+        return reader, LoopbackStreamWriter(reader, ser.firmware)
+
+    monkeypatch.setattr(serial_link, "_serial_module", lambda: serial_module)
+    monkeypatch.setattr(serial_link, "RESET_DELAY", 0)
+    monkeypatch.setattr(async_controller, "open_serial_connection", open_connection)
+
+    async def scenario():
+        device = AsyncSerialDevice("/dev/ttyACM0")
+        await device.open()
+        negotiated = device.baudrate
+        serve = asyncio.create_task(device.serve(reconnect_delay=0.01))
+        readers[0].feed_eof()  # Кабель переподключили: Arduino перезагрузился
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if len(readers) == 2 and device.connected:
+                break
+        reply = await asyncio.wait_for(device.send("SET:light:4:1"), timeout=2)
+        serve.cancel()
+        await asyncio.gather(serve, return_exceptions=True)
+        await device.close()
+        return device, negotiated, reply
+
+    device, negotiated, reply = asyncio.run(scenario())
+    assert negotiated > serial_link.BASE_BAUDRATE
+    assert device.requested_baudrate is None
+    # Второе открытие снова начинается с базовой скорости и согласует её заново
+    assert [ser.firmware.baudrate for ser in serial_module.opened] == [negotiated, negotiated]
+    assert device.baudrate == negotiated and reply.ok
@@ -0,0 +1,58 @@
+"""
+Тесты для пакетного распознавания с возобновлением.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import json
+import wave
+from src.predict.batch_transcribe import batch_transcribe, collect_files, load_done
+
+
+def _write_wav(path, seconds=0.5, sample_rate=16000):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+
+
+def test_batch_is_resumable(tmp_path):
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    for i in range(3):
+        _write_wav(audio_dir / f"cmd_{i}.wav")
+    output = tmp_path / "out.jsonl"
+    # Имитируем прерванный прогон: одна готовая запись и оборванная строка
+    first = os.path.abspath(str(audio_dir / "cmd_0.wav"))
+    output.write_text(json.dumps({"path": first, "text": ""}) + "\n{\"path\": \"cm", encoding="utf-8")
+
+    assert len(collect_files([str(audio_dir)])) == 3
+    summary = batch_transcribe([str(audio_dir)], str(output), backend="stub", workers=2)
+    assert summary["skipped"] == 1
+    assert summary["ok"] == 2
+
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()
+               if line.startswith("{") and line.endswith("}")]
+    assert len(records) == 3
+    assert all(r["duration"] == 0.5 for r in records[1:])
+    assert len(load_done(str(output))) == 3
+    assert batch_transcribe([str(audio_dir)], str(output), backend="stub")["skipped"] == 3
+
+
+def test_resume_matches_relative_paths_and_keeps_one_record_per_file(tmp_path, monkeypatch):
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    _write_wav(audio_dir / "good.wav")
+    (audio_dir / "broken.wav").write_bytes(b"not a wav")
+    output = tmp_path / "out.jsonl"
+
+    monkeypatch.chdir(tmp_path)
+    summary = batch_transcribe(["audio"], str(output), backend="stub", workers=1)
+    assert summary["ok"] == 1 and summary["errors"] == 1
+
+    # Тот же каталог по абсолютному пути: готовый файл пропускается, битый пробуется снова
+    summary = batch_transcribe([str(audio_dir)], str(output), backend="stub", workers=1)
+    assert summary["skipped"] == 1 and summary["errors"] == 1
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert sorted(os.path.basename(r["path"]) for r in records) == ["broken.wav", "good.wav"]
@@ -0,0 +1,135 @@
+"""
+Тесты для потоковой записи команды: причины окончания и аудио команды (без модели Vosk).
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import json
+import numpy as np
+from src.utils.command_capture import (END_CANCEL, END_COMPLETE, END_FINAL, END_PAUSE, END_TIMEOUT,
+                                       StreamingCommandCapture)
+
+SAMPLE_RATE = 16000
+BLOCK = 1600
+
+
+class StepRecognizer:
+    """Распознаватель по сценарию: на каждый блок — финальный текст или частичный."""
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.calls = 0
+        self._final = None
+        self._partial = ""
+
+    def AcceptWaveform(self, data):
+        step = self.steps[self.calls] if self.calls < len(self.steps) else ("partial", self._partial)
+        self.calls += 1
+        kind, text = step
+        if kind == "final":
+            self._final = text
+            self._partial = ""  # Как Vosk: после финального результата частичный текст пуст
+            return True
+        self._partial = text
+        return False
+
+    def Result(self):
+        return json.dumps({"text": self._final})
+
+    def PartialResult(self):
+        return json.dumps({"partial": self._partial})
+
+    def FinalResult(self):
+        return json.dumps({"text": self._partial})
+
+    def Reset(self):
+        self.calls = 0
+        self._final = None
+        self._partial = ""
+
+
+class StepStt:
+    def __init__(self, steps=()):
+        self.steps = steps
+
+    def create_recognizer(self, sample_rate, grammar=None, words=False):
+        return StepRecognizer(self.steps)
+
+
+def _silence(n_blocks: int) -> list:
+    return [np.zeros(BLOCK, dtype=np.int16) for _ in range(n_blocks)]
+
+
+def _voiced(n_blocks: int, start: int = 0) -> list:
+    t = (start + np.arange(BLOCK * n_blocks)) / SAMPLE_RATE
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + 0.5 * np.sin(2 * np.pi * 4 * t))
+    return list(np.int16(signal * 32767 / 1.5).reshape(n_blocks, BLOCK))
+
+
+def _run(capture: StreamingCommandCapture, blocks: list):
+    """Подаёт блоки до окончания записи; возвращает (причина, число поданных блоков)."""
+    capture.start()
+    for i, block in enumerate(blocks, 1):
+        reason = capture.feed(block)
+        if reason is not None:
+            capture.end_reason = reason
+            return reason, i
+    return None, len(blocks)
+
+
+def test_final_result_ends_capture():
+    capture = StreamingCommandCapture(StepStt([("partial", "включи"), ("final", "включи свет")]))
+    assert _run(capture, _voiced(10)) == (END_FINAL, 2)
+    result = capture.finish()
+    assert result["text"] == "включи свет" and result["end_reason"] == END_FINAL
+    assert result["duration"] == 2 * BLOCK / SAMPLE_RATE
+
+
+def test_stable_complete_partial_ends_capture():
+    capture = StreamingCommandCapture(StepStt([("partial", "включи"), ("partial", "включи свет")]),
+                                      stable_time=0.3)
+    # Полная команда должна не меняться stable_time: блок, где она появилась, и ещё три
+    assert _run(capture, _voiced(20)) == (END_COMPLETE, 5)
+    assert capture.finish()["text"] == "включи свет"
+
+
+def test_incomplete_partial_waits_for_pause():
+    # "поставь температуру" без значения — не полная команда, запись ждёт паузы
+    capture = StreamingCommandCapture(StepStt([("partial", "поставь температуру")]), pause_threshold=0.2)
+    reason, fed = _run(capture, _voiced(5) + _silence(20))
+    assert reason == END_PAUSE and 5 < fed < 25
+
+
+def test_timeouts():
+    capture = StreamingCommandCapture(StepStt(), start_timeout=0.5)
+    assert _run(capture, _silence(20)) == (END_TIMEOUT, 5)  # речь так и не началась
+
+    capture = StreamingCommandCapture(StepStt(), max_duration=1.0, pause_threshold=5.0)
+    assert _run(capture, _voiced(20)) == (END_TIMEOUT, 10)  # речь дольше max_duration
+
+
+def test_cancel_word_ends_capture_but_command_with_it_does_not():
+    capture = StreamingCommandCapture(StepStt([("partial", "отмена")]))
+    assert _run(capture, _voiced(5)) == (END_CANCEL, 1)
+
+    capture = StreamingCommandCapture(StepStt([("partial", "останови музыку")]), stable_time=0.1)
+    assert _run(capture, _voiced(10))[0] == END_COMPLETE
+
+
+def test_command_audio_is_exactly_the_fed_samples():
+    capture = StreamingCommandCapture(StepStt([("partial", "")] * 3 + [("final", "включи свет")]),
+                                      max_duration=1.0)
+    for command in range(2):
+        capture.start()
+        blocks = _voiced(6, start=command * 100)
+        fed = []
+        for block in blocks:
+            capture._audio_callback(block.reshape(-1, 1), BLOCK, None, None)
+            if capture.end_reason is None:
+                fed.append(block)
+                capture.end_reason = capture.feed(block)
+        # Блоки, дописанные callback'ом после окончания команды, в аудио команды не попадают
+        assert capture.end_reason == END_FINAL and len(fed) == 4
+        audio = capture.command_audio()
+        assert np.array_equal(audio, np.concatenate(fed))
+        capture._audio_callback(np.ones((BLOCK, 1), dtype=np.int16), BLOCK, None, None)
+        assert np.array_equal(audio, np.concatenate(fed))  # копия, а не view на буфер
@@ -0,0 +1,120 @@
+"""
+Тесты для канала команд: сопоставление ответов, окно, потери, таймауты.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import asyncio
+import pytest
+from src.utils.async_controller import AsyncSerialDevice
+from src.utils.command_channel import CommandChannel
+from src.utils.command_compiler import CompiledBatch
+from src.utils.replay import FirmwareEmulator, open_loopback_connection
+
+
+class Wire:
+    """Запись в порт, которую тест доставляет эмулятору вручную."""
+    def __init__(self):
+        self.written = []
+
+    def __call__(self, payload):
+        self.written.append(payload)
+
+    def frames(self):
+        return b"".join(self.written).decode().split()
+
+
+def deliver(channel, firmware, frames):
+    for frame in frames:
+        for line in firmware.handle(frame):
+            channel.feed_line(line)
+
+
+def test_replies_resolve_matching_futures():
+    wire, firmware = Wire(), FirmwareEmulator()
+    channel = CommandChannel(wire)
+    futures = channel.submit_many(["SET:light:4:1", "SET:servo:5:90", "PING"])
+    assert len(wire.written) == 1  # Все кадры ушли одной записью
+    deliver(channel, firmware, wire.frames())
+    results = [future.result(timeout=1) for future in futures]
+    assert [r.reply for r in results] == ["OK: Light ON", "ERROR: Invalid servo pin", "PONG"]
+    assert [r.ok for r in results] == [True, False, True]
+    assert all(r.latency >= 0 and r.attempts == 1 for r in results)
+    assert channel.pending == 0
+    channel.close()
+
+
+def test_in_flight_window_and_receive_buffer_are_bounded():
+    wire = Wire()
+    channel = CommandChannel(wire, max_in_flight=2)
+    futures = channel.submit_many(["SET:light:4:1", "SET:fan:13:1", "SET:heating:8:0"])
+    assert wire.frames() == ["SET:light:4:1", "SET:fan:13:1"]
+    channel.feed_line("Received: SET:light:4:1")
+    channel.feed_line("OK: Light ON")
+    assert futures[0].result(timeout=1).ok
+    assert wire.frames()[-1] == "SET:heating:8:0"
+    channel.close()
+    assert futures[2].cancelled()
+
+    wire = Wire()
+    channel = CommandChannel(wire, rx_buffer=20)
+    channel.submit_many(["SET:light:4:1", "SET:fan:13:1"])
+    assert wire.frames() == ["SET:light:4:1"]
+    channel.feed_line("Received: SET:light:4:1")  # Прошивка прочитала кадр — буфер освободился
+    assert wire.frames() == ["SET:light:4:1", "SET:fan:13:1"]
+    channel.close()
+
+
+def test_lost_command_is_resent():
+    wire, firmware = Wire(), FirmwareEmulator()
+    channel = CommandChannel(wire)
+    futures = channel.submit_many(["SET:light:4:1", "SET:fan:13:1"])
+    # Первый кадр не дошёл до прошивки: эхо приходит сразу для второго
+    deliver(channel, firmware, ["SET:fan:13:1"])
+    assert futures[1].result(timeout=1).reply == "OK: Fan ON"
+    assert wire.frames()[-1] == "SET:light:4:1"
+    deliver(channel, firmware, ["SET:light:4:1"])
+    assert futures[0].result(timeout=1).attempts == 2
+    assert channel.lost == 1 and channel.resent == 1
+    channel.close()
+
+
+def test_lost_command_is_not_resent_after_newer_one_for_same_device():
+    wire, firmware = Wire(), FirmwareEmulator()
+    channel = CommandChannel(wire)
+    futures = channel.submit_many(["SET:light:4:1", "SET:light:4:0"])
+    # "Включить" потерялся, "выключить" выполнен: повтор включил бы свет снова
+    deliver(channel, firmware, ["SET:light:4:0"])
+    assert futures[1].result(timeout=1).reply == "OK: Light OFF"
+    assert futures[0].cancelled()
+    assert wire.frames() == ["SET:light:4:1", "SET:light:4:0"]
+    assert firmware.state["light"] == 0
+    assert channel.lost == 1 and channel.resent == 0 and channel.superseded == 1
+    assert channel.pending == 0
+    channel.close()
+
+
+def test_unanswered_command_times_out():
+    wire = Wire()
+    channel = CommandChannel(wire, timeout=0.05, retries=1)
+    future = channel.submit("SET:light:4:1")
+    with pytest.raises(TimeoutError):
+        future.result(timeout=2)
+    assert wire.frames() == ["SET:light:4:1", "SET:light:4:1"]
+    assert channel.timeouts == 2
+    channel.close()
+
+
+def test_async_device_pipelines_a_scene():
+    async def scenario():
+        device = AsyncSerialDevice("loop://", connect=open_loopback_connection)
+        await device.open()
+        reader = asyncio.create_task(device.read_loop())
+        batch = CompiledBatch(frames=["SET:light:4:1", "SET:servo:12:90", "SET:fan:13:0"])
+        results = await asyncio.wait_for(asyncio.gather(*device.send_batch(batch)), timeout=5)
+        await device.close()
+        await reader
+        return results
+
+    results = asyncio.run(scenario())
+    assert [r.reply for r in results] == ["OK: Light ON", "OK: Window angle set to 90", "OK: Fan OFF"]
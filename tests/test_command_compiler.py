@@ -0,0 +1,74 @@
+"""
+Тесты для перевода разобранных команд в кадры прошивки.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import pytest
+from src.utils.command_compiler import CommandCompiler, Device, direct_task
+from src.utils.command_parser import parse_command
+from src.utils.replay import FirmwareEmulator
+
+
+def compile_text(text, compiler=None):
+    return (compiler or CommandCompiler()).compile(parse_command(text))
+
+
+def test_multi_segment_command_is_one_write():
+    batch = compile_text("включи свет в гостиной и открой окно на 50 процентов")
+    assert batch.frames == ["SET:light:4:1", "SET:servo:12:90"]
+    assert batch.payloads() == [b"SET:light:4:1\nSET:servo:12:90\n"]
+    assert not batch.rejected
+
+
+def test_values_and_switches():
+    assert compile_text("поставь температуру двадцать два градуса").frames == ["SET:target_temp:22"]
+    assert compile_text("закрой окно").frames == ["SET:servo:12:0"]
+    assert compile_text("открой окно для всей семью").frames == ["SET:servo:12:180"]
+    assert compile_text("выключи вентилятор и включи сигнализацию").frames == ["SET:fan:13:0", "SET:alarm:11:1"]
+
+
+def test_not_actionable_tasks_are_rejected():
+    batch = compile_text("включи телевизор и поставь температуру на сто градусов")
+    assert not batch
+    assert [task.object for task, _ in batch.rejected] == ["телевизор", "температура"]
+    assert not compile_text("увеличь температуру")
+    assert not compile_text("включи температуру")
+
+
+def test_last_command_for_device_wins():
+    assert compile_text("включи свет и выключи свет").frames == ["SET:light:4:0"]
+
+
+def test_room_restricted_device():
+    compiler = CommandCompiler({"свет": Device("light", 4, rooms=frozenset({"кухня"}))})
+    assert compile_text("включи свет на кухне", compiler).frames == ["SET:light:4:1"]
+    assert not compile_text("включи свет в спальне", compiler)
+
+
+def test_payloads_fit_receive_buffer():
+    batch = compile_text("включи свет и открой окно и включи обогреватель и включи вентилятор "
+                         "и включи сигнализацию")
+    payloads = batch.payloads(limit=64)
+    assert len(batch.frames) == 5 and len(payloads) == 2
+    assert all(len(payload) <= 64 for payload in payloads)
+    assert b"".join(payloads).decode().split() == batch.frames
+
+
+def test_validate_frame_and_direct_commands():
+    compiler = CommandCompiler()
+    assert compiler.validate_frame(" SET:servo:12:45 ") == "SET:servo:12:45"
+    assert compiler.validate_frame("SET:target_temp:21.5") == "SET:target_temp:21.5"
+    for frame in ("SET:servo:5:45", "SET:light:4:2", "SET:tv:1:1", "LIGHT_ON", "SET:target_temp:4:20"):
+        with pytest.raises(ValueError):
+            compiler.validate_frame(frame)
+    assert compiler.compile_task(direct_task("window_open")) == "SET:servo:12:180"
+    assert direct_task("status") is None
+
+
+def test_compiled_frames_are_accepted_by_firmware():
+    firmware = FirmwareEmulator()
+    batch = compile_text("включи обогреватель и поставь температуру 24 градуса и открой окно")
+    replies = [firmware.handle(frame)[-1] for frame in batch.frames]
+    assert all(reply.startswith("OK") for reply in replies)
+    assert firmware.state["target_temperature"] == 24
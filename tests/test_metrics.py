@@ -0,0 +1,51 @@
+"""
+Тесты для замеров по этапам: спаны, счётчики, гистограммы и выгрузка.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import json
+import urllib.request
+from src.utils.metrics import MetricsRegistry
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    with registry.span("nlu_parse_seconds"):
+        pass
+    registry.inc("wake_detections_total")
+    registry.set_gauge("wake_audio_queue_samples", 10)
+    snapshot = registry.snapshot()
+    assert snapshot["counters"] == {} and snapshot["gauges"] == {} and snapshot["histograms"] == {}
+
+
+def test_spans_counters_and_histograms():
+    registry = MetricsRegistry(enabled=True, buckets=(0.01, 0.1))
+    with registry.span("stage_seconds"):
+        pass
+    registry.observe("stage_seconds", 0.05)
+    registry.observe("stage_seconds", 5.0)
+    registry.inc("commands_total", 2)
+    histogram = registry.snapshot()["histograms"]["stage_seconds"]
+    assert histogram["count"] == 3 and histogram["max"] == 5.0
+    assert registry.histograms["stage_seconds"].counts == [1, 1, 1]
+    text = registry.to_prometheus()
+    assert 'altair_stage_seconds_bucket{le="0.1"} 2' in text
+    assert 'altair_stage_seconds_bucket{le="+Inf"} 3' in text
+    assert "altair_commands_total 2" in text
+
+
+def test_exports_jsonl_and_prometheus(tmp_path):
+    registry = MetricsRegistry(enabled=True)
+    registry.inc("serial_commands_total")
+    path = tmp_path / "metrics.jsonl"
+    registry.write_jsonl(str(path))
+    assert json.loads(path.read_text(encoding="utf-8"))["counters"] == {"serial_commands_total": 1}
+
+    server = registry.serve_prometheus(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode("utf-8")
+    finally:
+        registry.stop_prometheus()
+    assert "altair_serial_commands_total 1" in body
@@ -0,0 +1,74 @@
+"""
+Тесты для реестра моделей распознавания речи.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import threading
+from src.models import model_registry
+from src.models.model_registry import ModelRegistry
+
+
+def _fake_loader(path):
+    return {"path": path}
+
+
+def test_model_is_loaded_once_and_lru_evicted(monkeypatch):
+    monkeypatch.setitem(model_registry.LOADERS, "fake", _fake_loader)
+    registry = ModelRegistry(max_models=2)
+
+    first = registry.get("fake", "ru-small")
+    assert registry.get("fake", "ru-small") is first
+    assert (registry.loads, registry.hits) == (1, 1)
+
+    registry.warm_up([("fake", "en-small"), ("fake", "ru-small")])
+    registry.get("fake", "ru-big")  # вытесняет давно не использованную en-small
+    assert ("fake", "en-small") not in registry
+    assert ("fake", "ru-small") in registry
+    assert registry.evictions == 1
+    assert len(registry) == 2
+
+
+def test_unknown_backend_is_rejected():
+    registry = ModelRegistry()
+    try:
+        registry.get("unknown", "path")
+    except NotImplementedError:
+        pass
+    else:
+        raise AssertionError("ожидалось NotImplementedError")
+
+
+def test_equivalent_paths_share_one_model(monkeypatch):
+    monkeypatch.setitem(model_registry.LOADERS, "fake", _fake_loader)
+    registry = ModelRegistry()
+    first = registry.get("fake", "models/ru-small")
+    assert registry.get("fake", "./models/ru-small/") is first
+    assert registry.loads == 1
+    assert ("fake", "models//ru-small") in registry
+
+
+def test_slow_load_does_not_block_other_models(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_loader(path):
+        if path == "slow":
+            started.set()
+            release.wait(timeout=5)
+        return {"path": path}
+
+    monkeypatch.setitem(model_registry.LOADERS, "fake", slow_loader)
+    registry = ModelRegistry(max_models=3)
+    registry.get("fake", "fast")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("fake", "slow"))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(timeout=5)
+    # Пока "slow" читается с диска, загруженная модель отдаётся без ожидания
+    assert registry.get("fake", "fast")["path"] == "fast"
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert len(results) == 2 and results[0] is results[1]
+    assert registry.loads == 2
@@ -0,0 +1,40 @@
+"""
+Тесты для индекса лемм и поиска падежных форм устройств и комнат.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import numpy as np
+from src.utils.morphology import LemmaIndex, Lemmatizer, noun_forms
+from src.utils.task_extractor import extract_object
+from src.utils.location_extractor import extract_room
+
+
+def test_noun_forms_cover_instrumental_case():
+    assert "окном" in noun_forms("окно")
+    assert "телевизором" in noun_forms("телевизор")
+    assert "шторами" in noun_forms("шторы")
+    assert "гостиной" in noun_forms("гостиная")
+    assert noun_forms("радио") == []
+
+
+def test_index_roundtrip_is_memory_mapped(tmp_path):
+    index = LemmaIndex.build([("стали", "сталь"), ("стали", "стать"), ("светом", "свет")])
+    index.save(str(tmp_path))
+    loaded = LemmaIndex.load(str(tmp_path))
+    assert isinstance(loaded.keys, np.memmap)
+    assert loaded.lookup("стали") == "сталь"  # при омонимии остаётся первая лемма
+    assert loaded.lookup("Светом") == "свет"
+    assert loaded.lookup("пылесос") is None
+
+    assert Lemmatizer([loaded])("светом") == "свет"
+
+
+def test_extractors_match_lemmas():
+    assert extract_object("управляй светом") == "свет"
+    assert extract_object("что со шторами") == "шторы"
+    assert extract_object("займись телевизором") == "телевизор"
+    assert extract_object("за окном") == "окно"
+    assert extract_room("в лоджиях") == "лоджия"
+    # Точное совпадение по-прежнему имеет приоритет над леммой
+    assert extract_object("выключи звук") == "громкость"
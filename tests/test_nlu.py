@@ -0,0 +1,163 @@
+"""
+Тесты для извлечения действий, объектов и комнат из текстовых команд.
+"""
+import sys
+import os
+import json
+from dataclasses import replace
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.utils.phrase_matcher import PhraseMatcher
+from src.utils.task_extractor import extract_action, extract_object, extract_task, extract_value
+from src.utils.numerals import parse_numbers
+from src.utils.tokenizer import tokenize
+from src.utils.location_extractor import extract_room, resolve_location_reference
+from src.utils.text_segments import CommandSegmenter, segment_command
+from src.utils.command_parser import DEFAULT_CACHE_SIZE, CommandParser, parse_command
+from src.utils.vocabulary import VocabularyStore
+
+
+def test_matcher_returns_all_hits_with_spans():
+    matcher = PhraseMatcher()
+    matcher.add_dictionary("action", {"найди": ["найди", "найди мне"]})
+    matcher.add_dictionary("object", {"свет": ["свет", "лампу"]})
+    hits = matcher.find_all("Найди мне лампу")
+    assert [(m.category, m.canonical, m.phrase) for m in hits] == [
+        ("action", "найди", "найди мне"),
+        ("object", "свет", "лампу"),
+    ]
+    assert (hits[1].start, hits[1].end) == (10, 15)
+    assert (hits[1].token_start, hits[1].token_end) == (2, 3)
+
+
+def test_action_is_matched_by_whole_word():
+    # "включи" — подстрока "выключи", но это разные действия
+    assert extract_action("Выключи свет") == "выключи"
+    assert extract_action("включи свет") == "включи"
+    assert extract_action("сделай что-нибудь") is None
+
+
+def test_object_and_room_case_forms():
+    assert extract_object("открой шторы") == "шторы"
+    assert extract_object("убавь звук") == "громкость"
+    assert extract_room("включи свет в гостиной") == "гостиная"
+    assert extract_room("включи свет на кухне") == "кухня"
+
+
+def test_room_is_not_found_inside_other_words():
+    assert extract_room("поставь музыку про зальцбург") is None
+    assert extract_room("включи свет в зале") == "зал"
+
+
+def test_location_reference_is_inherited():
+    resolved = resolve_location_reference(["включи свет в спальне и там же", "открой окно"])
+    assert [r['room'] for r in resolved] == ["спальня", "спальня"]
+
+
+def test_extract_task():
+    task = extract_task("поставь температуру 22 градуса")
+    assert (task['action'], task['object'], task['value']) == ("поставь", "температура", "22 градусов")
+
+
+def test_segment_command_splits_on_verbs_and_drops_connectors():
+    text = "включи свет и открой шторы, затем выключи телевизор и поставь температуру 22"
+    assert segment_command(text) == ['включи свет', 'открой шторы', 'выключи телевизор', 'поставь температуру 22']
+    # Окончание "-и" у слова — не союз "и"
+    assert segment_command("включи свет в спальни и") == ['включи свет в спальни']
+
+
+def test_segmenter_returns_spans_in_original_text():
+    text = "Включи свет и выключи телевизор."
+    segments = CommandSegmenter().segment(text)
+    assert [s.text for s in segments] == ['Включи свет', 'выключи телевизор']
+    assert text[segments[1].start:segments[1].end] == 'выключи телевизор'
+
+
+def test_segmenter_from_actions_uses_synonyms():
+    segmenter = CommandSegmenter.from_actions({"включи": ["активируй"], "найди": ["найди мне"]})
+    assert [s.text for s in segmenter.segment("активируй свет найди мне музыку")] == [
+        'активируй свет', 'найди мне музыку']
+
+
+def test_numeral_parser_handles_composites_cases_and_ordinals():
+    numbers = parse_numbers(tokenize("двести тридцать пять и двадцати двух градусов, пятый"))
+    assert [(n.value, n.unit, n.ordinal) for n in numbers] == [
+        (235, None, False), (22, "градус", False), (5, None, True)]
+    assert (numbers[1].token_start, numbers[1].token_end) == (4, 7)
+    assert [n.value for n in parse_numbers(tokenize("две тысячи триста"))] == [2300]
+    assert [n.value for n in parse_numbers(tokenize("десять пять"))] == [10, 5]
+
+
+def test_ambiguous_numeral_forms_need_context():
+    def values(text):
+        return [(n.value, n.unit) for n in parse_numbers(tokenize(text))]
+
+    assert values("включи свет всей семью") == []
+    assert values("сорока сидит на окне") == []
+    assert values("поставь температуру на семью") == [(7, None)]
+    assert values("открой окно до сорока") == [(40, None)]
+    assert values("семью градусами и сорока двух процентов") == [(7, "градус"), (42, "процент")]
+    assert parse_command("включи свет всей семью")[0].value is None
+
+
+def test_extract_value_units_and_context():
+    assert extract_value("поставь температуру двадцать два градуса") == "22 градусов"
+    assert extract_value("поставь громкость на тридцать") == "30%"
+    assert extract_value("поставь 22,5 градуса") == "22.5 градусов"
+    assert extract_value("включи музыку на полную") == "максимум"
+    assert extract_value("прибавь громкость") is None
+
+
+def test_command_parser_matches_legacy_pipeline():
+    text = "Включи свет в гостиной и там же закрой шторы, затем выключи телевизор и поставь температуру 22 градуса"
+    tasks = CommandParser().parse(text)
+    legacy = resolve_location_reference(segment_command(text))
+    assert [t.text for t in tasks] == [item['command'] for item in legacy]
+    for task, item in zip(tasks, legacy):
+        expected = extract_task(item['command'])
+        assert task.to_dict() == {**expected, 'room': item['room']}
+    assert tasks[0].room_span == (14, 22) and tasks[1].room_span is None
+    assert text[slice(*tasks[3].value_span)] == "22 градуса"
+
+
+def test_command_parser_parse_many():
+    results = CommandParser().parse_many(["запусти музыку", "", "открой окно на кухне"])
+    assert [[t.action for t in tasks] for tasks in results] == [["включи"], [], ["открой"]]
+    assert results[2][0].room == "кухня"
+
+
+def test_command_parser_cache_hits_and_bound():
+    parser = CommandParser(cache_size=2)
+    first = parser.parse("включи свет")
+    assert parser.parse("Включи свет") == [replace(first[0], text="Включи свет")]
+    assert parser.cache_info()["hits"] == 1 and parser.cache_info()["misses"] == 1
+    assert CommandParser().cache_info()["max_size"] == DEFAULT_CACHE_SIZE  # Кэш включён по умолчанию
+    uncached = CommandParser(cache_size=0)
+    uncached.parse("включи свет")
+    assert uncached.cache_info()["size"] == 0
+    parser.parse("выключи свет")
+    parser.parse("открой окно")
+    info = parser.cache_info()
+    assert info["size"] == 2 and info["evictions"] == 1
+
+
+def test_command_parser_cache_ignores_punctuation_and_spaces():
+    parser = CommandParser(cache_size=4)
+    parser.parse("поставь температуру на 22 в спальне")
+    text = "Поставь  температуру, на 22 —  в спальне!"
+    tasks = parser.parse(text)
+    assert parser.cache_info()["hits"] == 1
+    assert tasks == CommandParser(cache_size=0).parse(text)
+    assert text[slice(*tasks[0].value_span)] == "22"
+    assert text[slice(*tasks[0].room_span)] == "спальне"
+
+
+def test_command_parser_cache_invalidated_on_reload(tmp_path):
+    source = tmp_path / "synonyms.json"
+    source.write_text(json.dumps({"OBJECTS": {"чайник": ["чайник"]}}, ensure_ascii=False), encoding="utf-8")
+    parser = CommandParser(VocabularyStore(str(source), check_interval=0), cache_size=16)
+    assert parser.parse("включи пылесос")[0].object is None
+
+    source.write_text(json.dumps({"OBJECTS": {"робот": ["пылесос"]}}, ensure_ascii=False), encoding="utf-8")
+    os.utime(source, ns=(1, 1))
+    assert parser.parse("включи пылесос")[0].object == "робот"
+    assert parser.cache_info()["hits"] == 0
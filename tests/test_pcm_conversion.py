@@ -0,0 +1,34 @@
+"""
+Тесты для приведения аудио к формату распознавателя и in-memory API SpeechToText.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import numpy as np
+from src.models.speech_to_text import SpeechToText, to_pcm16
+
+
+def test_float_is_scaled_and_clipped():
+    pcm = to_pcm16(np.array([0.0, 0.5, -1.0, 2.0], dtype=np.float32))
+    assert pcm.dtype == np.int16
+    assert pcm.tolist() == [0, 16383, -32767, 32767]
+
+
+def test_int16_passes_through_without_copy():
+    audio = np.arange(10, dtype=np.int16)
+    assert to_pcm16(audio) is audio
+
+
+def test_bytes_with_width_and_channels():
+    stereo = np.array([[100, 300], [-100, -300]], dtype=np.int16)
+    assert to_pcm16(stereo.tobytes(), sample_width=2, channels=2).tolist() == [200, -200]
+    assert to_pcm16(bytes([128, 255, 0]), sample_width=1).tolist() == [0, 127 << 8, -128 << 8]
+    assert to_pcm16(np.array([1 << 16, -(1 << 20)], dtype=np.int32)).tolist() == [1, -16]
+
+
+def test_stub_backend_accepts_in_memory_audio():
+    stt = SpeechToText(backend="stub")
+    audio = np.zeros(1600, dtype=np.float32)
+    assert "text" in stt.transcribe_array(audio, 16000)
+    assert "text" in stt.transcribe_bytes(audio.astype(np.int16).tobytes(), 16000)
+    assert "text" in stt.transcribe_stream(iter([audio]), 16000)
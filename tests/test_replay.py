@@ -0,0 +1,95 @@
+"""
+Тесты для замен оборудования: проигрывание записи вместо микрофона и эмулятор прошивки.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import json
+import time
+import wave
+import numpy as np
+from src.utils.replay import FakeSoundDevice, FirmwareEmulator, LoopbackSerial
+from src.utils.command_capture import END_FINAL, StreamingCommandCapture
+
+
+class ScriptedRecognizer:
+    """Распознаватель, который финализирует фразу после заданного числа байт."""
+    def __init__(self, final_after: int):
+        self.final_after = final_after
+        self.received = 0
+
+    def AcceptWaveform(self, data):
+        self.received += len(data)
+        return self.received >= self.final_after
+
+    def Result(self):
+        return json.dumps({"text": "включи свет"})
+
+    def PartialResult(self):
+        return json.dumps({"partial": ""})
+
+    def FinalResult(self):
+        return json.dumps({"text": ""})
+
+    def Reset(self):
+        self.received = 0
+
+
+class ScriptedStt:
+    def create_recognizer(self, sample_rate, grammar=None, words=False):
+        return ScriptedRecognizer(final_after=sample_rate)  # полсекунды int16
+
+
+def test_fake_device_plays_recording_then_silence():
+    samples = np.arange(1, 3201, dtype=np.int16)
+    device = FakeSoundDevice(samples, sample_rate=16000, speed=0)
+    blocks = []
+    with device.InputStream(samplerate=16000, channels=1, dtype="int16", blocksize=1600,
+                            callback=lambda indata, frames, t, status: blocks.append(indata.copy())):
+        while len(blocks) < 4:
+            time.sleep(0.001)
+    audio = np.concatenate(blocks)[:, 0]
+    assert np.array_equal(audio[:3200], samples)
+    assert not audio[3200:].any()
+    assert device.eof is not None
+
+
+def test_capture_runs_on_replayed_audio():
+    device = FakeSoundDevice(np.zeros(16000, dtype=np.int16), sample_rate=16000, speed=0)
+    capture = StreamingCommandCapture(ScriptedStt(), audio=device)
+    result = capture.capture()
+    assert result["text"] == "включи свет"
+    assert result["end_reason"] == END_FINAL
+
+
+def test_capture_saves_exactly_the_decoded_command(tmp_path):
+    samples = (np.arange(48000) % 30000).astype(np.int16)
+    device = FakeSoundDevice(samples, sample_rate=16000, speed=0)
+    capture = StreamingCommandCapture(ScriptedStt(), audio=device)
+    path = str(tmp_path / "command.wav")
+    result = capture.capture(save_path=path)
+    with wave.open(path, "rb") as wf:
+        saved = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    # Начало команды на месте, а блоки, записанные после её окончания, не попали в файл
+    assert len(saved) == int(result["duration"] * 16000)
+    assert np.array_equal(saved, samples[:len(saved)])
+
+
+def test_firmware_emulator_matches_firmware_replies():
+    firmware = FirmwareEmulator()
+    assert firmware.handle("PING") == ["Received: PING", "PONG"]
+    assert firmware.handle("SET:light:4:1")[-1] == "OK: Light ON"
+    assert firmware.handle("SET:servo:12:200")[-1] == "OK: Window angle set to 180"
+    assert firmware.handle("SET:servo:5:90")[-1] == "ERROR: Invalid servo pin"
+    assert firmware.handle("включи свет")[-1] == "ERROR: Unknown command"
+    assert firmware.handle("SET:target_temp:23.5")[-1] == "OK: Target temperature set"
+    assert firmware.state["target_temperature"] == 23.5
+
+
+def test_loopback_serial_returns_replies_in_order():
+    port = LoopbackSerial(baudrate=115200, timeout=0.5)
+    port.write(b"SET:fan:13:1\nPING\n")
+    lines = [port.readline().decode().strip() for _ in range(4)]
+    assert lines == ["Received: SET:fan:13:1", "OK: Fan ON", "Received: PING", "PONG"]
+    assert port.readline() == b""  # таймаут без данных
+    assert [command for _, command in port.sent] == ["SET:fan:13:1", "PING"]
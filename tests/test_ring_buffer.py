@@ -0,0 +1,57 @@
+"""
+Тесты для кольцевого буфера аудио.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import numpy as np
+from src.utils.ring_buffer import AudioRingBuffer
+
+
+def test_latest_is_contiguous_view_across_wraparound():
+    ring = AudioRingBuffer(10, dtype=np.int16)
+    for start in range(0, 27, 3):
+        ring.write(np.arange(start, start + 3, dtype=np.int16))
+    latest = ring.latest(7)
+    assert latest.tolist() == list(range(20, 27))
+    assert np.shares_memory(latest, ring._data)
+    assert ring.filled == 10
+    assert ring.total_written == 27
+
+
+def test_latest_copies_when_writer_would_overwrite_view():
+    ring = AudioRingBuffer(10, dtype=np.int16)
+    ring.write(np.arange(10, dtype=np.int16))
+    assert np.shares_memory(ring.latest(7, guard=3), ring._data)
+    full = ring.latest(10, guard=3)
+    assert not np.shares_memory(full, ring._data)
+    ring.write(np.full(3, -1, dtype=np.int16))  # Следующий блок callback'а
+    assert full.tolist() == list(range(10))
+
+
+def test_accepts_input_stream_shape():
+    ring = AudioRingBuffer(8, dtype=np.float32)
+    ring.write(np.ones((4, 1), dtype=np.float32))
+    assert ring.latest(8).tolist() == [1.0] * 4
+
+
+def test_read_since_returns_only_new_samples():
+    ring = AudioRingBuffer(16, dtype=np.int16)
+    position = ring.total_written
+    ring.write(np.arange(5, dtype=np.int16))
+    chunk, position = ring.read_since(position)
+    assert chunk.tolist() == [0, 1, 2, 3, 4]
+    ring.write(np.arange(5, 9, dtype=np.int16))
+    chunk, position = ring.read_since(position)
+    assert chunk.tolist() == [5, 6, 7, 8]
+    assert position == 9
+
+
+def test_overrun_keeps_most_recent_capacity():
+    ring = AudioRingBuffer(4, dtype=np.int16)
+    ring.write(np.arange(3, dtype=np.int16))
+    ring.write(np.arange(10, 16, dtype=np.int16))  # блок больше ёмкости
+    chunk, position = ring.read_since(0)
+    assert chunk.tolist() == [12, 13, 14, 15]
+    assert ring.overruns == 1
+    assert position == 9
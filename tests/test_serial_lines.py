@@ -0,0 +1,29 @@
+"""
+Тесты для разбивки потока байтов Serial на строки.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from src.utils.serial_lines import LineSplitter
+
+
+def test_splits_lines_across_reads():
+    splitter = LineSplitter()
+    assert splitter.feed(b"Received: PI") == []
+    assert splitter.feed(b"NG\r\nPONG\r") == ["Received: PING", "PONG"]
+    assert splitter.feed(b"\nOK: Light ON\n\n") == ["OK: Light ON"]
+    assert splitter.pending == 0
+
+
+def test_decodes_utf8_split_between_reads():
+    data = "Температура: 22.5\n".encode("utf-8")
+    splitter = LineSplitter()
+    assert splitter.feed(data[:1]) == []
+    assert splitter.feed(data[1:]) == ["Температура: 22.5"]
+
+
+def test_drops_garbage_without_newline():
+    splitter = LineSplitter(max_line=8)
+    assert splitter.feed(b"\xff" * 20) == []
+    assert splitter.dropped == 1
+    assert splitter.feed(b"PONG\n") == ["PONG"]
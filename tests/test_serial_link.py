@@ -0,0 +1,75 @@
+"""
+Тесты для согласования скорости с прошивкой и проверки линии.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import time
+import pytest
+from src.utils.replay import FirmwareEmulator, LoopbackSerial
+from src.utils.command_channel import DEFAULT_TIMEOUT
+from src.utils.serial_link import (BASE_BAUDRATE, BAUD_CONFIRM_SEC, FIRMWARE_COMMAND_LATENCY, REPLY_TIMEOUT,
+                                  loop_time, negotiate, ping, self_test, switch_baudrate)
+
+FAST = {"reply_timeout": 0.1, "confirm_timeout": 0.2}
+
+
+def make_port(**firmware_options):
+    firmware = FirmwareEmulator(baud_confirm=0.2, **firmware_options)
+    return firmware, LoopbackSerial(firmware, baudrate=BASE_BAUDRATE, timeout=0.05, simulate_wire=False)
+
+
+def test_negotiates_highest_rate():
+    firmware, port = make_port()
+    link = negotiate(port, **FAST)
+    assert link.baudrate == 1000000 == port.baudrate == firmware.baudrate
+    assert link.throughput > 0 and link.rtt is not None
+
+
+def test_falls_back_when_self_test_fails():
+    firmware, port = make_port(max_reliable_baudrate=115200)
+    link = negotiate(port, **FAST)
+    assert link.baudrate == 115200 == firmware.baudrate
+    time.sleep(0.3)
+    firmware.check_baud()
+    assert firmware.baudrate == 115200  # Скорость подтверждена BAUD:OK и не откатывается
+
+
+def test_unconfirmed_rate_is_reverted_by_firmware():
+    firmware, port = make_port()
+    assert switch_baudrate(port, 57600, timeout=0.1)
+    assert ping(port, timeout=0.1, attempts=1) is not None
+    time.sleep(0.3)
+    assert ping(port, timeout=0.1, attempts=1) is None
+    port.baudrate = BASE_BAUDRATE
+    assert ping(port, timeout=0.1, attempts=1) is not None
+    assert self_test(port, count=2, timeout=0.1) is not None
+
+
+def test_firmware_without_baud_command_stays_on_base_rate():
+    class OldFirmware(FirmwareEmulator):
+        def handle(self, command):
+            if command.startswith("BAUD"):
+                return [f"Received: {command}", "ERROR: Unknown command"]
+            return super().handle(command)
+
+    port = LoopbackSerial(OldFirmware(), baudrate=BASE_BAUDRATE, timeout=0.05, simulate_wire=False)
+    assert negotiate(port, **FAST).baudrate == BASE_BAUDRATE
+
+
+def test_silent_port_raises():
+    port = LoopbackSerial(FirmwareEmulator(baudrate=9600), baudrate=19200, timeout=0.05, simulate_wire=False)
+    with pytest.raises(ConnectionError):
+        negotiate(port, **FAST)
+
+
+def test_loop_time_reports_firmware_latency():
+    _, port = make_port(reply_delay=0.02)
+    assert loop_time(port, timeout=0.5) == pytest.approx(0.02)
+    assert loop_time(port, timeout=0.5) <= FIRMWARE_COMMAND_LATENCY
+
+
+def test_timeouts_cover_firmware_latency():
+    # Таймауты хоста рассчитаны на неблокирующий loop() прошивки с запасом на линию
+    assert FIRMWARE_COMMAND_LATENCY < REPLY_TIMEOUT <= DEFAULT_TIMEOUT
+    assert REPLY_TIMEOUT < BAUD_CONFIRM_SEC
@@ -0,0 +1,122 @@
+"""
+Тесты для двоичной телеметрии: кадры, CRC, разделение потока, история.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import asyncio
+import numpy as np
+from src.utils.async_controller import AsyncSerialDevice
+from src.utils.replay import FirmwareEmulator, open_loopback_connection
+from src.utils.telemetry import (FLAG_FAN, FLAG_LIGHT, FRAME_SIZE, TelemetryDemux, TelemetryLog,
+                                 crc16, decode_frames, encode_frame, parse_text_telemetry)
+
+
+def test_crc_and_frame_layout():
+    assert crc16(b"123456789") == 0x29B1  # контрольное значение CRC-16/CCITT-FALSE
+    frame = encode_frame(258, -1.25, 120, FLAG_LIGHT | FLAG_FAN, 70)
+    assert len(frame) == FRAME_SIZE and frame[:4] == b"\xaa\x55\x09\x01"
+    decoded = decode_frames(frame + frame[:-1] + b"\x00")  # у второго кадра испорчена CRC
+    assert len(decoded) == 1
+    assert decoded["seq"][0] == 258 and decoded["temperature"][0] == -125
+    assert decoded["distance"][0] == 120 and decoded["window"][0] == 70
+
+
+def test_demux_splits_lines_and_frames_in_any_chunking():
+    stream = (b"Received: TELEMETRY:BIN\r\nOK: Telemetry BINARY\r\n" + encode_frame(0, 23.5, 80, 0, 70)
+              + b"Received: PING\r\n" + encode_frame(1, 23.75, 81, FLAG_LIGHT, 90) + b"PONG\r\n")
+    for chunk in (len(stream), 5, 1):
+        demux = TelemetryDemux()
+        lines = []
+        for i in range(0, len(stream), chunk):
+            lines += demux.feed(stream[i:i + chunk])
+        assert lines == ["Received: TELEMETRY:BIN", "OK: Telemetry BINARY", "Received: PING", "PONG"]
+        assert demux.frames == 2 and demux.pending == 0
+        assert demux.log.latest_dict()["temperature"] == 23.75
+        assert demux.log.latest_dict()["light"] is True
+        assert list(demux.log.history()["distance"]) == [80, 81]
+
+
+def test_corrupt_frame_is_skipped_and_text_survives():
+    bad = bytearray(encode_frame(0, 20.0, 50, 0, 70))
+    bad[7] ^= 0xFF
+    demux = TelemetryDemux()
+    lines = demux.feed(bytes(bad) + b"OK: Fan ON\r\n" + encode_frame(1, 20.0, 50, 0, 70))
+    assert lines == ["OK: Fan ON"]
+    assert demux.corrupt == 1 and demux.frames == 1
+
+
+def test_demux_resyncs_after_broken_header():
+    # Оборванный кадр (потеряны байты после синхрослова), сразу за ним — целый кадр
+    demux = TelemetryDemux()
+    lines = demux.feed(b"\xaa\x55\x00" + encode_frame(1, 20.0, 50, 0, 70) + b"PONG\r\n")
+    assert lines == ["PONG"]
+    assert demux.corrupt == 1 and demux.frames == 1
+    assert demux.log.latest()["seq"] == 1
+
+
+def test_demux_resyncs_after_lost_byte_in_frame_stream():
+    # Кадры идут подряд без перевода строки; расстояние 10 даёт байт 0x0A внутри кадра
+    frames = [encode_frame(seq, 21.0, 10, 0, 70) for seq in range(6)]
+    stream = b"".join(frames)
+    lost = len(frames[0]) * 2 + 7
+    stream = stream[:lost] + stream[lost + 1:] + b"PONG\r\n"  # потерян байт в середине третьего кадра
+    for chunk in (len(stream), 3, 1):
+        demux = TelemetryDemux()
+        lines = []
+        for i in range(0, len(stream), chunk):
+            lines += demux.feed(stream[i:i + chunk])
+        assert lines == ["PONG"]  # Остаток кадра не выдаётся за строку Arduino
+        assert list(demux.log.history()["seq"]) == [0, 1, 3, 4, 5]
+        assert demux.corrupt == 1 and demux.log.lost == 1
+
+
+def test_emulator_sends_on_change_and_log_counts_gaps():
+    firmware = FirmwareEmulator()
+    assert firmware.telemetry(23.5, 80).startswith(b"Temperature: 23.50")
+    firmware.handle("TELEMETRY:BIN")
+    first = firmware.telemetry(23.5, 80, now=0.0)
+    assert len(first) == FRAME_SIZE
+    assert firmware.telemetry(23.5, 80, now=0.5) == b""        # ничего не изменилось
+    assert len(firmware.telemetry(23.5, 80, now=1.5)) == FRAME_SIZE  # heartbeat
+    firmware.handle("SET:light:4:1")
+    changed = firmware.telemetry(23.5, 80, now=1.6)
+    assert decode_frames(changed)["flags"][0] & FLAG_LIGHT
+
+    log = TelemetryLog(capacity=2)
+    log.append_frames(decode_frames(first))
+    log.append_frames(decode_frames(changed))  # кадр с номером 1 потерян
+    assert log.lost == 1 and log.count == 2
+    log.append_frames(decode_frames(encode_frame(3, 30.0, 10, 0, 0)))
+    assert list(log.history()["seq"]) == [2, 3]
+
+
+def test_text_telemetry_fallback():
+    assert parse_text_telemetry("Temperature: 23.50, Distance: 120") == {"temperature": 23.5, "distance": 120.0}
+    assert parse_text_telemetry("OK: Light ON") is None
+
+
+def test_async_device_switches_to_binary_telemetry():
+    async def scenario():
+        firmware = FirmwareEmulator()
+
+        async def connect(port, baudrate):
+            return await open_loopback_connection(port, baudrate, firmware)
+
+        device = AsyncSerialDevice("loop://", connect=connect, binary_telemetry=True)
+        await device.open()
+        reader = asyncio.create_task(device.read_loop())
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if firmware.binary_telemetry:
+                break
+        device.reader.feed_data(firmware.telemetry(21.0, 42, now=0.0))
+        await asyncio.sleep(0.05)
+        await device.close()
+        await reader
+        return device
+
+    device = asyncio.run(scenario())
+    assert device.last_line == "OK: Telemetry BINARY"
+    assert device.telemetry.latest_dict()["distance"] == 42
+    assert np.isclose(device.telemetry.latest()["temperature"], 21.0)
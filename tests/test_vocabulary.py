@@ -0,0 +1,64 @@
+"""
+Тесты для загрузки словарей из JSON и горячей перезагрузки.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import json
+from src.utils.morphology import LemmaIndex
+from src.utils.vocabulary import VocabularyStore, load_vocabulary
+
+
+def _write(path, objects):
+    path.write_text(json.dumps({"OBJECTS": objects}, ensure_ascii=False), encoding="utf-8")
+
+
+def test_missing_keys_fall_back_to_builtin(tmp_path):
+    source = tmp_path / "synonyms.json"
+    _write(source, {"чайник": ["чайник", "чайника"]})
+    vocabulary = load_vocabulary(str(source))
+    assert vocabulary.matcher.first("включи чайник", "object").canonical == "чайник"
+    assert vocabulary.matcher.first("включи чайник", "action").canonical == "включи"
+    assert "гостиная" in vocabulary.known_rooms
+
+
+def test_source_hash_tracks_content(tmp_path):
+    source = tmp_path / "synonyms.json"
+    _write(source, {"чайник": ["чайник"]})
+    first = load_vocabulary(str(source))
+    assert load_vocabulary(str(source)).source_hash == first.source_hash
+    assert not list(tmp_path.glob(".vocab_cache"))  # Скомпилированный индекс на диск не пишется
+    _write(source, {"чайник": ["чайник", "чайника"]})
+    assert load_vocabulary(str(source)).source_hash != first.source_hash
+
+
+def test_store_reloads_changed_file(tmp_path):
+    source = tmp_path / "synonyms.json"
+    _write(source, {"чайник": ["чайник"]})
+    store = VocabularyStore(str(source), check_interval=0)
+    first = store.get()
+    assert store.get() is first
+
+    _write(source, {"чайник": ["чайник"], "робот": ["пылесос"]})
+    os.utime(source, ns=(1, 1))  # гарантируем другую отметку времени
+    second = store.get()
+    assert second is not first
+    assert second.generation == first.generation + 1
+    assert second.matcher.first("запусти пылесос", "object").canonical == "робот"
+
+
+def test_store_reloads_rebuilt_lemma_index(tmp_path):
+    source = tmp_path / "synonyms.json"
+    index_path = str(tmp_path / "lemma_index")
+    _write(source, {"чайник": ["чайник"]})
+    store = VocabularyStore(str(source), check_interval=0, lemma_index_path=index_path)
+    first = store.get()
+    assert first.lemmatizer("чайничком") is None
+
+    # Индекс собран после загрузки словаря: JSON не менялся, но словарь должен обновиться
+    LemmaIndex.build([("чайничком", "чайник")]).save(index_path)
+    second = store.get()
+    assert second is not first
+    assert second.source_hash != first.source_hash
+    assert second.lemmatizer("чайничком") == "чайник"
+    assert second.matcher.first("займись чайничком", "object").canonical == "чайник"
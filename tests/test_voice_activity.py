@@ -0,0 +1,72 @@
+"""
+Тесты для энергетического VAD-гейта перед декодером wake word.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import numpy as np
+from src.utils.voice_activity import EnergyVadGate
+
+SAMPLE_RATE = 16000
+BLOCK = 1600
+
+
+def _silence(n_blocks: int, level: float = 0.001) -> list:
+    rng = np.random.default_rng(0)
+    return [np.int16(rng.normal(0, level, BLOCK) * 32767) for _ in range(n_blocks)]
+
+
+def _voiced(n_blocks: int, amplitude: float = 0.3) -> list:
+    t = np.arange(BLOCK * n_blocks) / SAMPLE_RATE
+    signal = amplitude * np.sin(2 * np.pi * 220 * t) * (1 + 0.5 * np.sin(2 * np.pi * 4 * t))
+    return list(np.int16(signal * 32767 / 1.5).reshape(n_blocks, BLOCK))
+
+
+def test_silence_is_skipped():
+    gate = EnergyVadGate(sample_rate=SAMPLE_RATE)
+    decisions = [gate.process(block) for block in _silence(50)]
+    assert not any(decisions)
+    assert gate.stats()['frames_skipped'] == 50
+    assert gate.stats()['frames_decoded'] == 0
+
+
+def test_speech_after_silence_opens_gate_with_hangover():
+    gate = EnergyVadGate(sample_rate=SAMPLE_RATE, hangover_ms=300)
+    for block in _silence(20):
+        gate.process(block)
+    assert all(gate.process(block) for block in _voiced(10))
+    tail = [gate.process(block) for block in _silence(10)]
+    # Гейт держится открытым ~300 мс после речи, затем закрывается
+    assert tail[:3] == [True, True, True]
+    assert not any(tail[4:])
+
+
+def test_speech_in_first_block_opens_gate():
+    gate = EnergyVadGate(sample_rate=SAMPLE_RATE)
+    # Пользователь заговорил сразу: уровень шума не должен встать на уровень речи
+    assert all(gate.process(block) for block in _voiced(10))
+    assert gate.noise_floor < 0.05
+
+
+def test_float_input_is_accepted():
+    gate = EnergyVadGate(sample_rate=SAMPLE_RATE)
+    gate.process(np.zeros(BLOCK, dtype=np.float32))
+    assert gate.process(np.float32(_voiced(1)[0]) / 32768)
+
+
+def test_stationary_noise_is_absorbed_by_noise_floor():
+    gate = EnergyVadGate(sample_rate=SAMPLE_RATE, hangover_ms=0)
+    # Громкий, но стационарный шум: после адаптации уровня шума гейт должен закрыться
+    decisions = [gate.process(block) for block in _silence(200, level=0.05)]
+    assert not any(decisions[-50:])
+
+
+def test_in_band_noise_is_absorbed_by_adaptation():
+    # Шум с долей пересечений нуля как у речи отсекает только уровень шума, а он стартует с min_rms
+    rng = np.random.default_rng(0)
+    noise = np.convolve(rng.normal(0, 1, BLOCK * 300), np.ones(8) / 8, "same")
+    blocks = np.int16(noise / noise.std() * 0.05 * 32767).reshape(300, BLOCK)
+    gate = EnergyVadGate(sample_rate=SAMPLE_RATE, hangover_ms=0)
+    decisions = [gate.process(block) for block in blocks]
+    assert decisions[0]
+    assert not any(decisions[-50:])
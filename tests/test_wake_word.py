@@ -5,37 +5,36 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 from src.utils.wake_word_detector import WakeWordDetector
-from src.data.audio_utils import record_audio_vad_with_stop
+from src.utils.command_capture import StreamingCommandCapture
 from src.models.speech_to_text import SpeechToText
+from src.models.model_registry import warm_up
 from src.utils.text_segments import segment_command
 from src.utils.location_extractor import resolve_location_reference
 from src.utils.task_extractor import extract_task
 from datetime import datetime
 
 TEST_DIR = "data/custom_dataset/voice_commands/"
+MODEL_PATH = "models/asr/vosk/vosk-model-small-ru-0.22"
 
 def process_command():
     """Обрабатывает голосовую команду после активации wake word."""
     TEST_FILE = os.path.join(TEST_DIR, f"voice_command_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
     
-    stt = SpeechToText(backend="vosk", model_path="models/asr/vosk/vosk-model-small-ru-0.22")
+    # Модель берётся из общего реестра — повторной загрузки с диска нет
+    stt = SpeechToText(backend="vosk", model_path=MODEL_PATH)
     
     print("Записываю команду...")
-    success = record_audio_vad_with_stop(TEST_FILE, stt, max_duration=10.0, pause_threshold=1.0)
+    # Команда распознаётся по ходу речи; WAV сохраняется в датасет уже после распознавания
+    capture = StreamingCommandCapture(stt, max_duration=10.0, pause_threshold=1.0)
+    result = capture.capture(save_path=TEST_FILE)
     
-    # Если запись была отменена по стоп-слову, не обрабатываем команду
-    if not success:
-        # Удаляем файл, если он был создан
-        if os.path.exists(TEST_FILE):
-            try:
-                os.unlink(TEST_FILE)
-            except:
-                pass
+    # Если запись была отменена по стоп-слову, не обрабатываем команду (файл не создаётся)
+    if result is None:
         print("Запись отменена. Возвращаюсь к прослушиванию wake word...")
         return
     
-    result = stt.transcribe(TEST_FILE)
-    print(f"\nРаспознанный текст: {result['text']}")
+    print(f"\nРаспознанный текст: {result['text']} "
+          f"(окончание: {result['end_reason']}, {result['duration']:.1f} с)")
     
     segments = segment_command(result['text'])
     resolved_commands = resolve_location_reference(segments)
@@ -51,7 +50,9 @@ def process_command():
 
 def main():
     """Основная функция для тестирования wake word detection."""
-    detector = WakeWordDetector()
+    # Загружаем модель один раз при старте: и детектор, и распознавание команд используют её
+    warm_up("vosk", MODEL_PATH)
+    detector = WakeWordDetector(stt_model_path=MODEL_PATH)
     
     print("=" * 60)
     print("Голосовой ассистент активируется по слову 'Карма'")